@@ -1,24 +1,67 @@
-from flask import Flask, request, jsonify, send_file
+from flask import Flask, request, jsonify, send_file, Response, stream_with_context, g
 from flask_cors import CORS
-from flask_jwt_extended import JWTManager, create_access_token, jwt_required, get_jwt_identity, get_jwt
+from flask_jwt_extended import JWTManager, create_access_token, jwt_required, get_jwt_identity, get_jwt, verify_jwt_in_request
 import os
-from werkzeug.utils import secure_filename
-import PyPDF2
-from docx import Document
-import requests
+import re
+import contextvars
+import logging
+from werkzeug.utils import secure_filename, safe_join
 from dotenv import load_dotenv
 import json
 from datetime import timedelta
 import time
+import uuid
+from urllib.parse import quote, urlparse
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from task_queue import TaskQueue, QueueFullError
+from llm_client import LLMClient, LLMError
+from llm_scheduler import (
+    LLMScheduler,
+    RateLimits,
+    parse_weights,
+    set_identity,
+    set_priority,
+    INTERACTIVE,
+    BATCH
+)
+from chunking import split_into_units, merge_analysis_results
+from chunked_upload import ChunkedUploads, UploadError, UploadOffsetError, UploadBusyError
+from structured_output import parse_json_object, validate_sections
+from compaction import compact_text, load_token_counter, truncate_to_budget
+from cache import ContentCache, ResponseCache, file_sha256, text_sha256
+from task_store import create_task_store
+from document_text import parse_document as extract_document_text
+from pdf_ocr import ocr_available
+from batch_ingest import BatchIngestor, ARCHIVE_EXTENSIONS
+from docx_export import iter_docx_export
+from markdown_html import render_markdown, iter_markdown_html, html_to_markdown, escape as escape_html
+from proposal_store import ProposalStore, ProposalNotFound
+from image_library import ImageLibrary, ImageError, MIME_TYPES
+from search_index import SearchIndex, load_embedder, html_to_text
+from metrics import (
+    registry as metrics_registry,
+    traces,
+    span,
+    new_trace_id,
+    current_trace_id,
+    set_trace_id,
+    configure_logging,
+    HTTP_REQUEST_SECONDS
+)
 
 load_dotenv()
 
+# 日志级别；每条日志带请求的 trace id
+configure_logging(os.getenv('LOG_LEVEL', 'INFO'))
+logger = logging.getLogger(__name__)
+
 app = Flask(__name__)
 CORS(app, resources={
     r"/api/*": {
         "origins": ["http://localhost:5174"],
         "methods": ["GET", "POST", "PUT", "DELETE", "OPTIONS"],
-        "allow_headers": ["Content-Type", "Authorization"],
+        "allow_headers": ["Content-Type", "Authorization", "X-Trace-Id"],
+        "expose_headers": ["X-Trace-Id"],
         "supports_credentials": True
     }
 })
@@ -31,26 +74,216 @@ app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
 
 # DeepSeek配置
 DEEPSEEK_API_KEY = os.getenv('DEEPSEEK_API_KEY')
-DEEPSEEK_API_URL = "https://api.deepseek.com/v1/chat/completions"
+DEEPSEEK_API_URL = os.getenv('DEEPSEEK_API_URL', "https://api.deepseek.com/v1/chat/completions")
+DEEPSEEK_MODEL = os.getenv('DEEPSEEK_MODEL', 'deepseek-chat')
+
+# 大模型调度：交互请求优先于批量任务并预留名额，同一优先级内按用户加权公平排队，
+# 请求数与 token 数按服务商配额限速（0 表示不限）；同步与异步客户端共享配额
+LLM_MAX_CONCURRENCY = int(os.getenv('LLM_MAX_CONCURRENCY', '8'))
+LLM_INTERACTIVE_RESERVED = int(os.getenv('LLM_INTERACTIVE_RESERVED', str(max(1, LLM_MAX_CONCURRENCY // 4))))
+LLM_USER_WEIGHTS = parse_weights(os.getenv('LLM_USER_WEIGHTS', ''))
+llm_limits = RateLimits(
+    requests_per_minute=float(os.getenv('LLM_REQUESTS_PER_MINUTE', '0')),
+    tokens_per_minute=float(os.getenv('LLM_TOKENS_PER_MINUTE', '0'))
+)
+llm_scheduler = LLMScheduler(
+    LLM_MAX_CONCURRENCY,
+    llm_limits,
+    interactive_reserved=LLM_INTERACTIVE_RESERVED,
+    weights=LLM_USER_WEIGHTS
+)
+
+# 共享的大模型客户端
+llm_client = LLMClient(
+    DEEPSEEK_API_URL,
+    DEEPSEEK_API_KEY,
+    model=DEEPSEEK_MODEL,
+    max_concurrency=LLM_MAX_CONCURRENCY,
+    connect_timeout=float(os.getenv('LLM_CONNECT_TIMEOUT', '10')),
+    read_timeout=float(os.getenv('LLM_READ_TIMEOUT', '300')),
+    max_retries=int(os.getenv('LLM_MAX_RETRIES', '3')),
+    scheduler=llm_scheduler
+)
+
+# PDF 解析配置：auto / pymupdf / pypdf2
+PDF_BACKEND = os.getenv('PDF_BACKEND', 'auto')
+PDF_WORKERS = int(os.getenv('PDF_WORKERS', str(min(4, os.cpu_count() or 1))))
+
+# 长文档分块分析配置：按章节切分为分析单元，单元达到目标大小后在内容决定的边界处切分，不超过上限
+ANALYSIS_UNIT_TOKENS = int(os.getenv('ANALYSIS_UNIT_TOKENS', '8000'))
+ANALYSIS_CHUNK_TOKENS = int(os.getenv('ANALYSIS_CHUNK_TOKENS', '24000'))
+ANALYSIS_CHUNK_CONCURRENCY = int(os.getenv('ANALYSIS_CHUNK_CONCURRENCY', '4'))
+
+# 文本提取版本，修改解析逻辑后需递增以使旧的文本缓存失效
+TEXT_EXTRACTOR_VERSION = '3'
+
+# 提示词压缩与预算：分析前去除页眉页脚、目录引导线与重复条款；单条提示词超出预算时截断
+PROMPT_COMPACTION = os.getenv('PROMPT_COMPACTION', '1') != '0'
+PROMPT_MAX_TOKENS = int(os.getenv('PROMPT_MAX_TOKENS', '32000'))
+count_tokens = load_token_counter(os.getenv('PROMPT_TOKENIZER', ''))
+
+# 分析提示词版本，修改分析提示词或分块逻辑后需递增以使旧缓存失效
+ANALYSIS_PROMPT_VERSION = '4'
+
+# 解析文本与分析结果缓存
+CACHE_DIR = os.getenv('CACHE_DIR', os.path.join(app.config['UPLOAD_FOLDER'], 'cache'))
+CACHE_MEMORY_ITEMS = int(os.getenv('CACHE_MEMORY_ITEMS', '128'))
+CACHE_DISK_MAX_MB = int(os.getenv('CACHE_DISK_MAX_MB', '512'))
+text_cache = ContentCache(
+    os.path.join(CACHE_DIR, 'text'),
+    memory_items=CACHE_MEMORY_ITEMS,
+    disk_max_bytes=CACHE_DISK_MAX_MB * 1024 * 1024
+)
+analysis_cache = ContentCache(
+    os.path.join(CACHE_DIR, 'analysis'),
+    memory_items=CACHE_MEMORY_ITEMS,
+    disk_max_bytes=CACHE_DISK_MAX_MB * 1024 * 1024
+)
+
+# 扫描件 OCR：文本层过少或为乱码的页用 Tesseract 识别（需安装 pytesseract 与 tesseract），
+# 识别结果按页面图像哈希缓存；未安装时跳过
+OCR_ENABLED = os.getenv('OCR_ENABLED', '1') != '0' and ocr_available()
+OCR_OPTIONS = {
+    'workers': int(os.getenv('OCR_WORKERS', str(min(4, os.cpu_count() or 1)))),
+    'lang': os.getenv('OCR_LANG', 'chi_sim+eng'),
+    'dpi': int(os.getenv('OCR_DPI', '200')),
+    'min_chars': int(os.getenv('OCR_MIN_PAGE_CHARS', '20')),
+    'cache_dir': os.path.join(CACHE_DIR, 'ocr')
+} if OCR_ENABLED else None
+if OCR_ENABLED:
+    # 启用 OCR 后扫描件的提取结果不同，旧的文本缓存不再沿用
+    TEXT_EXTRACTOR_VERSION += '+ocr'
+
+# AI续写/扩写/润色的响应缓存（相同请求在有效期内直接返回，并发的相同请求只调用一次模型）
+ai_response_cache = ResponseCache(
+    max_items=int(os.getenv('AI_CACHE_MAX_ITEMS', '1024')),
+    ttl=float(os.getenv('AI_CACHE_TTL_SECONDS', '3600'))
+)
+
+# 任务状态与结果存储（memory 为进程内存储，sqlite 可供多个工作进程共享）
+task_store = create_task_store(
+    os.getenv('TASK_STORE', 'memory'),
+    path=os.getenv('TASK_STORE_PATH', os.path.join(app.config['UPLOAD_FOLDER'], 'tasks.db')),
+    ttl=float(os.getenv('TASK_TTL_SECONDS', str(24 * 3600))),
+    max_entries=int(os.getenv('TASK_STORE_MAX_ENTRIES', '10000')),
+    max_bytes=int(os.getenv('TASK_STORE_MAX_MB', '256')) * 1024 * 1024
+)
 
 # 文件解析状态存储
-parsing_status = {}
+parsing_status = task_store.table('parsing_status')
 
 # 标书生成状态存储
-generation_status = {}
+generation_status = task_store.table('generation_status')
+
+# 存储生成结果
+generation_results = task_store.table('generation_results')
 
-# 存储生成结果的字典
-generation_results = {}
+# 存储解析结果
+parsing_results = task_store.table('parsing_results')
+
+# 各分析单元的指纹与结果，修订版招标文件据此只重新分析修改过的部分
+analysis_units = task_store.table('analysis_units')
+
+# 分片上传：大文件按分片写入磁盘，断线后可续传；单次上传（/api/upload）仍受 MAX_CONTENT_LENGTH 限制
+UPLOAD_MAX_MB = int(os.getenv('UPLOAD_MAX_MB', '200'))
+UPLOAD_CHUNK_MB = int(os.getenv('UPLOAD_CHUNK_MB', '8'))
+chunked_uploads = ChunkedUploads(
+    os.path.join(app.config['UPLOAD_FOLDER'], 'partial'),
+    task_store.table('upload_sessions'),
+    chunk_size=UPLOAD_CHUNK_MB * 1024 * 1024,
+    max_size=UPLOAD_MAX_MB * 1024 * 1024,
+    ttl=float(os.getenv('TASK_TTL_SECONDS', '86400'))
+)
+
+# 后台任务队列配置
+TASK_WORKERS = int(os.getenv('TASK_WORKERS', '4'))
+TASK_QUEUE_SIZE = int(os.getenv('TASK_QUEUE_SIZE', '32'))
+task_queue = TaskQueue(TASK_WORKERS, TASK_QUEUE_SIZE, name='parse-worker')
+
+# 分章节并行生成配置
+GENERATION_WORKERS = int(os.getenv('GENERATION_WORKERS', '2'))
+GENERATION_QUEUE_SIZE = int(os.getenv('GENERATION_QUEUE_SIZE', '16'))
+GENERATION_CHAPTER_CONCURRENCY = int(os.getenv('GENERATION_CHAPTER_CONCURRENCY', '4'))
+GENERATION_CHAPTER_RETRIES = int(os.getenv('GENERATION_CHAPTER_RETRIES', '2'))
+generation_queue = TaskQueue(GENERATION_WORKERS, GENERATION_QUEUE_SIZE, name='generate-worker')
+
+# 历史标书与招标文件检索索引（BM25，配置模型后叠加向量检索）
+SEARCH_DIR = os.getenv('SEARCH_DIR', os.path.join(app.config['UPLOAD_FOLDER'], 'search'))
+SEARCH_GENERATION_PASSAGES = int(os.getenv('SEARCH_GENERATION_PASSAGES', '3'))
+search_index = SearchIndex(SEARCH_DIR, load_embedder(os.getenv('SEARCH_EMBEDDING_MODEL', '')))
+index_queue = TaskQueue(1, 256, name='search-indexer')
+
+# 批量导入历史招标文件：文本提取进程数与同时分析的文档数；接口只接受 BATCH_INPUT_DIR 下的服务器路径
+BATCH_DIR = os.getenv('BATCH_DIR', os.path.join(app.config['UPLOAD_FOLDER'], 'batch'))
+BATCH_INPUT_DIR = os.getenv('BATCH_INPUT_DIR', '')
+BATCH_EXTRACT_WORKERS = int(os.getenv('BATCH_EXTRACT_WORKERS', str(min(4, os.cpu_count() or 1))))
+BATCH_ANALYSIS_CONCURRENCY = int(os.getenv('BATCH_ANALYSIS_CONCURRENCY', '4'))
+# 压缩包通过分片上传（purpose 为 batch）时的大小上限；表单直接上传仍受 MAX_CONTENT_LENGTH 限制
+BATCH_UPLOAD_MAX_MB = int(os.getenv('BATCH_UPLOAD_MAX_MB', '2048'))
+batch_queue = TaskQueue(1, 8, name='batch-ingest')
+
+# 标书存储：元数据索引与压缩的内容块（安装 zstandard 时使用 zstd，否则 gzip）
+PROPOSAL_DIR = os.getenv('PROPOSAL_DIR', os.path.join(app.config['UPLOAD_FOLDER'], 'proposals'))
+proposal_store = ProposalStore(PROPOSAL_DIR, codec=os.getenv('PROPOSAL_CODEC', 'auto'))
+# 启动时导入旧版按文件保存的标书（原文件移到 migrated/ 子目录），默认关闭，也可用命令行单独执行
+PROPOSAL_IMPORT_LEGACY = os.getenv('PROPOSAL_IMPORT_LEGACY', '0') == '1'
+
+# 图片库：原图与缩略图缓存目录，图片响应的浏览器缓存时间（图片按内容寻址，内容不会变化）
+IMAGE_DIR = os.getenv('IMAGE_DIR', os.path.join(app.config['UPLOAD_FOLDER'], 'images'))
+IMAGE_CACHE_MAX_AGE = int(os.getenv('IMAGE_CACHE_MAX_AGE', str(7 * 24 * 3600)))
+image_library = ImageLibrary(IMAGE_DIR)
+
+# 列表接口的每页条数上限
+MAX_PAGE_SIZE = 100
+
+# 指标接口的访问令牌，设置后 /metrics 需携带 Authorization: Bearer <令牌>
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
+TRACE_ID_PATTERN = re.compile(r'^[A-Za-z0-9_-]{1,64}$')
+# 编辑器中用户等待结果的 AI 接口，模型调用按交互优先级调度，其余接口按批量调度
+INTERACTIVE_ENDPOINTS = {'ai_continue', 'ai_expand', 'ai_polish', 'ai_stream'}
 
 jwt = JWTManager(app)
 
+@app.before_request
+def start_trace():
+    """沿用请求头中的 X-Trace-Id（前端在上传后续请求中携带），没有时新建"""
+    trace_id = request.headers.get('X-Trace-Id', '')
+    set_trace_id(trace_id if TRACE_ID_PATTERN.match(trace_id) else new_trace_id())
+    g.request_start = time.perf_counter()
+    # 模型调用按登录用户公平排队；后台任务复制上下文，沿用提交者的用户与优先级
+    set_priority(INTERACTIVE if request.endpoint in INTERACTIVE_ENDPOINTS else BATCH)
+    identity = None
+    try:
+        if verify_jwt_in_request(optional=True):
+            identity = get_jwt_identity()
+    except Exception:
+        # 令牌无效时由接口自身的校验返回错误
+        pass
+    set_identity(identity)
+
+@app.after_request
+def finish_trace(response):
+    """记录接口耗时，并在响应头中返回 trace id"""
+    start = g.pop('request_start', None)
+    if start is not None:
+        HTTP_REQUEST_SECONDS.observe(
+            time.perf_counter() - start,
+            endpoint=request.url_rule.rule if request.url_rule else 'unmatched',
+            method=request.method,
+            status=str(response.status_code)
+        )
+    trace_id = current_trace_id()
+    if trace_id:
+        response.headers['X-Trace-Id'] = trace_id
+    return response
+
 # 模拟用户数据
 USERS = {
     'admin': 'admin123'
 }
 
-def analyze_tender_content(content: str) -> dict:
-    """使用 DeepSeek 分析招标文件内容"""
+def build_analysis_prompt(content: str, part: int = None, total: int = None) -> str:
+    """构建招标文件分析提示词，分块分析时附带分块说明"""
     prompt = f"""
     请分析以下招标文件内容，提取关键信息、评分标准并生成标书大纲。请以JSON格式返回，格式如下：
     {{
@@ -87,87 +320,228 @@ def analyze_tender_content(content: str) -> dict:
     招标文件内容：
     {content}
     """
+    if part is not None and total:
+        prompt = f"""
+    以下内容是招标文件的第 {part}/{total} 部分。请只提取本部分中出现的信息，
+    本部分未涉及的字段填写"未知"或返回空列表，不要臆造内容。
+    """ + prompt
+    return prompt
 
-    try:
-        print("开始调用 DeepSeek API...")
-        print(f"API Key: {DEEPSEEK_API_KEY[:5]}...")  # 只打印前5位
-        print(f"API URL: {DEEPSEEK_API_URL}")
-        
-        headers = {
-            "Authorization": f"Bearer {DEEPSEEK_API_KEY}",
-            "Content-Type": "application/json"
-        }
-        
-        data = {
-            "model": "deepseek-chat",
-            "messages": [
-                {"role": "system", "content": "你是一个专业的标书分析专家，擅长从招标文件中提取关键信息、评分标准并生成标书大纲。请始终以有效的JSON格式返回结果。"},
-                {"role": "user", "content": prompt}
-            ],
-            "temperature": 0.3,
-            "response_format": {"type": "json_object"}
-        }
-        
-        print("发送请求数据:", json.dumps(data, ensure_ascii=False)[:200] + "...")
-        
-        response = requests.post(DEEPSEEK_API_URL, headers=headers, json=data)
-        print(f"API 响应状态码: {response.status_code}")
-        
-        response.raise_for_status()
-        
-        response_json = response.json()
-        print(f"API 响应内容: {response_json['choices'][0]['message']['content'][:200]}...")
-        
-        # 检查返回内容是否为空
-        content_text = response_json['choices'][0]['message']['content']
-        if not content_text or content_text.isspace():
-            raise ValueError("API 返回内容为空")
-            
+# 分析结果的模式：字段类型取自默认值，缺失的字段以默认值补齐
+ANALYSIS_SCHEMA = {
+    'project_info': {
+        'type': 'object',
+        'fields': {'name': '未识别到项目名称', 'type': '未知', 'budget': '未知', 'deadline': '未知', 'requirements': []}
+    },
+    'scoring_criteria': {
+        'type': 'array',
+        'required': ('item',),
+        'fields': {'id': '', 'category': '未知', 'item': '', 'score': '未知', 'description': '', 'requirements': []}
+    },
+    'outline': {
+        'type': 'array',
+        'required': ('title',),
+        'fields': {'id': '', 'title': '', 'required': False, 'description': '', 'key_points': []}
+    }
+}
+
+# 单独重新请求某一部分时使用的格式说明
+ANALYSIS_SECTION_FORMATS = {
+    'project_info': ('项目信息', '{"project_info": {"name": "项目名称", "type": "项目类型", "budget": "预算金额", "deadline": "截止日期", "requirements": ["主要要求1", ...]}}'),
+    'scoring_criteria': ('评分标准', '{"scoring_criteria": [{"id": "1", "category": "评分类别", "item": "评分项", "score": "分值", "description": "评分标准描述", "requirements": ["具体要求1", ...]}, ...]}'),
+    'outline': ('标书大纲', '{"outline": [{"id": "1", "title": "章节标题", "required": true/false, "description": "章节描述", "key_points": ["关键点1", ...]}, ...]}')
+}
+
+ANALYSIS_SYSTEM_PROMPT = "你是一个专业的标书分析专家，擅长从招标文件中提取关键信息、评分标准并生成标书大纲。请始终以有效的JSON格式返回结果。"
+
+def build_section_prompt(content: str, section: str, part: int = None, total: int = None) -> str:
+    """构建只提取某一部分的分析提示词"""
+    label, example = ANALYSIS_SECTION_FORMATS[section]
+    prompt = f"""
+    请从以下招标文件内容中只提取{label}，以JSON格式返回，格式如下：
+    {example}
+    """
+    if part is not None and total:
+        prompt += f"""
+    以下内容是招标文件的第 {part}/{total} 部分，本部分未涉及时返回空列表或填写"未知"，不要臆造内容。
+    """
+    return prompt + f"""
+    招标文件内容：
+    {content}
+    """
+
+def request_analysis_json(prompt: str, schema: dict):
+    """调用模型并按模式解析输出，返回 (规整后的结果, 无效部分列表)；输出为空或不含 JSON 对象时抛出异常"""
+    messages = [
+        {"role": "system", "content": ANALYSIS_SYSTEM_PROMPT},
+        {"role": "user", "content": prompt}
+    ]
+    content_text = llm_client.chat(
+        messages,
+        temperature=0.3,
+        response_format={"type": "json_object"}
+    )
+    logger.debug("API 响应内容: %s...", (content_text or '')[:200])
+    
+    # 检查返回内容是否为空
+    if not content_text or content_text.isspace():
+        raise ValueError("API 返回内容为空")
+    
+    with span('json_parse'):
         try:
-            result = json.loads(content_text)
-            # 验证结果格式
-            if not isinstance(result, dict):
-                raise ValueError("返回结果不是有效的 JSON 对象")
-                
-            # 确保至少包含基本字段
-            if 'project_info' not in result or 'outline' not in result:
-                raise ValueError("返回结果缺少必要字段")
-                
-            return result
-        except json.JSONDecodeError as json_err:
-            print(f"JSON 解析错误: {json_err}")
-            print(f"尝试解析的内容: {content_text[:500]}...")
+            data, repaired = parse_json_object(content_text)
+        except ValueError as json_err:
+            logger.error("JSON 解析错误: %s", json_err)
+            logger.debug("尝试解析的内容: %s...", content_text[:500])
             raise
-    except Exception as e:
-        print(f"分析错误: {str(e)}")
-        # 提供默认返回值
-        default_result = {
-            "project_info": {
-                "name": "未识别到项目名称",
-                "type": "未知",
-                "budget": "未知",
-                "deadline": "未知",
-                "requirements": ["需求提取失败"]
-            },
-            "scoring_criteria": [
-                {
-                    "id": "1",
-                    "category": "未能识别评分类别",
-                    "item": "默认评分项",
-                    "score": "100",
-                    "description": "无法从文档中提取评分标准",
-                    "requirements": ["请手动编辑评分要求"]
-                }
-            ],
-            "outline": generate_standard_outline()
-        }
-        
-        # 确保每个大纲项都有 key_points 字段
-        for item in default_result["outline"]:
-            if "key_points" not in item:
-                item["key_points"] = ["请填写关键点"]
-                
-        return default_result
+        if repaired:
+            logger.warning("模型输出的 JSON 不完整或格式有误，已自动修复")
+        return validate_sections(data, schema)
+
+def request_tender_analysis(content: str, part: int = None, total: int = None) -> dict:
+    """调用 DeepSeek 分析一段招标文件内容
+
+    输出按模式校验，只有个别部分无效时单独重新请求该部分；仍然失败的部分以默认值补齐并记入 warnings。
+    整个输出都无法使用时抛出异常。
+    """
+    with span('prompt_build'):
+        overhead = count_tokens(build_analysis_prompt('', part, total))
+        budgeted = truncate_to_budget(content, PROMPT_MAX_TOKENS - overhead, count_tokens)
+        if budgeted is not content:
+            logger.warning("分析内容超出提示词预算（%s tokens），已截断", PROMPT_MAX_TOKENS)
+        prompt = build_analysis_prompt(budgeted, part, total)
+
+    logger.debug("开始调用 DeepSeek API...")
+    logger.debug("API URL: %s", DEEPSEEK_API_URL)
+    
+    result, invalid = request_analysis_json(prompt, ANALYSIS_SCHEMA)
+    if len(invalid) == len(ANALYSIS_SCHEMA):
+        raise ValueError("返回结果缺少必要字段")
+    
+    warnings = []
+    for section in invalid:
+        label = ANALYSIS_SECTION_FORMATS[section][0]
+        logger.warning("%s无效，单独重新提取", label)
+        try:
+            section_result, section_invalid = request_analysis_json(
+                build_section_prompt(budgeted, section, part, total),
+                {section: ANALYSIS_SCHEMA[section]}
+            )
+            if section_invalid:
+                raise ValueError("返回结果缺少必要字段")
+            result[section] = section_result[section]
+        except Exception as e:
+            logger.error("%s提取错误: %s", label, e)
+            warnings.append(f'{label}提取失败')
+            default = ANALYSIS_SCHEMA[section]
+            result[section] = dict(default['fields']) if default['type'] == 'object' else []
+    if warnings:
+        result['warnings'] = warnings
+    return result
+
+def default_analysis_result(reason: str) -> dict:
+    """分析失败时的默认返回值"""
+    default_result = {
+        "project_info": {
+            "name": "未识别到项目名称",
+            "type": "未知",
+            "budget": "未知",
+            "deadline": "未知",
+            "requirements": ["需求提取失败"]
+        },
+        "scoring_criteria": [
+            {
+                "id": "1",
+                "category": "未能识别评分类别",
+                "item": "默认评分项",
+                "score": "100",
+                "description": "无法从文档中提取评分标准",
+                "requirements": ["请手动编辑评分要求"]
+            }
+        ],
+        "outline": generate_standard_outline(),
+        "warnings": [reason]
+    }
+    
+    # 确保每个大纲项都有 key_points 字段
+    for item in default_result["outline"]:
+        if "key_points" not in item:
+            item["key_points"] = ["请填写关键点"]
+            
+    return default_result
+
+def analyze_tender_content(content: str, previous_units: list = None):
+    """使用 DeepSeek 分析招标文件内容，按章节切分为分析单元并发分析后合并
+
+    传入上一版本的单元清单时，指纹未变的单元直接复用上一版本的结果，
+    只重新分析修改过的章节所在的单元。返回 (分析结果, 单元清单)。
+    """
+    units = split_into_units(content or '', ANALYSIS_UNIT_TOKENS, ANALYSIS_CHUNK_TOKENS)
+    previous = {
+        unit['hash']: unit['result']
+        for unit in previous_units or []
+        if unit.get('result') is not None
+    }
+    total = len(units)
+    results = [previous.get(unit['hash']) for unit in units]
+    pending = [index for index, result in enumerate(results) if result is None]
+    warnings = []
+
+    if previous_units is not None:
+        previous_sections = {digest for unit in previous_units for digest in unit['sections']}
+        changed = sum(1 for unit in units for digest in unit['sections'] if digest not in previous_sections)
+        logger.info("增量分析：%s 个章节有修改，复用 %s/%s 个单元的分析结果", changed, total - len(pending), total)
+    elif total > 1:
+        logger.info("文件内容较长，分为 %s 块并发分析", total)
+
+    if pending:
+        with ThreadPoolExecutor(max_workers=min(len(pending), ANALYSIS_CHUNK_CONCURRENCY)) as executor:
+            futures = {
+                index: executor.submit(
+                    contextvars.copy_context().run,
+                    request_tender_analysis,
+                    units[index]['text'],
+                    *((index + 1, total) if total > 1 else ())
+                )
+                for index in pending
+            }
+            for index, future in futures.items():
+                try:
+                    results[index] = future.result()
+                except Exception as e:
+                    label = f'第 {index + 1}/{total} 块分析' if total > 1 else 'AI分析'
+                    logger.error("%s错误: %s", label, e)
+                    warnings.append(f'{label}失败: {str(e)}')
+
+    # 部分内容提取失败的单元照常合并，但不作为下一版本可复用的结果
+    for index, result in enumerate(results):
+        for warning in (result or {}).get('warnings', []):
+            warnings.append(f'第 {index + 1}/{total} 块{warning}' if total > 1 else warning)
+    manifest = [
+        {'hash': unit['hash'], 'sections': unit['sections'], 'result': None if result and result.get('warnings') else result}
+        for unit, result in zip(units, results)
+    ]
+    succeeded = [result for result in results if result is not None]
+    if not succeeded:
+        if total == 0:
+            return default_analysis_result('未能从文件中提取到文本'), manifest
+        fallback = default_analysis_result(warnings[0] if total == 1 else f'全部 {total} 块分析失败')
+        fallback['failed_units'] = total
+        return fallback, manifest
+    if total == 1:
+        merged = dict(succeeded[0])
+        merged.pop('warnings', None)
+    else:
+        merged = merge_analysis_results(succeeded)
+    if not merged['outline']:
+        merged['outline'] = default_analysis_result('')['outline']
+        warnings.append('未能从文件中提取大纲，已使用标准大纲')
+    if warnings:
+        merged['warnings'] = warnings
+    # 模型调用失败（而非内容不完整）的单元数，批量导入据此把文档记为失败以便续跑时重试
+    if len(succeeded) < total:
+        merged['failed_units'] = total - len(succeeded)
+    return merged, manifest
 
 @app.route('/api/login', methods=['POST'])
 def login():
@@ -194,82 +568,408 @@ def upload_file():
     if file and allowed_file(file.filename):
         filename = secure_filename(file.filename)
         filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        file.save(filepath)
+        with span('upload_save'):
+            file.save(filepath)
         
-        # 创建任务ID并初始化解析状态
-        task_id = f"parse_{int(time.time())}"
-        parsing_status[task_id] = {
-            'progress': 10,
-            'status': 'processing',
-            'message': '文件已上传，开始解析...'
-        }
+        return submit_parsing_task(filepath, request.form.get('previous_task_id'))
+    
+    return jsonify({'error': 'Invalid file type'}), 400
+
+def submit_parsing_task(filepath: str, previous_task_id: str = None, file_hash: str = None):
+    """创建解析任务并交给后台任务队列，立即返回任务ID；传入上一版本的任务ID时增量分析"""
+    task_id = f"parse_{uuid.uuid4().hex}"
+    parsing_status[task_id] = {
+        'progress': 10,
+        'status': 'processing',
+        'message': '文件已上传，等待解析...',
+        'trace_id': current_trace_id()
+    }
+    
+    try:
+        task_queue.submit(task_id, run_parsing_task, task_id, filepath, previous_task_id, file_hash)
+    except QueueFullError:
+        parsing_status.update(task_id, status='error', message='服务器繁忙，请稍后重试')
+        return jsonify({'error': '服务器繁忙，请稍后重试', 'task_id': task_id}), 503
+    
+    return jsonify({
+        'message': '文件上传成功',
+        'task_id': task_id,
+        'trace_id': current_trace_id(),
+        'queue_position': task_queue.position(task_id)
+    }), 202
+
+@app.route('/api/uploads', methods=['POST'])
+@jwt_required()
+def create_chunked_upload():
+    """创建分片上传，返回 upload_id 与分片大小"""
+    data = request.get_json() or {}
+    filename = data.get('filename', '')
+    # purpose 为 batch 时上传的是批量导入的压缩包，完成后创建批次而不是解析任务
+    batch = data.get('purpose') == 'batch'
+    if not (archive_extension(filename) if batch else allowed_file(filename)):
+        return jsonify({'error': 'Invalid file type'}), 400
+    try:
+        size = int(data.get('size', 0))
+        upload = chunked_uploads.create(
+            filename,
+            size,
+            max_size=BATCH_UPLOAD_MAX_MB * 1024 * 1024 if batch else None,
+            owner=get_jwt_identity(),
+            previous_task_id=data.get('previous_task_id'),
+            purpose='batch' if batch else 'parse'
+        )
+    except (TypeError, ValueError):
+        return jsonify({'error': '文件大小无效'}), 400
+    except UploadError as e:
+        return jsonify({'error': str(e)}), 413
+    return jsonify(upload), 201
+
+def get_owned_upload(upload_id: str):
+    upload = chunked_uploads.status(upload_id)
+    if upload is None or upload.get('owner') != get_jwt_identity():
+        return None
+    return upload
+
+@app.route('/api/uploads/<upload_id>', methods=['GET'])
+@jwt_required()
+def get_chunked_upload(upload_id):
+    """查询分片上传进度，断线后从 received 处续传"""
+    upload = get_owned_upload(upload_id)
+    if upload is None:
+        return jsonify({'error': 'Upload not found'}), 404
+    return jsonify(upload), 200
+
+@app.route('/api/uploads/<upload_id>', methods=['PUT'])
+@jwt_required()
+def put_upload_chunk(upload_id):
+    """上传一个分片：请求体为原始字节，查询参数 offset 为分片在文件中的起始位置
+
+    最后一个分片写入后开始解析，返回与 /api/upload 相同的任务信息；批量导入的压缩包则创建批次，
+    返回与 /api/batch-ingest 相同的批次信息。
+    """
+    if get_owned_upload(upload_id) is None:
+        return jsonify({'error': 'Upload not found'}), 404
+    try:
+        offset = int(request.args.get('offset', '-1'))
+        with span('upload_chunk'):
+            upload = chunked_uploads.append(upload_id, offset, request.stream)
+    except ValueError:
+        return jsonify({'error': '偏移量无效'}), 400
+    except UploadOffsetError as e:
+        return jsonify({'error': str(e), 'received': e.received}), 409
+    except UploadBusyError as e:
+        return jsonify({'error': str(e)}), 409
+    except UploadError as e:
+        return jsonify({'error': str(e)}), 413
+    except KeyError:
+        return jsonify({'error': 'Upload not found'}), 404
+    
+    if not upload['complete']:
+        return jsonify(upload), 200
+    
+    # 按 upload_id 命名，同名文件的并发上传不会互相覆盖，解析时文件内容与接收时计算的哈希一致
+    batch = upload.get('purpose') == 'batch'
+    if batch:
+        os.makedirs(os.path.join(BATCH_DIR, 'archives'), exist_ok=True)
+        filepath = os.path.join(BATCH_DIR, 'archives', f"{upload_id}{archive_extension(upload['filename'])}")
+    else:
+        extension = os.path.splitext(upload['filename'])[1].lower()
+        filepath = os.path.join(app.config['UPLOAD_FOLDER'], f'{upload_id}{extension}')
+    try:
+        file_hash = chunked_uploads.complete(upload_id, filepath)
+    except (KeyError, FileNotFoundError):
+        # 并发的最后一个分片请求已经完成了该上传
+        return jsonify({'error': 'Upload not found'}), 404
+    if batch:
+        return create_batch(filepath)
+    return submit_parsing_task(filepath, upload.get('previous_task_id'), file_hash)
+
+def run_parsing_task(task_id: str, filepath: str, previous_task_id: str = None, file_hash: str = None):
+    """后台执行文件解析与AI分析"""
+    try:
+        # 更新状态
+        parsing_status.update(task_id, progress=30, message='正在解析文件内容...')
         
-        # 开始解析过程
-        try:
-            # 更新状态
-            parsing_status[task_id]['progress'] = 30
-            parsing_status[task_id]['message'] = '正在解析文件内容...'
-            
-            # 解析文件内容
-            content = parse_document(filepath)
-            
-            # 更新状态
-            parsing_status[task_id]['progress'] = 60
-            parsing_status[task_id]['message'] = '正在使用AI分析内容...'
+        # 解析文件内容（按文件哈希缓存）
+        cache_info = {}
+        # 分片上传时已在接收过程中计算好哈希，无需重新读取文件
+        if file_hash is None:
+            with span('file_hash'):
+                file_hash = file_sha256(filepath)
+        text_key = f"{file_hash}:{TEXT_EXTRACTOR_VERSION}"
+        content = text_cache.get(text_key)
+        cache_info['text'] = 'hit' if content is not None else 'miss'
+        if content is None:
+            def on_pdf_progress(pages_done, total_pages, pages_per_second):
+                parsing_status.update(
+                    task_id,
+                    message=f'正在解析文件内容（{pages_done}/{total_pages} 页）...',
+                    pages=pages_done,
+                    total_pages=total_pages,
+                    pages_per_second=round(pages_per_second, 1)
+                )
             
-            # 使用大模型分析内容
-            analysis_result = analyze_tender_content(content)
-            
-            # 更新状态
-            parsing_status[task_id]['progress'] = 100
-            parsing_status[task_id]['status'] = 'success'
-            parsing_status[task_id]['message'] = '解析完成'
-            
-            return jsonify({
-                'message': '文件上传成功',
-                'task_id': task_id,
-                'content': content,
-                'project_info': analysis_result['project_info'],
-                'scoring_criteria': analysis_result['scoring_criteria'],
-                'outline': analysis_result['outline']
-            }), 200
-        except Exception as e:
-            # 更新状态
-            parsing_status[task_id]['status'] = 'error'
-            parsing_status[task_id]['message'] = f'解析失败: {str(e)}'
-            return jsonify({'error': f'解析失败: {str(e)}', 'task_id': task_id}), 500
+            with span('extract_text'):
+                content = parse_document(filepath, on_pdf_progress)
+            if content is not None:
+                text_cache.set(text_key, content)
+        
+        run_analysis(task_id, content, cache_info, previous_task_id)
+    except Exception as e:
+        logger.error("解析错误: %s", e)
+        parsing_status.update(task_id, status='error', message=f'解析失败: {str(e)}')
+
+def run_analysis(task_id: str, content: str, cache_info: dict, previous_task_id: str = None,
+                 store_content: bool = True) -> dict:
+    """分析招标文件文本并存储结果，有上一版本时只重新分析修改过的部分，返回分析结果
+
+    store_content 为 False 时解析结果中不保存全文（批量导入的文本已在文本缓存中）。
+    """
+    # 压缩送入模型的文本
+    if PROMPT_COMPACTION:
+        with span('compact'):
+            tokens_before = count_tokens(content)
+            content = compact_text(content)
+            tokens_after = count_tokens(content)
+        parsing_status.update(task_id, compaction={'tokens_before': tokens_before, 'tokens_after': tokens_after})
     
-    return jsonify({'error': 'Invalid file type'}), 400
+    # 更新状态
+    parsing_status.update(task_id, progress=60, message='正在使用AI分析内容...', cache=cache_info)
+    
+    # 使用大模型分析内容（按文本哈希 + 提示词版本 + 模型缓存）
+    analysis_key = f"{text_sha256(content)}:{ANALYSIS_PROMPT_VERSION}:{DEEPSEEK_MODEL}"
+    cached = analysis_cache.get(analysis_key)
+    cache_info['analysis'] = 'hit' if cached is not None else 'miss'
+    parsing_status.update(task_id, cache=cache_info)
+    if cached is not None:
+        analysis_result, units = cached['result'], cached['units']
+    else:
+        previous_units = analysis_units.get(previous_task_id) if previous_task_id else None
+        if previous_units is not None:
+            parsing_status.update(task_id, message='正在分析修订内容...')
+        with span('analysis'):
+            analysis_result, units = analyze_tender_content(content, previous_units)
+        if previous_units is not None:
+            previous_hashes = {unit['hash'] for unit in previous_units}
+            reused = sum(1 for unit in units if unit['hash'] in previous_hashes)
+            parsing_status.update(task_id, incremental={
+                'previous_task_id': previous_task_id,
+                'units': len(units),
+                'reused_units': reused
+            })
+        # 分析失败或部分失败的结果不缓存
+        if not analysis_result.get('warnings'):
+            analysis_cache.set(analysis_key, {'result': analysis_result, 'units': units})
+    analysis_units[task_id] = units
+    
+    # 存储解析结果
+    result = {
+        'project_info': analysis_result['project_info'],
+        'scoring_criteria': analysis_result['scoring_criteria'],
+        'outline': analysis_result['outline'],
+        'warnings': analysis_result.get('warnings', [])
+    }
+    if store_content:
+        result['content'] = content
+    parsing_results[task_id] = result
+    index_document(content, 'tender', analysis_result['project_info'].get('name', ''))
+    
+    # 更新状态
+    if analysis_result.get('warnings'):
+        parsing_status.update(
+            task_id,
+            progress=100,
+            status='success',
+            message='解析完成（部分内容分析失败）',
+            warnings=analysis_result['warnings']
+        )
+    else:
+        parsing_status.update(task_id, progress=100, status='success', message='解析完成')
+    return analysis_result
+
+def run_reanalysis_task(task_id: str, content: str, previous_task_id: str):
+    """后台执行修改后文本的增量分析"""
+    try:
+        run_analysis(task_id, content, {}, previous_task_id)
+    except Exception as e:
+        logger.error("解析错误: %s", e)
+        parsing_status.update(task_id, status='error', message=f'解析失败: {str(e)}')
+
+@app.route('/api/reanalyze', methods=['POST'])
+@jwt_required()
+def reanalyze():
+    """用户修改招标文件文本后重新分析，只分析相对上一版本修改过的章节"""
+    data = request.get_json()
+    content = data.get('content', '')
+    previous_task_id = data.get('previous_task_id')
+    
+    if not content.strip():
+        return jsonify({'error': '内容不能为空'}), 400
+    if not previous_task_id or analysis_units.get(previous_task_id) is None:
+        return jsonify({'error': 'Previous task not found'}), 404
+    
+    task_id = f"parse_{uuid.uuid4().hex}"
+    parsing_status[task_id] = {
+        'progress': 10,
+        'status': 'processing',
+        'message': '等待分析...',
+        'trace_id': current_trace_id()
+    }
+    try:
+        task_queue.submit(task_id, run_reanalysis_task, task_id, content, previous_task_id)
+    except QueueFullError:
+        parsing_status.update(task_id, status='error', message='服务器繁忙，请稍后重试')
+        return jsonify({'error': '服务器繁忙，请稍后重试', 'task_id': task_id}), 503
+    
+    return jsonify({
+        'message': '已提交重新分析',
+        'task_id': task_id,
+        'trace_id': current_trace_id(),
+        'queue_position': task_queue.position(task_id)
+    }), 202
 
 @app.route('/api/parsing-status/<task_id>', methods=['GET'])
 @jwt_required()
 def get_parsing_status(task_id):
     """获取文件解析进度"""
-    if task_id in parsing_status:
-        return jsonify(parsing_status[task_id]), 200
+    status = parsing_status.get(task_id)
+    if status is not None:
+        position = task_queue.position(task_id)
+        if position is not None:
+            status['queue_position'] = position
+            status['message'] = f'排队中，前方还有 {position - 1} 个任务'
+        return jsonify(status), 200
     return jsonify({'error': 'Task not found'}), 404
 
+@app.route('/api/parsing-result/<task_id>', methods=['GET'])
+@jwt_required()
+def get_parsing_result(task_id):
+    """获取文件解析结果"""
+    result = parsing_results.get(task_id)
+    if result is not None:
+        return jsonify(result), 200
+    return jsonify({'error': 'Task result not found'}), 404
+
+def ingest_document(name: str, content: str) -> dict:
+    """批量导入中分析单个文档：与上传解析共用分析缓存、任务存储与检索索引"""
+    task_id = f"batch_{uuid.uuid4().hex}"
+    parsing_status[task_id] = {
+        'progress': 50,
+        'status': 'processing',
+        'message': f'批量导入：{name}',
+        'trace_id': current_trace_id()
+    }
+    try:
+        # 数千份文档的全文不常驻任务存储
+        analysis_result = run_analysis(task_id, content, {}, store_content=False)
+        if analysis_result.get('failed_units'):
+            # 服务商故障时得到的是默认结果，不能记为完成，否则续跑会跳过该文档
+            raise LLMError(f"{analysis_result['failed_units']} 块分析失败: {analysis_result['warnings'][0]}")
+    except Exception as e:
+        parsing_status.update(task_id, status='error', message=f'解析失败: {str(e)}')
+        raise
+    return {
+        'task_id': task_id,
+        'project_info': analysis_result['project_info'],
+        'scoring_criteria': analysis_result['scoring_criteria'],
+        'outline': analysis_result['outline'],
+        'warnings': analysis_result.get('warnings', [])
+    }
+
+batch_ingestor = BatchIngestor(
+    BATCH_DIR,
+    ingest_document,
+    load_text=lambda file_hash: text_cache.get(f"{file_hash}:{TEXT_EXTRACTOR_VERSION}"),
+    save_text=lambda file_hash, content: text_cache.set(f"{file_hash}:{TEXT_EXTRACTOR_VERSION}", content),
+    extract_workers=BATCH_EXTRACT_WORKERS,
+    analysis_concurrency=BATCH_ANALYSIS_CONCURRENCY,
+    pdf_backend=PDF_BACKEND,
+    ocr=OCR_OPTIONS
+)
+
+def run_batch_task(batch_id: str):
+    try:
+        batch_ingestor.run(batch_id)
+    except Exception as e:
+        logger.error("批量导入错误: %s", e)
+
+def submit_batch_task(batch_id: str):
+    try:
+        batch_queue.submit(batch_id, run_batch_task, batch_id)
+    except QueueFullError:
+        return jsonify({'error': '服务器繁忙，请稍后重试', 'batch_id': batch_id}), 503
+    return jsonify({
+        'batch_id': batch_id,
+        'trace_id': current_trace_id(),
+        'queue_position': batch_queue.position(batch_id)
+    }), 202
+
+def archive_extension(filename: str):
+    """压缩包的扩展名（含 .tar.gz），不是支持的压缩包时返回 None"""
+    return next((ext for ext in ARCHIVE_EXTENSIONS if (filename or '').lower().endswith(ext)), None)
+
+def create_batch(source: str):
+    try:
+        batch_id = batch_ingestor.create(source)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return submit_batch_task(batch_id)
+
+@app.route('/api/batch-ingest', methods=['POST'])
+@jwt_required()
+def create_batch_ingest():
+    """批量导入历史招标文件：上传压缩包（zip/tar），或提交 BATCH_INPUT_DIR 下的目录/压缩包路径
+
+    表单上传受 MAX_CONTENT_LENGTH 限制，较大的压缩包通过 /api/uploads 分片上传（purpose 为 batch）。
+    """
+    file = request.files.get('file')
+    if file is not None:
+        extension = archive_extension(file.filename)
+        if extension is None:
+            return jsonify({'error': '仅支持 zip/tar 压缩包'}), 400
+        os.makedirs(os.path.join(BATCH_DIR, 'archives'), exist_ok=True)
+        source = os.path.join(BATCH_DIR, 'archives', f'{uuid.uuid4().hex}{extension}')
+        with span('upload_save'):
+            file.save(source)
+    else:
+        path = (request.get_json(silent=True) or {}).get('path', '')
+        if not BATCH_INPUT_DIR:
+            return jsonify({'error': '未配置 BATCH_INPUT_DIR，只能上传压缩包'}), 400
+        source = safe_join(BATCH_INPUT_DIR, path) if path else None
+        if source is None:
+            return jsonify({'error': '路径无效'}), 400
+
+    return create_batch(source)
+
+@app.route('/api/batch-ingest/<batch_id>', methods=['GET'])
+@jwt_required()
+def get_batch_ingest(batch_id):
+    """批量导入进度：文档总数、已完成/失败数与吞吐（文档/小时）"""
+    status = batch_ingestor.status(secure_filename(batch_id))
+    if status is None:
+        return jsonify({'error': 'Batch not found'}), 404
+    position = batch_queue.position(batch_id)
+    if position is not None:
+        status['queue_position'] = position
+    return jsonify(status), 200
+
+@app.route('/api/batch-ingest/<batch_id>/resume', methods=['POST'])
+@jwt_required()
+def resume_batch_ingest(batch_id):
+    """服务重启或批次中断后，从检查点继续处理尚未成功的文档"""
+    batch_id = secure_filename(batch_id)
+    status = batch_ingestor.status(batch_id)
+    if status is None:
+        return jsonify({'error': 'Batch not found'}), 404
+    if batch_queue.position(batch_id) is not None or batch_ingestor.is_running(batch_id):
+        return jsonify({'error': '批次正在处理中'}), 409
+    return submit_batch_task(batch_id)
+
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in {'pdf', 'docx', 'doc'}
 
-def parse_document(filepath):
-    if filepath.endswith('.pdf'):
-        return parse_pdf(filepath)
-    elif filepath.endswith(('.docx', '.doc')):
-        return parse_docx(filepath)
-    return None
-
-def parse_pdf(filepath):
-    content = []
-    with open(filepath, 'rb') as file:
-        pdf_reader = PyPDF2.PdfReader(file)
-        for page in pdf_reader.pages:
-            content.append(page.extract_text())
-    return '\n'.join(content)
-
-def parse_docx(filepath):
-    doc = Document(filepath)
-    return '\n'.join([paragraph.text for paragraph in doc.paragraphs])
+def parse_document(filepath, on_progress=None):
+    return extract_document_text(filepath, PDF_BACKEND, PDF_WORKERS, on_progress, OCR_OPTIONS)
 
 def extract_project_name(content: str) -> str:
     # 简单的项目名称提取逻辑
@@ -339,10 +1039,201 @@ def refresh():
     new_token = create_access_token(identity=current_user)
     return jsonify({'token': new_token}), 200
 
+# 模型输出按 Markdown 渲染为 HTML（所有标签都会转义），提示词要求输出 Markdown
+MARKDOWN_OUTPUT_INSTRUCTION = "以Markdown格式输出：标题使用 #，列表使用 - 或 1.，表格使用 | 分隔，不要输出HTML标签；原文中的图片标记 ![说明](地址) 原样保留。"
+
+def build_proposal_messages(outline: list, project_info: dict, scoring_criteria: list) -> list:
+    """构建标书生成的对话消息"""
+    prompt = f"""
+    请根据以下信息生成一份完整的标书内容。要求语言专业、结构清晰、内容详实。
+    
+    项目信息：
+    项目名称：{project_info.get('name', '未知项目')}
+    项目类型：{project_info.get('type', '未知')}
+    预算金额：{project_info.get('budget', '未知')}
+    截止日期：{project_info.get('deadline', '未知')}
+    
+    项目要求：
+    {', '.join(project_info.get('requirements', ['无具体要求']))}
+    
+    评分标准：
+    """
+    
+    for criterion in scoring_criteria:
+        prompt += f"\n{criterion.get('category', '')} - {criterion.get('item', '')}: {criterion.get('description', '')}"
+        if criterion.get('requirements'):
+            prompt += f"\n具体要求: {', '.join(criterion.get('requirements', []))}"
+    
+    prompt += f"\n\n请按照以下大纲生成标书内容（{MARKDOWN_OUTPUT_INSTRUCTION}）：\n"
+    
+    for item in outline:
+        prompt += f"\n# {item.get('title')}\n"
+        prompt += f"{item.get('description')}\n"
+        prompt += f"关键点: {', '.join(item.get('key_points') or [])}\n"
+    
+    query = ' '.join([project_info.get('type') or ''] + [item.get('title') or '' for item in outline])
+    prompt = append_references(prompt, query)
+    
+    return [
+        {
+            "role": "system", 
+            "content": "你是一位专业的标书撰写专家，擅长根据项目要求和评分标准生成专业、详实的标书内容。"
+        },
+        {"role": "user", "content": truncate_to_budget(prompt, PROMPT_MAX_TOKENS, count_tokens)}
+    ]
+
+def select_references(query: str, limit: int = None) -> list:
+    """从历史标书中检索与查询相关的段落，供生成时参考"""
+    limit = SEARCH_GENERATION_PASSAGES if limit is None else limit
+    if limit <= 0 or not query.strip():
+        return []
+    try:
+        return search_index.search(query, limit=limit, source='proposal')
+    except Exception as e:
+        logger.error("检索参考段落错误: %s", e)
+        return []
+
+def append_references(prompt: str, query: str) -> str:
+    """附入检索到的参考段落，放不进提示词预算的段落不附入"""
+    references = select_references(query)
+    while references and count_tokens(prompt + format_references(references)) > PROMPT_MAX_TOKENS:
+        references.pop()
+    return prompt + format_references(references)
+
+def format_references(references: list) -> str:
+    """把参考段落拼接为提示词片段"""
+    if not references:
+        return ''
+    text = "\n\n以下是历史标书中的相关段落，可借鉴其中成熟的表述，但须结合本项目调整，不要照抄无关内容："
+    for index, reference in enumerate(references, 1):
+        text += f"\n[{index}] {reference['title']}\n{reference['content']}"
+    return text
+
+def _bigrams(text: str) -> set:
+    """提取文本中的相邻字符对，用于粗略的相关度匹配"""
+    text = ''.join(str(text or '').split())
+    return {text[i:i + 2] for i in range(len(text) - 1)}
+
+def select_chapter_criteria(item: dict, scoring_criteria: list, limit: int = 3) -> list:
+    """挑选与大纲章节最相关的评分标准"""
+    chapter_text = ' '.join([item.get('title') or '', item.get('description') or ''] + list(item.get('key_points') or []))
+    chapter_grams = _bigrams(chapter_text)
+    scored = []
+    for criterion in scoring_criteria:
+        criterion_text = ' '.join([
+            criterion.get('category') or '',
+            criterion.get('item') or '',
+            criterion.get('description') or ''
+        ])
+        overlap = len(chapter_grams & _bigrams(criterion_text))
+        if overlap >= 2:
+            scored.append((overlap, criterion))
+    scored.sort(key=lambda pair: pair[0], reverse=True)
+    return [criterion for _, criterion in scored[:limit]]
+
+def build_chapter_messages(item: dict, project_info: dict, criteria: list) -> list:
+    """构建单个章节生成的对话消息"""
+    prompt = f"""
+    请为以下项目的标书撰写其中一个章节。要求语言专业、结构清晰、内容详实。
+    
+    项目信息：
+    项目名称：{project_info.get('name', '未知项目')}
+    项目类型：{project_info.get('type', '未知')}
+    预算金额：{project_info.get('budget', '未知')}
+    
+    项目要求：
+    {', '.join(project_info.get('requirements', ['无具体要求']))}
+    
+    章节标题：{item.get('title')}
+    章节描述：{item.get('description')}
+    关键点: {', '.join(item.get('key_points') or [])}
+    """
+    
+    if criteria:
+        prompt += "\n本章节相关的评分标准："
+        for criterion in criteria:
+            prompt += f"\n{criterion.get('category', '')} - {criterion.get('item', '')}: {criterion.get('description', '')}"
+            if criterion.get('requirements'):
+                prompt += f"\n具体要求: {', '.join(criterion.get('requirements', []))}"
+    
+    query = ' '.join([item.get('title') or '', item.get('description') or ''] + list(item.get('key_points') or []))
+    prompt = append_references(prompt, query)
+    
+    prompt += f"\n\n请只输出本章节内容，第一行为一级标题“# {item.get('title')}”，小节使用二级、三级标题，{MARKDOWN_OUTPUT_INSTRUCTION}"
+    
+    return [
+        {
+            "role": "system", 
+            "content": "你是一位专业的标书撰写专家，擅长根据项目要求和评分标准生成专业、详实的标书内容。"
+        },
+        {"role": "user", "content": prompt}
+    ]
+
+def generate_chapter(item: dict, project_info: dict, scoring_criteria: list) -> str:
+    """生成单个章节，失败时单独重试，返回HTML"""
+    with span('prompt_build'):
+        messages = build_chapter_messages(item, project_info, select_chapter_criteria(item, scoring_criteria))
+    last_error = None
+    for attempt in range(GENERATION_CHAPTER_RETRIES + 1):
+        try:
+            chapter_content = llm_client.chat(messages, temperature=0.5)
+            if not chapter_content or chapter_content.isspace():
+                raise ValueError("API 返回内容为空")
+            with span('format_html'):
+                return render_markdown(chapter_content)
+        except Exception as e:
+            last_error = e
+            logger.error("章节“%s”第 %s 次生成失败: %s", item.get('title'), attempt + 1, e)
+    raise last_error
+
+def run_chapter_generation(task_id: str, outline: list, project_info: dict, scoring_criteria: list):
+    """按大纲分章节并行生成标书，按顺序拼接已完成的章节"""
+    total = len(outline)
+    if not total:
+        update_generation_status(task_id, 0, 'error', '生成失败: 大纲为空')
+        return
+    
+    chapters = [None] * total
+    failed = []
+    completed = 0
+    update_generation_status(task_id, 5, 'processing', f'正在生成章节（0/{total}）...')
+    
+    with ThreadPoolExecutor(max_workers=min(total, GENERATION_CHAPTER_CONCURRENCY)) as executor:
+        futures = {
+            executor.submit(contextvars.copy_context().run, generate_chapter, item, project_info, scoring_criteria): index
+            for index, item in enumerate(outline)
+        }
+        for future in as_completed(futures):
+            index = futures[future]
+            try:
+                chapters[index] = future.result()
+            except Exception as e:
+                title = outline[index].get('title')
+                failed.append(title)
+                chapters[index] = f'<h1>{escape_html(str(title))}</h1><p>本章节生成失败（{escape_html(str(e))}），请使用AI续写补充。</p>'
+            completed += 1
+            
+            # 按顺序拼接已连续完成的章节，便于前端提前展示
+            ready = []
+            for chapter in chapters:
+                if chapter is None:
+                    break
+                ready.append(chapter)
+            generation_results[task_id] = ''.join(ready)
+            
+            progress = 5 + int(90 * completed / total)
+            update_generation_status(task_id, progress, 'processing', f'正在生成章节（{completed}/{total}）...')
+    
+    generation_results[task_id] = ''.join(chapters)
+    if failed:
+        update_generation_status(task_id, 100, 'success', f"标书生成完成，{len(failed)} 个章节生成失败：{'、'.join(failed)}")
+    else:
+        update_generation_status(task_id, 100, 'success', '标书生成完成')
+
 @app.route('/api/generate-proposal', methods=['POST'])
 @jwt_required()
 def generate_proposal():
-    """生成标书内容"""
+    """生成标书内容，mode 为 chapters 时在后台分章节并行生成"""
     data = request.get_json()
     outline = data.get('outline', [])
     project_info = data.get('projectInfo', {})
@@ -352,74 +1243,38 @@ def generate_proposal():
     if not task_id:
         return jsonify({'error': '缺少任务ID'}), 400
     
+    if data.get('mode') == 'chapters':
+        update_generation_status(task_id, 0, 'processing', '等待生成...')
+        try:
+            generation_queue.submit(task_id, run_chapter_generation, task_id, outline, project_info, scoring_criteria)
+        except QueueFullError:
+            update_generation_status(task_id, 0, 'error', '服务器繁忙，请稍后重试')
+            return jsonify({'error': '服务器繁忙，请稍后重试'}), 503
+        return jsonify({'task_id': task_id}), 202
+    
     # 初始化生成状态
     update_generation_status(task_id, 0, 'processing', '开始生成标书...')
     
     try:
         # 构建提示词
-        prompt = f"""
-        请根据以下信息生成一份完整的标书内容。要求语言专业、结构清晰、内容详实。
-        
-        项目信息：
-        项目名称：{project_info.get('name', '未知项目')}
-        项目类型：{project_info.get('type', '未知')}
-        预算金额：{project_info.get('budget', '未知')}
-        截止日期：{project_info.get('deadline', '未知')}
-        
-        项目要求：
-        {', '.join(project_info.get('requirements', ['无具体要求']))}
-        
-        评分标准：
-        """
-        
-        for criterion in scoring_criteria:
-            prompt += f"\n{criterion.get('category', '')} - {criterion.get('item', '')}: {criterion.get('description', '')}"
-            if criterion.get('requirements'):
-                prompt += f"\n具体要求: {', '.join(criterion.get('requirements', []))}"
-        
-        prompt += "\n\n请按照以下大纲生成标书内容（以HTML格式输出，便于前端显示）：\n"
-        
-        for item in outline:
-            prompt += f"\n# {item.get('title')}\n"
-            prompt += f"{item.get('description')}\n"
-            prompt += f"关键点: {', '.join(item.get('key_points', []))}\n"
+        with span('prompt_build'):
+            messages = build_proposal_messages(outline, project_info, scoring_criteria)
         
         # 更新状态
         update_generation_status(task_id, 30, 'processing', '正在生成标书内容...')
         
-        # 调用AI生成标书内容
-        headers = {
-            "Authorization": f"Bearer {DEEPSEEK_API_KEY}",
-            "Content-Type": "application/json"
-        }
-        
-        data = {
-            "model": "deepseek-chat",
-            "messages": [
-                {
-                    "role": "system", 
-                    "content": "你是一位专业的标书撰写专家，擅长根据项目要求和评分标准生成专业、详实的标书内容。"
-                },
-                {"role": "user", "content": prompt}
-            ],
-            "temperature": 0.5
-        }
-        
         # 更新状态
         update_generation_status(task_id, 60, 'processing', '正在调用AI模型...')
         
-        response = requests.post(DEEPSEEK_API_URL, headers=headers, json=data)
-        response.raise_for_status()
+        # 调用AI生成标书内容
+        proposal_content = llm_client.chat(messages, temperature=0.5)
         
         # 更新状态
         update_generation_status(task_id, 90, 'processing', '正在处理生成结果...')
         
-        # 处理响应结果
-        response_json = response.json()
-        proposal_content = response_json['choices'][0]['message']['content']
-        
         # 将生成的内容转为HTML格式
-        html_content = format_proposal_content(proposal_content)
+        with span('format_html'):
+            html_content = render_markdown(proposal_content)
         
         # 存储生成结果
         generation_results[task_id] = html_content
@@ -429,155 +1284,273 @@ def generate_proposal():
         
         return jsonify({'content': html_content}), 200
     except Exception as e:
-        print(f"生成标书错误: {str(e)}")
+        logger.error("生成标书错误: %s", e)
         update_generation_status(task_id, 0, 'error', f'生成失败: {str(e)}')
         return jsonify({'error': '生成标书失败'}), 500
 
-def format_proposal_content(content):
-    """将Markdown格式转换为HTML格式"""
-    # 简单的格式转换逻辑，实际项目中可以使用Markdown库
-    lines = content.split('\n')
-    html_lines = []
+@app.route('/api/generate-proposal/stream', methods=['POST'])
+@jwt_required()
+def generate_proposal_stream():
+    """流式生成标书内容（SSE）"""
+    data = request.get_json()
+    outline = data.get('outline', [])
+    project_info = data.get('projectInfo', {})
+    scoring_criteria = data.get('scoringCriteria', [])
+    task_id = data.get('task_id')
     
-    for line in lines:
-        if line.startswith('# '):
-            html_lines.append(f'<h1>{line[2:]}</h1>')
-        elif line.startswith('## '):
-            html_lines.append(f'<h2>{line[3:]}</h2>')
-        elif line.startswith('### '):
-            html_lines.append(f'<h3>{line[4:]}</h3>')
-        elif line.startswith('- '):
-            html_lines.append(f'<li>{line[2:]}</li>')
-        else:
-            html_lines.append(f'<p>{line}</p>')
-    
-    return ''.join(html_lines)
+    if not task_id:
+        return jsonify({'error': '缺少任务ID'}), 400
+    
+    update_generation_status(task_id, 0, 'processing', '开始生成标书...')
+    with span('prompt_build'):
+        messages = build_proposal_messages(outline, project_info, scoring_criteria)
+    
+    def on_complete(html_content):
+        generation_results[task_id] = html_content
+        update_generation_status(task_id, 100, 'success', '标书生成完成')
+    
+    def on_error(error):
+        logger.error("生成标书错误: %s", error)
+        update_generation_status(task_id, 0, 'error', f'生成失败: {str(error)}')
+    
+    update_generation_status(task_id, 30, 'processing', '正在生成标书内容...')
+    return stream_llm_response(messages, 0.5, on_complete=on_complete, on_error=on_error)
+
+def sse_event(data: dict, event: str = None) -> str:
+    """编码一条 Server-Sent Event"""
+    message = f"event: {event}\n" if event else ''
+    return message + f"data: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+def stream_llm_response(messages: list, temperature: float, on_complete=None, on_error=None, deltas=None) -> Response:
+    """以 SSE 推送模型输出：delta 事件为HTML片段，done 事件为完整HTML
+
+    deltas 为已有的增量文本来源（如缓存结果），未提供时调用模型流式输出。
+    """
+    def generate():
+        html_parts = []
+        try:
+            source = deltas if deltas is not None else llm_client.stream_chat(messages, temperature=temperature)
+            for html in iter_markdown_html(source):
+                html_parts.append(html)
+                yield sse_event({'delta': html})
+            html_content = ''.join(html_parts)
+            if on_complete:
+                on_complete(html_content)
+            yield sse_event({'content': html_content}, event='done')
+        except Exception as e:
+            if on_error:
+                on_error(e)
+            else:
+                logger.error("流式输出错误: %s", e)
+            yield sse_event({'error': str(e)}, event='error')
+    
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
 
 @app.route('/api/save-proposal', methods=['POST'])
 @jwt_required()
 def save_proposal():
-    """保存标书内容"""
-    data = request.get_json()
+    """保存标书内容；携带 proposal_id 时保存为该标书的新版本"""
+    data = request.get_json() or {}
     content = data.get('content', '')
-    project_info = data.get('projectInfo', {})
-    project_name = project_info.get('name', 'unnamed_project')
+    project_info = data.get('projectInfo') or {}
+    project_name = str(project_info.get('name') or 'unnamed_project').strip()[:200]
+    if not isinstance(content, str):
+        return jsonify({'error': '内容无效'}), 400
     
-    # 创建保存目录
-    save_dir = os.path.join(app.config['UPLOAD_FOLDER'], 'proposals')
-    os.makedirs(save_dir, exist_ok=True)
-    
-    # 保存HTML文件
-    file_path = os.path.join(save_dir, f"{project_name}_{int(time.time())}.html")
-    with open(file_path, 'w', encoding='utf-8') as f:
-        f.write(content)
+    try:
+        if data.get('proposal_id') is not None:
+            get_owned_proposal(data['proposal_id'])
+        proposal = proposal_store.save(content, project_name, get_jwt_identity(), data.get('proposal_id'))
+    except ProposalNotFound:
+        return jsonify({'error': 'Proposal not found'}), 404
+    index_document(html_to_text(content), 'proposal', project_name, proposal['id'], proposal['version'])
     
-    return jsonify({'message': '标书保存成功', 'path': file_path}), 200
+    return jsonify(dict(proposal, message='标书保存成功', proposal_id=proposal['id'])), 200
+
+def pagination_args():
+    """读取分页参数 page（从1开始）与 page_size"""
+    try:
+        page = max(1, int(request.args.get('page', 1)))
+        page_size = min(max(1, int(request.args.get('page_size', 20))), MAX_PAGE_SIZE)
+    except ValueError:
+        page, page_size = 1, 20
+    return page, page_size
+
+def get_owned_proposal(proposal_id: str) -> dict:
+    """当前用户可以访问的标书：本人保存的，或未记录作者的旧版导入；其他用户的标书按不存在处理"""
+    proposal = proposal_store.get(proposal_id)
+    if proposal['author'] not in ('', get_jwt_identity()):
+        raise ProposalNotFound(proposal_id)
+    return proposal
+
+@app.route('/api/proposals', methods=['GET'])
+@jwt_required()
+def list_proposals():
+    """分页列出当前用户可以访问的标书，可按项目名称 project 与作者 author 筛选"""
+    page, page_size = pagination_args()
+    result = proposal_store.list(
+        page, page_size, request.args.get('project'), request.args.get('author'), owner=get_jwt_identity()
+    )
+    return jsonify(result), 200
+
+@app.route('/api/proposals/<proposal_id>', methods=['GET'])
+@jwt_required()
+def get_proposal(proposal_id):
+    """标书信息与分页的版本列表"""
+    page, page_size = pagination_args()
+    try:
+        proposal = get_owned_proposal(proposal_id)
+        proposal['versions'] = proposal_store.versions(proposal_id, page, page_size)
+    except ProposalNotFound:
+        return jsonify({'error': 'Proposal not found'}), 404
+    return jsonify(proposal), 200
+
+@app.route('/api/proposals/<proposal_id>/content', methods=['GET'])
+@jwt_required()
+def get_proposal_content(proposal_id):
+    """读取标书内容，version 指定版本，默认最新版本"""
+    version = request.args.get('version', type=int)
+    try:
+        proposal = get_owned_proposal(proposal_id)
+        version = version or proposal['version']
+        content = proposal_store.content(proposal_id, version)
+    except ProposalNotFound:
+        return jsonify({'error': 'Proposal not found'}), 404
+    return jsonify({'id': proposal_id, 'project': proposal['project'], 'version': version, 'content': content}), 200
 
 @app.route('/api/download-proposal', methods=['POST'])
 @jwt_required()
 def download_proposal():
-    """下载标书为DOCX"""
+    """下载标书为DOCX（边转换边输出，不写临时文件）"""
     data = request.get_json()
     content = data.get('content', '')
     project_info = data.get('projectInfo', {})
     project_name = project_info.get('name', 'unnamed_project')
     
     try:
-        # 创建一个临时目录
-        temp_dir = os.path.join(app.config['UPLOAD_FOLDER'], 'temp')
-        os.makedirs(temp_dir, exist_ok=True)
-        
-        # 将HTML内容保存为临时文件
-        html_path = os.path.join(temp_dir, f"{project_name}_temp.html")
-        with open(html_path, 'w', encoding='utf-8') as f:
-            f.write(f"""<!DOCTYPE html>
-            <html>
-            <head>
-                <meta charset="utf-8">
-                <title>{project_name}</title>
-                <style>
-                    body {{ font-family: 'SimSun', serif; margin: 2cm; }}
-                    h1, h2, h3 {{ color: #333; }}
-                    table {{ border-collapse: collapse; width: 100%; }}
-                    table, th, td {{ border: 1px solid #ddd; padding: 8px; }}
-                </style>
-            </head>
-            <body>
-                {content}
-            </body>
-            </html>
-            """)
-        
-        # 调用第三方服务或库将HTML转换为DOCX
-        # 这里为了简单演示，我们直接使用python-docx
-        docx_path = os.path.join(temp_dir, f"{project_name}.docx")
-        doc = Document()
-        
-        # 添加标题
-        doc.add_heading(project_name, 0)
-        
-        # 这里需要解析HTML并添加到docx中
-        # 为了简化，我们假设HTML已经被解析成文本
-        doc.add_paragraph("项目信息：")
-        doc.add_paragraph(f"项目名称：{project_info.get('name', '未知项目')}")
-        doc.add_paragraph(f"项目类型：{project_info.get('type', '未知')}")
-        doc.add_paragraph(f"预算金额：{project_info.get('budget', '未知')}")
-        doc.add_paragraph(f"截止日期：{project_info.get('deadline', '未知')}")
-        
-        # 导出文档
-        doc.save(docx_path)
-        
-        # 返回文件
-        return send_file(
-            docx_path,
-            as_attachment=True,
-            download_name=f"{project_name}.docx",
-            mimetype='application/vnd.openxmlformats-officedocument.wordprocessingml.document'
-        )
+        chunks = iter_docx_export(content, title=project_name, image_loader=load_static_image)
+        # 先取出首段数据，使转换前期的错误仍能以 JSON 返回
+        first_chunk = next(chunks)
     except Exception as e:
-        print(f"下载标书错误: {str(e)}")
+        logger.error("下载标书错误: %s", e)
         return jsonify({'error': '下载标书失败'}), 500
-
-@app.route('/api/ai-continue', methods=['POST'])
-@jwt_required()
-def ai_continue():
-    """AI续写功能"""
-    data = request.get_json()
-    content = data.get('content', '')
-    context = data.get('context', {})
     
+    def generate():
+        yield first_chunk
+        try:
+            yield from chunks
+        except Exception as e:
+            logger.error("下载标书错误: %s", e)
+            raise
+    
+    return Response(
+        generate(),
+        mimetype='application/vnd.openxmlformats-officedocument.wordprocessingml.document',
+        headers={'Content-Disposition': attachment_disposition(f"{project_name}.docx")}
+    )
+
+def load_static_image(src: str):
+    """读取编辑器中引用的本地图片（/static/... 或图片库 /api/images/...），其他地址返回 None"""
+    path = urlparse(src).path
+    if path.startswith('/api/images/'):
+        image = image_library.get(path[len('/api/images/'):].split('/')[0])
+        if image is None:
+            return None
+        with open(image_library.original_path(image), 'rb') as f:
+            return f.read()
+    if not path.startswith('/static/'):
+        return None
+    filepath = safe_join(app.static_folder, path[len('/static/'):])
+    if not filepath or not os.path.isfile(filepath):
+        return None
+    with open(filepath, 'rb') as f:
+        return f.read()
+
+def attachment_disposition(filename: str) -> str:
+    """生成附件下载头，非 ASCII 文件名按 RFC 5987 编码"""
+    fallback = filename.encode('ascii', 'ignore').decode('ascii').replace('"', '') or 'proposal.docx'
+    return f"attachment; filename=\"{fallback}\"; filename*=UTF-8''{quote(filename)}"
+
+def build_continue_messages(content: str, context: dict) -> list:
+    """构建AI续写的对话消息"""
+    context = context or {}
     prompt = f"""
     请基于下面的标书内容续写，保持风格一致，内容专业：
     
-    {content}
+    {html_to_markdown(content)}
+    
+    请续写关于"{context.get('label', '下一部分')}"的内容，只输出续写的部分，{MARKDOWN_OUTPUT_INSTRUCTION}
+    """
+    return [
+        {"role": "system", "content": "你是一位专业的标书撰写专家，擅长续写标书内容。"},
+        {"role": "user", "content": prompt}
+    ]
+
+def build_expand_messages(content: str, context: dict) -> list:
+    """构建AI扩写的对话消息"""
+    context = context or {}
+    prompt = f"""
+    请扩展以下标书内容，使其更加详细、专业，增加相关细节和专业术语：
+    
+    {html_to_markdown(content)}
     
-    请续写关于"{context.get('label', '下一部分')}"的内容。
+    特别关注"{context.get('label', '全文')}"部分。输出扩写后的全文，{MARKDOWN_OUTPUT_INSTRUCTION}
     """
+    return [
+        {"role": "system", "content": "你是一位专业的标书撰写专家，擅长扩展标书内容使其更加专业详实。"},
+        {"role": "user", "content": prompt}
+    ]
+
+def build_polish_messages(content: str, context: dict = None) -> list:
+    """构建AI润色的对话消息"""
+    prompt = f"""
+    请对以下标书内容进行润色，提升语言表达，修正语法错误，使文档更加专业、流畅：
+    
+    {html_to_markdown(content)}
+    
+    输出润色后的全文，保持原有的标题与段落结构，{MARKDOWN_OUTPUT_INSTRUCTION}
+    """
+    return [
+        {"role": "system", "content": "你是一位专业的标书语言专家，擅长润色和优化标书语言表达。"},
+        {"role": "user", "content": prompt}
+    ]
+
+def ai_cache_key(action: str, content: str, context: dict, temperature: float) -> str:
+    """AI编辑响应缓存键：操作、归一化内容、章节标题、模型与温度"""
+    label = (context or {}).get('label') if action != 'polish' else None
+    normalized = ' '.join((content or '').split())
+    return text_sha256(json.dumps([action, normalized, label, DEEPSEEK_MODEL, temperature], ensure_ascii=False))
+
+def cached_ai_stream(key: str, messages: list, temperature: float):
+    """流式调用模型，完整输出后写入响应缓存；命中缓存时直接产出缓存内容"""
+    cached = ai_response_cache.get(key)
+    if cached is not None:
+        yield cached
+        return
+    parts = []
+    for delta in llm_client.stream_chat(messages, temperature=temperature):
+        parts.append(delta)
+        yield delta
+    ai_response_cache.set(key, ''.join(parts))
+
+@app.route('/api/ai-continue', methods=['POST'])
+@jwt_required()
+def ai_continue():
+    """AI续写功能"""
+    data = request.get_json()
+    messages = build_continue_messages(data.get('content', ''), data.get('context'))
+    key = ai_cache_key('continue', data.get('content', ''), data.get('context'), 0.3)
     
     try:
-        headers = {
-            "Authorization": f"Bearer {DEEPSEEK_API_KEY}",
-            "Content-Type": "application/json"
-        }
-        
-        data = {
-            "model": "deepseek-chat",
-            "messages": [
-                {"role": "system", "content": "你是一位专业的标书撰写专家，擅长续写标书内容。"},
-                {"role": "user", "content": prompt}
-            ],
-            "temperature": 0.3
-        }
-        
-        response = requests.post(DEEPSEEK_API_URL, headers=headers, json=data)
-        response.raise_for_status()
+        continued_content = ai_response_cache.get_or_compute(key, lambda: llm_client.chat(messages, temperature=0.3))
         
-        response_json = response.json()
-        continued_content = response_json['choices'][0]['message']['content']
-        
-        return jsonify({'continuedContent': continued_content}), 200
+        return jsonify({'continuedContent': render_markdown(continued_content)}), 200
     except Exception as e:
-        print(f"AI续写错误: {str(e)}")
+        logger.error("AI续写错误: %s", e)
         return jsonify({'error': 'AI续写失败'}), 500
 
 @app.route('/api/ai-expand', methods=['POST'])
@@ -585,41 +1558,15 @@ def ai_continue():
 def ai_expand():
     """AI扩写功能"""
     data = request.get_json()
-    content = data.get('content', '')
-    context = data.get('context', {})
-    
-    prompt = f"""
-    请扩展以下标书内容，使其更加详细、专业，增加相关细节和专业术语：
-    
-    {content}
-    
-    特别关注"{context.get('label', '全文')}"部分。
-    """
+    messages = build_expand_messages(data.get('content', ''), data.get('context'))
+    key = ai_cache_key('expand', data.get('content', ''), data.get('context'), 0.3)
     
     try:
-        headers = {
-            "Authorization": f"Bearer {DEEPSEEK_API_KEY}",
-            "Content-Type": "application/json"
-        }
-        
-        data = {
-            "model": "deepseek-chat",
-            "messages": [
-                {"role": "system", "content": "你是一位专业的标书撰写专家，擅长扩展标书内容使其更加专业详实。"},
-                {"role": "user", "content": prompt}
-            ],
-            "temperature": 0.3
-        }
+        expanded_content = ai_response_cache.get_or_compute(key, lambda: llm_client.chat(messages, temperature=0.3))
         
-        response = requests.post(DEEPSEEK_API_URL, headers=headers, json=data)
-        response.raise_for_status()
-        
-        response_json = response.json()
-        expanded_content = response_json['choices'][0]['message']['content']
-        
-        return jsonify({'expandedContent': expanded_content}), 200
+        return jsonify({'expandedContent': render_markdown(expanded_content)}), 200
     except Exception as e:
-        print(f"AI扩写错误: {str(e)}")
+        logger.error("AI扩写错误: %s", e)
         return jsonify({'error': 'AI扩写失败'}), 500
 
 @app.route('/api/ai-polish', methods=['POST'])
@@ -627,111 +1574,256 @@ def ai_expand():
 def ai_polish():
     """AI润色功能"""
     data = request.get_json()
-    content = data.get('content', '')
-    
-    prompt = f"""
-    请对以下标书内容进行润色，提升语言表达，修正语法错误，使文档更加专业、流畅：
-    
-    {content}
-    """
+    messages = build_polish_messages(data.get('content', ''))
+    key = ai_cache_key('polish', data.get('content', ''), None, 0.3)
     
     try:
-        headers = {
-            "Authorization": f"Bearer {DEEPSEEK_API_KEY}",
-            "Content-Type": "application/json"
-        }
-        
-        data = {
-            "model": "deepseek-chat",
-            "messages": [
-                {"role": "system", "content": "你是一位专业的标书语言专家，擅长润色和优化标书语言表达。"},
-                {"role": "user", "content": prompt}
-            ],
-            "temperature": 0.3
-        }
-        
-        response = requests.post(DEEPSEEK_API_URL, headers=headers, json=data)
-        response.raise_for_status()
+        polished_content = ai_response_cache.get_or_compute(key, lambda: llm_client.chat(messages, temperature=0.3))
         
-        response_json = response.json()
-        polished_content = response_json['choices'][0]['message']['content']
-        
-        return jsonify({'polishedContent': polished_content}), 200
+        return jsonify({'polishedContent': render_markdown(polished_content)}), 200
     except Exception as e:
-        print(f"AI润色错误: {str(e)}")
+        logger.error("AI润色错误: %s", e)
         return jsonify({'error': 'AI润色失败'}), 500
 
+# AI编辑功能的流式版本：action -> 消息构建函数
+AI_STREAM_ACTIONS = {
+    'continue': build_continue_messages,
+    'expand': build_expand_messages,
+    'polish': build_polish_messages
+}
+
+@app.route('/api/ai-<action>/stream', methods=['POST'])
+@jwt_required()
+def ai_stream(action):
+    """AI续写/扩写/润色的流式版本（SSE）"""
+    if action not in AI_STREAM_ACTIONS:
+        return jsonify({'error': 'Unknown action'}), 404
+    
+    data = request.get_json()
+    messages = AI_STREAM_ACTIONS[action](data.get('content', ''), data.get('context'))
+    key = ai_cache_key(action, data.get('content', ''), data.get('context'), 0.3)
+    return stream_llm_response(messages, 0.3, deltas=cached_ai_stream(key, messages, 0.3))
+
+@app.route('/api/stats', methods=['GET'])
+@jwt_required()
+def get_stats():
+    """运行统计：大模型调用、缓存命中率与任务队列"""
+    return jsonify({
+        'llm': llm_client.stats(),
+        'llm_scheduler': llm_scheduler.stats(),
+        'ai_response_cache': ai_response_cache.stats(),
+        'text_cache': text_cache.stats(),
+        'analysis_cache': analysis_cache.stats(),
+        'task_queue': task_queue.stats(),
+        'generation_queue': generation_queue.stats(),
+        'proposal_store': proposal_store.stats()
+    }), 200
+
+@app.route('/api/traces/<trace_id>', methods=['GET'])
+@jwt_required()
+def get_trace(trace_id):
+    """获取一条链路（上传、解析、生成）各阶段的耗时"""
+    spans = traces.get(trace_id)
+    if spans is None:
+        return jsonify({'error': 'Trace not found'}), 404
+    return jsonify({'trace_id': trace_id, 'spans': spans}), 200
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Prometheus 格式的运行指标"""
+    if METRICS_TOKEN and request.headers.get('Authorization') != f'Bearer {METRICS_TOKEN}':
+        return jsonify({'error': 'Unauthorized'}), 401
+    return Response(metrics_registry.render(), mimetype='text/plain; version=0.0.4')
+
+def collect_queue_metrics(field: str) -> dict:
+    queues = (task_queue, generation_queue, index_queue)
+    values = {(queue.name,): queue.stats()[field] for queue in queues}
+    # 大模型调度队列按优先级分别统计
+    scheduler_stats = llm_scheduler.stats()[field]
+    values.update({(f'{llm_scheduler.name}-{priority}',): count for priority, count in scheduler_stats.items()})
+    return values
+
+def collect_cache_metrics(field: str) -> dict:
+    caches = {'text': text_cache, 'analysis': analysis_cache, 'ai_response': ai_response_cache}
+    return {(name,): cache.stats().get(field, 0) for name, cache in caches.items()}
+
+def collect_cache_hit_ratio() -> dict:
+    ratios = {}
+    for name, stats in (('text', text_cache.stats()), ('analysis', analysis_cache.stats()), ('ai_response', ai_response_cache.stats())):
+        served = stats['hits'] + stats.get('coalesced', 0)
+        requests_total = served + stats['misses']
+        ratios[(name,)] = round(served / requests_total, 4) if requests_total else 0.0
+    return ratios
+
+metrics_registry.collected('aitender_queue_depth', '等待执行的后台任务数', ('queue',),
+                           lambda: collect_queue_metrics('queued'))
+metrics_registry.collected('aitender_queue_running', '正在执行的后台任务数', ('queue',),
+                           lambda: collect_queue_metrics('running'))
+metrics_registry.collected('aitender_cache_hits', '缓存命中次数', ('cache',),
+                           lambda: collect_cache_metrics('hits'), type='counter')
+metrics_registry.collected('aitender_cache_misses', '缓存未命中次数', ('cache',),
+                           lambda: collect_cache_metrics('misses'), type='counter')
+metrics_registry.collected('aitender_cache_coalesced', '与进行中的相同请求合并的次数', ('cache',),
+                           lambda: collect_cache_metrics('coalesced'), type='counter')
+metrics_registry.collected('aitender_cache_hit_ratio', '缓存命中率（命中与合并的请求占比）', ('cache',),
+                           collect_cache_hit_ratio)
+
+def image_urls(image: dict) -> dict:
+    return dict(
+        image,
+        url=f"/api/images/{image['id']}",
+        thumbnail_url=f"/api/images/{image['id']}/thumbnail?width=320"
+    )
+
 @app.route('/api/image-library', methods=['GET'])
 @jwt_required()
 def get_image_library():
-    """获取图片库"""
-    # 创建图片库目录
-    image_dir = os.path.join(app.config['UPLOAD_FOLDER'], 'images')
-    os.makedirs(image_dir, exist_ok=True)
-    
-    # 模拟图片数据
-    images = [
-        {"id": 1, "name": "公司logo", "url": "/static/images/logo.png", "category": "公司形象"},
-        {"id": 2, "name": "项目示意图", "url": "/static/images/project.png", "category": "项目展示"},
-        {"id": 3, "name": "组织架构", "url": "/static/images/org.png", "category": "团队介绍"},
-        {"id": 4, "name": "资质证书", "url": "/static/images/cert.png", "category": "资质证明"},
-        {"id": 5, "name": "技术流程", "url": "/static/images/flow.png", "category": "技术方案"}
-    ]
-    
-    return jsonify(images), 200
+    """分页获取图片库，可按分类 category 与名称 q 筛选"""
+    page, page_size = pagination_args()
+    result = image_library.list(page, page_size, request.args.get('category'), request.args.get('q'))
+    result['items'] = [image_urls(image) for image in result['items']]
+    result['categories'] = image_library.categories()
+    return jsonify(result), 200
+
+@app.route('/api/image-library', methods=['POST'])
+@jwt_required()
+def upload_library_image():
+    """上传图片到图片库（表单字段 file、category、name）"""
+    file = request.files.get('file')
+    if file is None or file.filename == '':
+        return jsonify({'error': 'No file part'}), 400
+    try:
+        with span('upload_save'):
+            image = image_library.add(
+                file.stream,
+                request.form.get('name') or file.filename,
+                request.form.get('category', ''),
+                get_jwt_identity()
+            )
+    except ImageError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify(image_urls(image)), 201
+
+@app.route('/api/image-library/categories', methods=['GET'])
+@jwt_required()
+def get_image_categories():
+    """图片分类及各分类的图片数"""
+    return jsonify(image_library.categories()), 200
+
+def send_image(path: str, image_format: str, etag: str):
+    """发送图片文件，支持 ETag/Last-Modified 条件请求与 Range 请求"""
+    response = send_file(
+        path,
+        mimetype=MIME_TYPES[image_format],
+        conditional=True,
+        etag=etag,
+        max_age=IMAGE_CACHE_MAX_AGE
+    )
+    response.headers['Accept-Ranges'] = 'bytes'
+    response.headers['Vary'] = 'Accept'
+    return response
+
+# 图片地址供编辑器中的 <img> 直接引用（无法携带 JWT），图片ID取自内容哈希，不可枚举
+@app.route('/api/images/<image_id>', methods=['GET'])
+def get_image(image_id):
+    """获取原图"""
+    image = image_library.get(image_id)
+    if image is None:
+        return jsonify({'error': 'Image not found'}), 404
+    return send_image(image_library.original_path(image), image['format'], image['id'])
+
+@app.route('/api/images/<image_id>/thumbnail', methods=['GET'])
+def get_image_thumbnail(image_id):
+    """获取缩略图，width 为目标宽度；浏览器支持 WebP 时返回 WebP"""
+    image = image_library.get(image_id)
+    if image is None:
+        return jsonify({'error': 'Image not found'}), 404
+    width = request.args.get('width', 320, type=int)
+    webp = 'image/webp' in request.headers.get('Accept', '')
+    with span('image_thumbnail'):
+        path, image_format = image_library.thumbnail(image, width, webp)
+    return send_image(path, image_format, f"{image['id']}-{os.path.basename(path)}")
 
 @app.route('/api/search-content', methods=['POST'])
 @jwt_required()
 def search_content():
-    """联网搜索相关内容"""
-    data = request.get_json()
-    query = data.get('query', '')
+    """检索历史标书与招标文件中的相关段落"""
+    data = request.get_json(silent=True) or {}
+    query = data.get('query') or ''
+    source = data.get('source')
+    try:
+        limit = min(max(1, int(data.get('limit', 10))), 50)
+    except (TypeError, ValueError):
+        return jsonify({'error': 'limit 无效'}), 400
+    if not isinstance(query, str) or source not in (None, 'proposal', 'tender'):
+        return jsonify({'error': '参数无效'}), 400
     
-    # 模拟搜索结果
-    search_results = [
-        {
-            "title": f"关于{query}的行业标准",
-            "content": f"{query}是一种重要的技术/产品/服务，在行业中有明确的标准和规范...",
-            "source": "行业标准网"
-        },
-        {
-            "title": f"{query}最新研究进展",
-            "content": f"近期研究表明，{query}在应用领域有了新的突破...",
-            "source": "技术研究中心"
-        },
-        {
-            "title": f"{query}成功案例分析",
-            "content": f"某公司成功应用{query}解决了实际问题...",
-            "source": "案例分析网"
-        }
-    ]
+    if not query.strip():
+        return jsonify([]), 200
     
-    return jsonify(search_results), 200
+    try:
+        return jsonify(search_index.search(query, limit=limit, source=source)), 200
+    except Exception as e:
+        logger.error("检索错误: %s", e)
+        return jsonify({'error': '检索失败'}), 500
+
+def index_document(text: str, source: str, title: str = '', key: str = None, version: int = 0):
+    """在后台把文档加入检索索引；带 key 时只保留该 key 最新版本的段落"""
+    try:
+        index_queue.submit(f"index_{uuid.uuid4().hex}", index_passages, text, source, title, key, version)
+    except QueueFullError:
+        logger.warning("检索索引队列已满，跳过: %s", title)
+
+def index_passages(text: str, source: str, title: str = '', key: str = None, version: int = 0):
+    with span('search_index'):
+        search_index.add_document(text, source, title, key, version)
+
+def import_legacy_proposals(directory: str = None) -> int:
+    """导入旧版按文件保存的标书并加入检索索引（内容相同的文档不会重复索引），返回导入数"""
+    imported = proposal_store.import_legacy(
+        directory or PROPOSAL_DIR,
+        lambda proposal, content: search_index.add_document(
+            html_to_text(content), 'proposal', proposal['project'], proposal['id'], proposal['version']
+        )
+    )
+    if imported:
+        logger.info("已导入 %s 份旧版标书", imported)
+    return imported
 
 def update_generation_status(task_id: str, progress: int, status: str, message: str):
     """更新生成状态"""
     generation_status[task_id] = {
         'progress': progress,
         'status': status,
-        'message': message
+        'message': message,
+        'trace_id': current_trace_id()
     }
 
 @app.route('/api/generation-status/<task_id>', methods=['GET'])
 @jwt_required()
 def get_generation_status(task_id):
     """获取标书生成进度"""
-    if task_id in generation_status:
-        return jsonify(generation_status[task_id]), 200
+    status = generation_status.get(task_id)
+    if status is not None:
+        position = generation_queue.position(task_id)
+        if position is not None:
+            status['queue_position'] = position
+            status['message'] = f'排队中，前方还有 {position - 1} 个任务'
+        return jsonify(status), 200
     return jsonify({'error': 'Task not found'}), 404
 
 @app.route('/api/generation-result/<task_id>', methods=['GET'])
 @jwt_required()
 def get_generation_result(task_id):
     """获取标书生成结果"""
-    if task_id in generation_results:
-        return jsonify({'content': generation_results[task_id]}), 200
+    content = generation_results.get(task_id)
+    if content is not None:
+        return jsonify({'content': content}), 200
     return jsonify({'error': 'Task result not found'}), 404
 
+if PROPOSAL_IMPORT_LEGACY:
+    index_queue.submit('legacy_import', import_legacy_proposals)
+
 if __name__ == '__main__':
     os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
     static_dir = os.path.join(app.root_path, 'static')
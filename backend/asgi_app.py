@@ -0,0 +1,351 @@
+"""ASGI 服务模式：大模型相关接口使用异步客户端，单进程即可同时挂起数百个进行中的请求，
+其余接口仍由 Flask 应用处理
+
+    cd backend && uvicorn asgi_app:app --host 0.0.0.0 --port 5000
+"""
+import asyncio
+import json
+import logging
+import os
+import time
+from contextlib import asynccontextmanager
+
+from a2wsgi import WSGIMiddleware
+from flask_jwt_extended import get_jwt_identity, verify_jwt_in_request
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Mount, Route
+
+from app import (
+    app as flask_app,
+    DEEPSEEK_API_URL,
+    DEEPSEEK_API_KEY,
+    DEEPSEEK_MODEL,
+    QueueFullError,
+    generation_queue,
+    generation_results,
+    update_generation_status,
+    run_chapter_generation,
+    build_proposal_messages,
+    build_continue_messages,
+    build_expand_messages,
+    build_polish_messages,
+    sse_event,
+    ai_cache_key,
+    ai_response_cache,
+    llm_limits,
+    LLM_INTERACTIVE_RESERVED,
+    LLM_USER_WEIGHTS,
+    TRACE_ID_PATTERN
+)
+from llm_client import AsyncLLMClient
+from llm_scheduler import LLMScheduler, INTERACTIVE, BATCH, set_identity, set_priority, reset_identity, reset_priority
+from markdown_html import MarkdownRenderer, render_markdown
+from metrics import HTTP_REQUEST_SECONDS, new_trace_id, set_trace_id, reset_trace_id, span
+
+logger = logging.getLogger(__name__)
+
+# 异步大模型客户端：协程不占用线程，并发上限可远高于同步模式；与同步客户端共享服务商配额
+ASYNC_LLM_MAX_CONCURRENCY = int(os.getenv('ASYNC_LLM_MAX_CONCURRENCY', '256'))
+async_llm_client = AsyncLLMClient(
+    DEEPSEEK_API_URL,
+    DEEPSEEK_API_KEY,
+    model=DEEPSEEK_MODEL,
+    max_concurrency=ASYNC_LLM_MAX_CONCURRENCY,
+    connect_timeout=float(os.getenv('LLM_CONNECT_TIMEOUT', '10')),
+    read_timeout=float(os.getenv('LLM_READ_TIMEOUT', '300')),
+    max_retries=int(os.getenv('LLM_MAX_RETRIES', '3')),
+    scheduler=LLMScheduler(
+        ASYNC_LLM_MAX_CONCURRENCY,
+        llm_limits,
+        interactive_reserved=max(LLM_INTERACTIVE_RESERVED, ASYNC_LLM_MAX_CONCURRENCY // 4),
+        weights=LLM_USER_WEIGHTS,
+        name='llm-async'
+    )
+)
+
+# 同步 Flask 接口（上传、状态查询、下载等）的线程数
+WSGI_WORKERS = int(os.getenv('WSGI_WORKERS', '16'))
+
+# 与 Flask 应用一致的跨域配置，仅作用于异步接口
+CORS_MIDDLEWARE = [Middleware(
+    CORSMiddleware,
+    allow_origins=['http://localhost:5174'],
+    allow_methods=['GET', 'POST', 'PUT', 'DELETE', 'OPTIONS'],
+    allow_headers=['Content-Type', 'Authorization', 'X-Trace-Id'],
+    expose_headers=['X-Trace-Id'],
+    allow_credentials=True
+)]
+
+
+class TraceMiddleware:
+    """异步接口的链路追踪、耗时统计与模型调用优先级，规则与 Flask 接口的请求钩子一致"""
+
+    def __init__(self, app, endpoint: str, priority: str = BATCH):
+        self.app = app
+        self.endpoint = endpoint
+        self.priority = priority
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+        trace_id = dict(scope['headers']).get(b'x-trace-id', b'').decode('latin-1')
+        trace_id = trace_id if TRACE_ID_PATTERN.match(trace_id) else new_trace_id()
+        token = set_trace_id(trace_id)
+        priority_token = set_priority(self.priority)
+        # check_jwt 设置的调用用户在请求（含流式响应）结束时一并恢复
+        identity_token = set_identity(None)
+        start = time.perf_counter()
+
+        async def send_with_trace(message):
+            if message['type'] == 'http.response.start':
+                HTTP_REQUEST_SECONDS.observe(
+                    time.perf_counter() - start,
+                    endpoint=self.endpoint,
+                    method=scope['method'],
+                    status=str(message['status'])
+                )
+                message['headers'] = list(message.get('headers', [])) + [(b'x-trace-id', trace_id.encode())]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_trace)
+        finally:
+            reset_identity(identity_token)
+            reset_priority(priority_token)
+            reset_trace_id(token)
+
+
+def api_route(path: str, endpoint, priority: str = BATCH) -> Route:
+    middleware = [Middleware(TraceMiddleware, endpoint=path, priority=priority)] + CORS_MIDDLEWARE
+    return Route(path, endpoint, methods=['POST'], middleware=middleware)
+
+
+def check_jwt(request):
+    """按 Flask-JWT-Extended 的规则校验令牌，失败时返回与 Flask 接口相同的错误响应"""
+    headers = {'Authorization': request.headers.get('authorization', '')}
+    with flask_app.test_request_context(headers=headers):
+        try:
+            verify_jwt_in_request()
+        except Exception as e:
+            response = flask_app.handle_user_exception(e)
+            return JSONResponse(json.loads(response.get_data()), status_code=response.status_code)
+        # 模型调用按登录用户公平排队
+        set_identity(get_jwt_identity())
+    return None
+
+
+def jwt_required(endpoint):
+    async def wrapper(request):
+        error = check_jwt(request)
+        if error is not None:
+            return error
+        return await endpoint(request)
+    wrapper.__name__ = endpoint.__name__
+    wrapper.__doc__ = endpoint.__doc__
+    return wrapper
+
+
+async def read_json(request) -> dict:
+    try:
+        data = await request.json()
+    except ValueError:
+        return {}
+    return data if isinstance(data, dict) else {}
+
+
+async def stream_proposal_html(deltas):
+    """把模型输出的增量文本转换为HTML片段（异步版本）"""
+    renderer = MarkdownRenderer()
+    async for delta in deltas:
+        html = renderer.feed(delta)
+        if html:
+            yield html
+    html = renderer.close()
+    if html:
+        yield html
+
+
+def stream_llm_response(messages: list, temperature: float, on_complete=None, on_error=None,
+                        deltas=None) -> StreamingResponse:
+    """以 SSE 推送模型输出：delta 事件为HTML片段，done 事件为完整HTML"""
+    async def generate():
+        html_parts = []
+        try:
+            source = deltas if deltas is not None else async_llm_client.stream_chat(messages, temperature=temperature)
+            async for html in stream_proposal_html(source):
+                html_parts.append(html)
+                yield sse_event({'delta': html})
+            html_content = ''.join(html_parts)
+            if on_complete:
+                await asyncio.to_thread(on_complete, html_content)
+            yield sse_event({'content': html_content}, event='done')
+        except Exception as e:
+            if on_error:
+                await asyncio.to_thread(on_error, e)
+            else:
+                logger.error("流式输出错误: %s", e)
+            yield sse_event({'error': str(e)}, event='error')
+
+    return StreamingResponse(
+        generate(),
+        media_type='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+
+async def cached_ai_stream(key: str, messages: list, temperature: float):
+    """流式调用模型，完整输出后写入响应缓存；命中缓存时直接产出缓存内容"""
+    cached = ai_response_cache.get(key)
+    if cached is not None:
+        yield cached
+        return
+    parts = []
+    async for delta in async_llm_client.stream_chat(messages, temperature=temperature):
+        parts.append(delta)
+        yield delta
+    ai_response_cache.set(key, ''.join(parts))
+
+
+# 检索参考段落（BM25 与文件读取）和任务存储写入（可能是 SQLite）都是阻塞调用，
+# 在线程池中执行，避免拖慢事件循环上的其他流式请求；asyncio.to_thread 会复制追踪上下文
+def build_messages_traced(outline, project_info, scoring_criteria) -> list:
+    with span('prompt_build'):
+        return build_proposal_messages(outline, project_info, scoring_criteria)
+
+
+def save_generation_result(task_id: str, html_content: str):
+    generation_results[task_id] = html_content
+    update_generation_status(task_id, 100, 'success', '标书生成完成')
+
+
+@jwt_required
+async def generate_proposal(request):
+    """生成标书内容，mode 为 chapters 时在后台分章节并行生成"""
+    data = await read_json(request)
+    outline = data.get('outline', [])
+    project_info = data.get('projectInfo', {})
+    scoring_criteria = data.get('scoringCriteria', [])
+    task_id = data.get('task_id')
+
+    if not task_id:
+        return JSONResponse({'error': '缺少任务ID'}, status_code=400)
+
+    if data.get('mode') == 'chapters':
+        await asyncio.to_thread(update_generation_status, task_id, 0, 'processing', '等待生成...')
+        try:
+            generation_queue.submit(task_id, run_chapter_generation, task_id, outline, project_info, scoring_criteria)
+        except QueueFullError:
+            await asyncio.to_thread(update_generation_status, task_id, 0, 'error', '服务器繁忙，请稍后重试')
+            return JSONResponse({'error': '服务器繁忙，请稍后重试'}, status_code=503)
+        return JSONResponse({'task_id': task_id}, status_code=202)
+
+    await asyncio.to_thread(update_generation_status, task_id, 0, 'processing', '开始生成标书...')
+
+    try:
+        messages = await asyncio.to_thread(build_messages_traced, outline, project_info, scoring_criteria)
+        await asyncio.to_thread(update_generation_status, task_id, 30, 'processing', '正在生成标书内容...')
+        await asyncio.to_thread(update_generation_status, task_id, 60, 'processing', '正在调用AI模型...')
+
+        proposal_content = await async_llm_client.chat(messages, temperature=0.5)
+
+        await asyncio.to_thread(update_generation_status, task_id, 90, 'processing', '正在处理生成结果...')
+        with span('format_html'):
+            html_content = render_markdown(proposal_content)
+        await asyncio.to_thread(save_generation_result, task_id, html_content)
+
+        return JSONResponse({'content': html_content})
+    except Exception as e:
+        logger.error("生成标书错误: %s", e)
+        await asyncio.to_thread(update_generation_status, task_id, 0, 'error', f'生成失败: {str(e)}')
+        return JSONResponse({'error': '生成标书失败'}, status_code=500)
+
+
+@jwt_required
+async def generate_proposal_stream(request):
+    """流式生成标书内容（SSE）"""
+    data = await read_json(request)
+    task_id = data.get('task_id')
+
+    if not task_id:
+        return JSONResponse({'error': '缺少任务ID'}, status_code=400)
+
+    await asyncio.to_thread(update_generation_status, task_id, 0, 'processing', '开始生成标书...')
+    messages = await asyncio.to_thread(
+        build_messages_traced,
+        data.get('outline', []),
+        data.get('projectInfo', {}),
+        data.get('scoringCriteria', [])
+    )
+
+    def on_error(error):
+        logger.error("生成标书错误: %s", error)
+        update_generation_status(task_id, 0, 'error', f'生成失败: {str(error)}')
+
+    await asyncio.to_thread(update_generation_status, task_id, 30, 'processing', '正在生成标书内容...')
+    return stream_llm_response(
+        messages, 0.5, on_complete=lambda html_content: save_generation_result(task_id, html_content), on_error=on_error
+    )
+
+
+# AI编辑功能：action -> (消息构建函数, 响应字段, 错误提示)
+AI_ACTIONS = {
+    'continue': (build_continue_messages, 'continuedContent', 'AI续写'),
+    'expand': (build_expand_messages, 'expandedContent', 'AI扩写'),
+    'polish': (build_polish_messages, 'polishedContent', 'AI润色')
+}
+
+
+@jwt_required
+async def ai_action(request):
+    """AI续写/扩写/润色"""
+    action = request.path_params['action']
+    if action not in AI_ACTIONS:
+        return JSONResponse({'error': 'Unknown action'}, status_code=404)
+    build_messages, field, label = AI_ACTIONS[action]
+    data = await read_json(request)
+    # 编辑器内容转 Markdown 在线程池中执行，大段内容不阻塞事件循环
+    messages = await asyncio.to_thread(build_messages, data.get('content', ''), data.get('context'))
+    key = ai_cache_key(action, data.get('content', ''), data.get('context'), 0.3)
+
+    try:
+        content = await ai_response_cache.aget_or_compute(
+            key, lambda: async_llm_client.chat(messages, temperature=0.3)
+        )
+        return JSONResponse({field: render_markdown(content)})
+    except Exception as e:
+        logger.error("%s错误: %s", label, e)
+        return JSONResponse({'error': f'{label}失败'}, status_code=500)
+
+
+@jwt_required
+async def ai_stream(request):
+    """AI续写/扩写/润色的流式版本（SSE）"""
+    action = request.path_params['action']
+    if action not in AI_ACTIONS:
+        return JSONResponse({'error': 'Unknown action'}, status_code=404)
+    build_messages = AI_ACTIONS[action][0]
+    data = await read_json(request)
+    # 编辑器内容转 Markdown 在线程池中执行，大段内容不阻塞事件循环
+    messages = await asyncio.to_thread(build_messages, data.get('content', ''), data.get('context'))
+    key = ai_cache_key(action, data.get('content', ''), data.get('context'), 0.3)
+    return stream_llm_response(messages, 0.3, deltas=cached_ai_stream(key, messages, 0.3))
+
+
+@asynccontextmanager
+async def lifespan(app):
+    yield
+    await async_llm_client.aclose()
+
+
+app = Starlette(routes=[
+    api_route('/api/generate-proposal', generate_proposal),
+    api_route('/api/generate-proposal/stream', generate_proposal_stream),
+    api_route('/api/ai-{action}', ai_action, priority=INTERACTIVE),
+    api_route('/api/ai-{action}/stream', ai_stream, priority=INTERACTIVE),
+    # 其余接口（含预检请求）交给 Flask 应用，在线程池中执行
+    Mount('/', WSGIMiddleware(flask_app, workers=WSGI_WORKERS))
+], lifespan=lifespan)
@@ -0,0 +1,329 @@
+"""批量导入历史招标文件：目录或压缩包中的文档在进程池中提取文本，限速调用模型分析，
+每完成一个文档写一条检查点，中断后从检查点续跑
+
+    cd backend
+    python batch_ingest.py /data/tenders --workers 4 --concurrency 4
+    python batch_ingest.py /data/tenders.zip
+    python batch_ingest.py --resume <batch_id>
+"""
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import shutil
+import tarfile
+import threading
+import time
+import uuid
+import zipfile
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from functools import partial
+
+from cache import file_sha256
+from document_text import SUPPORTED_EXTENSIONS, parse_document
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_EXTENSIONS = ('.zip', '.tar', '.tar.gz', '.tgz')
+
+
+def is_document(name: str) -> bool:
+    basename = os.path.basename(name.replace('\\', '/'))
+    return basename.lower().endswith(SUPPORTED_EXTENSIONS) and not basename.startswith(('.', '~$'))
+
+
+def is_archive(path: str) -> bool:
+    return os.path.isfile(path) and path.lower().endswith(ARCHIVE_EXTENSIONS)
+
+
+def list_documents(source: str, staging_dir: str) -> list:
+    """列出目录（递归）或压缩包中的文档，返回按名称排序的 [(名称, 文件路径)]；压缩包解压到 staging_dir"""
+    if os.path.isdir(source):
+        documents = []
+        for root, dirs, files in os.walk(source):
+            dirs.sort()
+            for name in sorted(files):
+                if is_document(name):
+                    path = os.path.join(root, name)
+                    documents.append((os.path.relpath(path, source), path))
+        return documents
+    if is_archive(source):
+        return _extract_archive(source, staging_dir)
+    raise ValueError(f'不是目录或支持的压缩包: {source}')
+
+
+def _zip_member_name(info: zipfile.ZipInfo) -> str:
+    # Windows 下打包的压缩包文件名多为 GBK 编码，zipfile 会按 cp437 解码
+    if info.flag_bits & 0x800:
+        return info.filename
+    try:
+        return info.filename.encode('cp437').decode('gbk')
+    except (UnicodeEncodeError, UnicodeDecodeError):
+        return info.filename
+
+
+def _extract_member(read, size: int, target: str):
+    """解压单个成员；续跑时已完整解压的文件跳过"""
+    if os.path.exists(target) and os.path.getsize(target) == size:
+        return
+    with read() as src, open(target + '.tmp', 'wb') as dst:
+        shutil.copyfileobj(src, dst, 1024 * 1024)
+    os.replace(target + '.tmp', target)
+
+
+def _extract_archive(source: str, staging_dir: str) -> list:
+    os.makedirs(staging_dir, exist_ok=True)
+    documents = []
+
+    def target_for(index: int, name: str) -> str:
+        # 成员名可能包含 ../ 等路径，只取文件名并加序号，避免写出解压目录或重名覆盖
+        return os.path.join(staging_dir, f'{index:06d}_{os.path.basename(name.replace(chr(92), "/"))}')
+
+    if zipfile.is_zipfile(source):
+        with zipfile.ZipFile(source) as archive:
+            for index, info in enumerate(archive.infolist()):
+                name = _zip_member_name(info)
+                if info.is_dir() or not is_document(name):
+                    continue
+                target = target_for(index, name)
+                _extract_member(partial(archive.open, info), info.file_size, target)
+                documents.append((name, target))
+    else:
+        with tarfile.open(source) as archive:
+            for index, member in enumerate(archive):
+                if not member.isfile() or not is_document(member.name):
+                    continue
+                target = target_for(index, member.name)
+                _extract_member(partial(archive.extractfile, member), member.size, target)
+                documents.append((member.name, target))
+    return sorted(documents)
+
+
+class BatchIngestor:
+    """批量导入：文本提取在进程池中并行，模型分析在线程池中并发（全局速率由大模型客户端限制）
+
+    每个批次一个目录：batch.json 记录来源，checkpoint.jsonl 逐行追加每个文档的处理结果，
+    results/ 保存分析结果；续跑时跳过检查点中已成功的文档（按名称与内容哈希识别，
+    压缩包中同名或路径不同的成员互不影响）。
+    analyze(name, text) 返回分析结果（dict），load_text/save_text 按文件哈希读写文本缓存。
+    """
+
+    def __init__(self, directory: str, analyze, load_text=None, save_text=None,
+                 extract_workers: int = 2, analysis_concurrency: int = 4, pdf_backend: str = 'auto',
+                 ocr: dict = None):
+        self.directory = directory
+        self.analyze = analyze
+        self.load_text = load_text
+        self.save_text = save_text
+        self.extract_workers = max(1, extract_workers)
+        self.analysis_concurrency = max(1, analysis_concurrency)
+        self.pdf_backend = pdf_backend
+        self.ocr = ocr
+        self._progress = {}
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, batch_id: str, *parts) -> str:
+        return os.path.join(self.directory, batch_id, *parts)
+
+    def create(self, source: str) -> str:
+        """登记一个批次，返回批次ID"""
+        source = os.path.abspath(source)
+        if not (os.path.isdir(source) or is_archive(source)):
+            raise ValueError(f'不是目录或支持的压缩包: {source}')
+        batch_id = f"batch_{uuid.uuid4().hex[:12]}"
+        os.makedirs(self._path(batch_id, 'results'))
+        self._write_meta(batch_id, {'source': source, 'created': time.time(), 'status': 'pending'})
+        return batch_id
+
+    def _read_meta(self, batch_id: str):
+        try:
+            with open(self._path(batch_id, 'batch.json'), encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _write_meta(self, batch_id: str, meta: dict):
+        path = self._path(batch_id, 'batch.json')
+        with open(path + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump(meta, f, ensure_ascii=False)
+        os.replace(path + '.tmp', path)
+
+    def _checkpoints(self, batch_id: str) -> dict:
+        """读取检查点，返回 (名称, 内容哈希) -> 记录，同一文档以最后一条记录为准"""
+        entries = {}
+        try:
+            with open(self._path(batch_id, 'checkpoint.jsonl'), encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # 崩溃时写了一半的行
+                        continue
+                    entries[(entry['name'], entry.get('hash'))] = entry
+        except OSError:
+            pass
+        return entries
+
+    def _checkpoint(self, batch_id: str, entry: dict):
+        entry['time'] = time.time()
+        with self._lock:
+            with open(self._path(batch_id, 'checkpoint.jsonl'), 'a', encoding='utf-8') as f:
+                f.write(json.dumps(entry, ensure_ascii=False) + '\n')
+                f.flush()
+                os.fsync(f.fileno())
+            progress = self._progress.get(batch_id)
+            if progress is not None:
+                progress[entry['status']] += 1
+
+    def is_running(self, batch_id: str) -> bool:
+        with self._lock:
+            return batch_id in self._progress
+
+    def status(self, batch_id: str):
+        """批次进度：文档总数、已完成/失败数、本次运行的吞吐（文档/小时）"""
+        meta = self._read_meta(batch_id)
+        if meta is None:
+            return None
+        entries = self._checkpoints(batch_id).values()
+        status = dict(
+            meta,
+            batch_id=batch_id,
+            done=sum(1 for entry in entries if entry['status'] == 'done'),
+            failed=sum(1 for entry in entries if entry['status'] == 'failed')
+        )
+        with self._lock:
+            progress = dict(self._progress.get(batch_id) or {})
+        if progress:
+            elapsed = max(time.time() - progress['started'], 1e-6)
+            status['docs_per_hour'] = round(progress['done'] * 3600 / elapsed, 1)
+        status['failures'] = [
+            {'name': entry['name'], 'error': entry.get('error')}
+            for entry in entries if entry['status'] == 'failed'
+        ][:100]
+        return status
+
+    def run(self, batch_id: str, on_progress=None) -> dict:
+        """处理批次中尚未成功的文档，返回批次进度"""
+        meta = self._read_meta(batch_id)
+        if meta is None:
+            raise KeyError(batch_id)
+        documents = list_documents(meta['source'], self._path(batch_id, 'files'))
+        # 文档的内容哈希在处理时计算，已成功的文档在那时跳过
+        completed = {key for key, entry in self._checkpoints(batch_id).items() if entry['status'] == 'done'}
+        meta.update(total=len(documents), status='running')
+        self._write_meta(batch_id, meta)
+        with self._lock:
+            self._progress[batch_id] = {'started': time.time(), 'done': 0, 'failed': 0}
+
+        try:
+            self._process(batch_id, documents, completed, on_progress)
+        finally:
+            meta['status'] = 'finished'
+            self._write_meta(batch_id, meta)
+            status = self.status(batch_id)
+            with self._lock:
+                self._progress.pop(batch_id, None)
+        return status
+
+    def _process(self, batch_id: str, pending: list, completed: set = frozenset(), on_progress=None):
+        # 提取进程中不再嵌套进程池，OCR 也在本进程内逐页进行，并行度由多个提取进程提供
+        ocr = dict(self.ocr, workers=1) if self.ocr is not None else None
+        extract = partial(parse_document, pdf_backend=self.pdf_backend, pdf_workers=1, ocr=ocr)
+        # 提取领先分析一段，但不在内存中堆积过多文本
+        max_inflight = self.extract_workers + self.analysis_concurrency * 2
+        documents = iter(pending)
+        inflight = {}
+
+        def fail(name: str, file_hash, error: str):
+            logger.warning("批量导入失败 %s: %s", name, error)
+            self._checkpoint(batch_id, {'name': name, 'hash': file_hash, 'status': 'failed', 'error': error})
+
+        with ProcessPoolExecutor(max_workers=self.extract_workers, mp_context=multiprocessing.get_context('spawn')) as extractors, \
+                ThreadPoolExecutor(max_workers=self.analysis_concurrency, thread_name_prefix='batch-analyze') as analyzers:
+
+            def fill():
+                while len(inflight) < max_inflight:
+                    document = next(documents, None)
+                    if document is None:
+                        return
+                    name, path = document
+                    try:
+                        file_hash = file_sha256(path)
+                    except OSError as e:
+                        fail(name, None, str(e))
+                        continue
+                    if (name, file_hash) in completed:
+                        continue
+                    text = self.load_text(file_hash) if self.load_text else None
+                    if text is not None:
+                        inflight[analyzers.submit(self.analyze, name, text)] = ('analyze', name, file_hash)
+                    else:
+                        inflight[extractors.submit(extract, path)] = ('extract', name, file_hash)
+
+            fill()
+            while inflight:
+                finished, _ = wait(inflight, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    stage, name, file_hash = inflight.pop(future)
+                    try:
+                        value = future.result()
+                    except Exception as e:
+                        fail(name, file_hash, str(e))
+                        continue
+                    if stage == 'extract':
+                        if not value or not value.strip():
+                            fail(name, file_hash, '未能从文件中提取到文本')
+                            continue
+                        if self.save_text:
+                            self.save_text(file_hash, value)
+                        inflight[analyzers.submit(self.analyze, name, value)] = ('analyze', name, file_hash)
+                        continue
+                    result_path = self._path(batch_id, 'results', f'{file_hash}.json')
+                    with open(result_path, 'w', encoding='utf-8') as f:
+                        json.dump(dict(value, name=name), f, ensure_ascii=False)
+                    self._checkpoint(batch_id, {
+                        'name': name,
+                        'hash': file_hash,
+                        'status': 'done',
+                        'task_id': value.get('task_id'),
+                        'warnings': value.get('warnings', [])
+                    })
+                    if on_progress:
+                        on_progress(self.status(batch_id))
+                fill()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='批量导入历史招标文件')
+    parser.add_argument('source', nargs='?', help='文档目录或压缩包（zip/tar）')
+    parser.add_argument('--resume', metavar='BATCH_ID', help='从检查点继续处理已有批次')
+    parser.add_argument('--workers', type=int, help='文本提取进程数（默认 BATCH_EXTRACT_WORKERS）')
+    parser.add_argument('--concurrency', type=int, help='同时分析的文档数（默认 BATCH_ANALYSIS_CONCURRENCY）')
+    args = parser.parse_args()
+    if not args.source and not args.resume:
+        parser.error('需要指定文档目录/压缩包，或 --resume')
+
+    # 复用后端的配置、缓存、任务存储与限速的大模型客户端
+    import app
+
+    ingestor = app.batch_ingestor
+    if args.workers:
+        ingestor.extract_workers = args.workers
+    if args.concurrency:
+        ingestor.analysis_concurrency = args.concurrency
+    batch_id = args.resume or ingestor.create(args.source)
+    print(f"批次 {batch_id}，检查点目录 {ingestor._path(batch_id)}")
+
+    def report(status):
+        print(f"\r已完成 {status['done']}/{status.get('total', '?')}，失败 {status['failed']}，"
+              f"{status.get('docs_per_hour', 0)} 文档/小时", end='', flush=True)
+
+    status = ingestor.run(batch_id, on_progress=report)
+    print()
+    print(json.dumps({key: status[key] for key in ('batch_id', 'total', 'done', 'failed')}, ensure_ascii=False))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+"""合成的招标文件样例（PDF / DOCX），用于压测"""
+import os
+
+from docx import Document
+
+# 样例规模：PDF 页数 / DOCX 章节数
+SIZES = {
+    'small': 5,
+    'medium': 50,
+    'large': 300
+}
+
+PDF_LINES_PER_PAGE = 40
+
+
+def _pdf_escape(text: str) -> str:
+    return text.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)')
+
+
+def make_pdf(path: str, pages: int, seed: str = '') -> str:
+    """生成带文本层的多页 PDF（内置 Helvetica 字体，仅含 ASCII 文本）"""
+    objects = [
+        b'<< /Type /Catalog /Pages 2 0 R >>',
+        None,
+        b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>'
+    ]
+    kids = []
+    for page in range(pages):
+        lines = [f'{page // 5 + 1}.{page % 5 + 1} Section {page + 1} tender no. {seed}']
+        for line in range(PDF_LINES_PER_PAGE - 1):
+            lines.append(f'Requirement {page + 1}-{line + 1}: the bidder shall provide qualified staff and equipment.')
+        commands = ['BT', '/F1 10 Tf', '14 TL', '50 780 Td']
+        commands += [f'({_pdf_escape(line)}) Tj T*' for line in lines]
+        commands.append('ET')
+        stream = '\n'.join(commands).encode('latin-1')
+
+        page_number = len(objects) + 1
+        kids.append(f'{page_number} 0 R')
+        objects.append(
+            f'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] '
+            f'/Resources << /Font << /F1 3 0 R >> >> /Contents {page_number + 1} 0 R >>'.encode('latin-1')
+        )
+        objects.append(b'<< /Length %d >>\nstream\n' % len(stream) + stream + b'\nendstream')
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(kids)}] /Count {pages} >>".encode('latin-1')
+
+    output = bytearray(b'%PDF-1.4\n')
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(output))
+        output += f'{number} 0 obj\n'.encode('latin-1') + body + b'\nendobj\n'
+    xref = len(output)
+    output += f'xref\n0 {len(objects) + 1}\n0000000000 65535 f \n'.encode('latin-1')
+    for offset in offsets:
+        output += f'{offset:010d} 00000 n \n'.encode('latin-1')
+    output += f'trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n'.encode('latin-1')
+
+    with open(path, 'wb') as f:
+        f.write(output)
+    return path
+
+
+def make_docx(path: str, sections: int, seed: str = '') -> str:
+    """生成含标题、列表和评分表的 DOCX"""
+    doc = Document()
+    doc.add_heading(f'模拟招标文件 {seed}', 0)
+    doc.add_paragraph(f'项目名称：模拟工程项目 {seed}')
+    for section in range(sections):
+        doc.add_heading(f'第{section + 1}章 招标要求 {section + 1}', 1)
+        for paragraph in range(8):
+            doc.add_paragraph(f'第{section + 1}章第{paragraph + 1}条：投标人应具备相应资质，并提供近三年类似项目业绩证明材料。')
+        doc.add_paragraph('提供项目负责人资格证书', style='List Bullet')
+        doc.add_paragraph('提供质量保证措施', style='List Bullet')
+        if section % 5 == 0:
+            table = doc.add_table(rows=4, cols=3)
+            for row, cells in enumerate([('评分项', '分值', '评分标准'), ('施工方案', '30', '方案完整合理'),
+                                         ('项目团队', '20', '人员配置齐全'), ('业绩', '10', '每项业绩得2分')]):
+                for col, text in enumerate(cells):
+                    table.cell(row, col).text = text
+    doc.save(path)
+    return path
+
+
+def build_fixtures(directory: str, sizes=None, seed: str = '') -> dict:
+    """生成各规模的 PDF 与 DOCX 样例，返回 名称 -> 路径"""
+    os.makedirs(directory, exist_ok=True)
+    fixtures = {}
+    for size in sizes or SIZES:
+        count = SIZES[size]
+        suffix = f'_{seed}' if seed else ''
+        fixtures[f'pdf_{size}'] = make_pdf(os.path.join(directory, f'tender_{size}{suffix}.pdf'), count, seed)
+        fixtures[f'docx_{size}'] = make_docx(os.path.join(directory, f'tender_{size}{suffix}.docx'), count, seed)
+    return fixtures
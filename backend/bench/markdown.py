@@ -0,0 +1,120 @@
+"""Markdown 渲染基准：按文档大小测量整体渲染与流式（小增量）渲染的耗时与峰值内存
+
+    cd backend
+    python -m bench.markdown --sizes 0.25,0.5,1,2 --delta-chars 8
+"""
+import argparse
+import json
+import time
+import tracemalloc
+
+from markdown_html import MarkdownRenderer, render_markdown
+
+SECTION = '''## 第{index}章 技术方案
+
+本项目采用**成熟的施工工艺**，确保工程质量与进度满足招标文件要求，并对*关键工序*设置质量控制点。
+项目负责人须具备一级建造师资格，联系电话填写 ________，材料规格以 `GB 50300-2013` 为准。
+
+- 施工准备
+  - 技术交底与图纸会审
+  - 材料进场检验，不合格材料<严禁使用>
+- 施工组织
+  1. 划分施工段
+  2. 流水作业
+
+| 序号 | 工序 | 工期（天） | 责任人 |
+| --- | --- | --- | --- |
+| 1 | 基础施工 | 30 | **张工** |
+| 2 | 主体结构 | 90 | 李工 |
+| 3 | 装饰装修 | 60 | 王工 |
+
+> 注：以上工期为计划工期，实际以监理批准的进度计划为准。
+
+'''
+
+
+def build_document(size_mb: float) -> str:
+    target = int(size_mb * 1024 * 1024)
+    parts = []
+    length = 0
+    index = 1
+    while length < target:
+        section = SECTION.format(index=index)
+        parts.append(section)
+        # 按 UTF-8 字节计大小
+        length += len(section.encode('utf-8'))
+        index += 1
+    return ''.join(parts)
+
+
+def legacy_render(content: str) -> str:
+    """原逐行转换实现，作为对照"""
+    def line_html(line):
+        if line.startswith('# '):
+            return f'<h1>{line[2:]}</h1>'
+        elif line.startswith('## '):
+            return f'<h2>{line[3:]}</h2>'
+        elif line.startswith('### '):
+            return f'<h3>{line[4:]}</h3>'
+        elif line.startswith('- '):
+            return f'<li>{line[2:]}</li>'
+        return f'<p>{line}</p>'
+    return ''.join(line_html(line) for line in content.split('\n'))
+
+
+def render_stream(document: str, delta_chars: int) -> str:
+    renderer = MarkdownRenderer()
+    parts = [renderer.feed(document[index:index + delta_chars]) for index in range(0, len(document), delta_chars)]
+    parts.append(renderer.close())
+    return ''.join(parts)
+
+
+def measure(func, *args, repeat: int = 3) -> dict:
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(*args)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    tracemalloc.start()
+    func(*args)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {'seconds': round(best, 4), 'peak_mb': round(peak / 1024 / 1024, 2)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Markdown 渲染基准')
+    parser.add_argument('--sizes', default='0.25,0.5,1,2', help='文档大小（MB），逗号分隔')
+    parser.add_argument('--delta-chars', type=int, default=8, help='流式渲染时每个增量的字符数')
+    parser.add_argument('--repeat', type=int, default=3, help='每项重复次数，取最快一次')
+    parser.add_argument('--output', help='结果写入 JSON 文件')
+    args = parser.parse_args()
+
+    results = []
+    for size in (float(value) for value in args.sizes.split(',')):
+        document = build_document(size)
+        # 流式与整体渲染的结果必须一致
+        if render_stream(document, args.delta_chars) != render_markdown(document):
+            raise SystemExit(f'{size}MB：流式渲染结果与整体渲染不一致')
+        result = {
+            'size_mb': size,
+            'legacy': measure(legacy_render, document, repeat=args.repeat),
+            'render': measure(render_markdown, document, repeat=args.repeat),
+            'stream': measure(render_stream, document, args.delta_chars, repeat=args.repeat)
+        }
+        result['render']['mb_per_second'] = round(size / max(result['render']['seconds'], 1e-9), 2)
+        results.append(result)
+        print(
+            f"{size:>5}MB  原实现 {result['legacy']['seconds']:.3f}s  "
+            f"整体 {result['render']['seconds']:.3f}s ({result['render']['mb_per_second']} MB/s, 峰值 {result['render']['peak_mb']}MB)  "
+            f"流式 {result['stream']['seconds']:.3f}s (峰值 {result['stream']['peak_mb']}MB)"
+        )
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,156 @@
+"""兼容 OpenAI 接口的本地 DeepSeek 模拟服务，用于压测时替代真实 API
+
+    python -m bench.mock_llm --port 8100 --latency 0.5 --tokens-per-second 200 --error-rate 0.05
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+ANALYSIS_RESULT = {
+    "project_info": {
+        "name": "模拟项目",
+        "type": "工程施工",
+        "budget": "1000万元",
+        "deadline": "2025-12-31",
+        "requirements": ["具备相应资质", "近三年类似业绩"]
+    },
+    "scoring_criteria": [
+        {
+            "id": "1",
+            "category": "技术部分",
+            "item": "施工方案",
+            "score": "30",
+            "description": "施工方案完整合理",
+            "requirements": ["工艺流程清晰", "进度计划合理"]
+        }
+    ],
+    "outline": [
+        {
+            "id": "1",
+            "title": "技术方案",
+            "required": True,
+            "description": "详细的技术实施方案",
+            "key_points": ["施工工艺", "质量保证"]
+        }
+    ]
+}
+
+
+class MockConfig:
+    """模拟服务参数：首字延迟、输出速率、输出长度与错误注入比例"""
+
+    def __init__(self, latency: float = 0.2, tokens_per_second: float = 500,
+                 completion_tokens: int = 200, error_rate: float = 0.0):
+        self.latency = latency
+        self.tokens_per_second = tokens_per_second
+        self.completion_tokens = completion_tokens
+        self.error_rate = error_rate
+        self.requests = 0
+        self.errors = 0
+        self.lock = threading.Lock()
+
+
+def completion_text(request_json: dict, tokens: int) -> str:
+    """生成模拟输出：JSON 模式返回分析结果，否则返回 Markdown 正文"""
+    if (request_json.get('response_format') or {}).get('type') == 'json_object':
+        return json.dumps(ANALYSIS_RESULT, ensure_ascii=False)
+    lines = ['# 模拟章节', '## 概述']
+    while sum(len(line) for line in lines) < tokens:
+        lines.append('本段为模拟生成的标书内容，用于压测。')
+        lines.append('- 模拟要点')
+    return '\n'.join(lines)
+
+
+def make_handler(config: MockConfig):
+    class MockHandler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def log_message(self, *args):
+            pass
+
+        def do_POST(self):
+            length = int(self.headers.get('Content-Length') or 0)
+            request_json = json.loads(self.rfile.read(length) or b'{}')
+            with config.lock:
+                config.requests += 1
+                inject_error = random.random() < config.error_rate
+                if inject_error:
+                    config.errors += 1
+
+            time.sleep(config.latency)
+            if inject_error:
+                self._send_json(random.choice([429, 500, 503]), {'error': {'message': '模拟错误'}})
+                return
+
+            text = completion_text(request_json, config.completion_tokens)
+            usage = {
+                'prompt_tokens': sum(len(m.get('content') or '') for m in request_json.get('messages', [])),
+                'completion_tokens': len(text)
+            }
+            if request_json.get('stream'):
+                self._send_stream(text, usage)
+            else:
+                time.sleep(len(text) / config.tokens_per_second)
+                self._send_json(200, {
+                    'id': 'mock',
+                    'object': 'chat.completion',
+                    'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': text}, 'finish_reason': 'stop'}],
+                    'usage': usage
+                })
+
+        def _send_json(self, status: int, body: dict):
+            data = json.dumps(body, ensure_ascii=False).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def _send_stream(self, text: str, usage: dict):
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/event-stream')
+            self.send_header('Connection', 'close')
+            self.end_headers()
+            step = 4
+            for start in range(0, len(text), step):
+                delta = text[start:start + step]
+                chunk = {'choices': [{'index': 0, 'delta': {'content': delta}}]}
+                self.wfile.write(f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n".encode('utf-8'))
+                self.wfile.flush()
+                time.sleep(len(delta) / config.tokens_per_second)
+            self.wfile.write(f"data: {json.dumps({'choices': [], 'usage': usage})}\n\n".encode('utf-8'))
+            self.wfile.write(b"data: [DONE]\n\n")
+            self.close_connection = True
+
+    return MockHandler
+
+
+def start_mock_server(config: MockConfig, host: str = '127.0.0.1', port: int = 0):
+    """在后台线程中启动模拟服务，返回 (server, 接口地址)"""
+    server = ThreadingHTTPServer((host, port), make_handler(config))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f'http://{host}:{server.server_port}/v1/chat/completions'
+
+
+def main():
+    parser = argparse.ArgumentParser(description='本地 DeepSeek 模拟服务')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8100)
+    parser.add_argument('--latency', type=float, default=0.2, help='首字延迟（秒）')
+    parser.add_argument('--tokens-per-second', type=float, default=500, help='输出速率')
+    parser.add_argument('--completion-tokens', type=int, default=200, help='正文输出长度')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='返回 429/5xx 的比例')
+    args = parser.parse_args()
+
+    config = MockConfig(args.latency, args.tokens_per_second, args.completion_tokens, args.error_rate)
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(config))
+    print(f'模拟服务已启动: http://{args.host}:{args.port}/v1/chat/completions')
+    server.serve_forever()
+
+
+if __name__ == '__main__':
+    main()
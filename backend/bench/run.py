@@ -0,0 +1,363 @@
+"""后端压测驱动：启动本地模拟 DeepSeek 服务与后端，按接口统计延迟分位数、吞吐与内存
+
+    cd backend
+    python -m bench.run --requests 20 --concurrency 5 --output bench-results.json
+    python -m bench.run --compare bench-results.json   # 与上次结果对比
+"""
+import argparse
+import json
+import logging
+import math
+import os
+import platform
+import resource
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from bench.fixtures import SIZES, build_fixtures
+from bench.mock_llm import MockConfig, start_mock_server
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+ENDPOINTS = [
+    'upload',
+    'generate',
+    'generate-chapters',
+    'generate-stream',
+    'ai-continue',
+    'ai-expand',
+    'ai-polish',
+    'ai-polish-stream'
+]
+
+SAMPLE_OUTLINE = [
+    {'id': '1', 'title': '技术方案', 'required': True, 'description': '详细的技术实施方案', 'key_points': ['施工工艺']},
+    {'id': '2', 'title': '项目团队', 'required': True, 'description': '项目团队成员介绍', 'key_points': ['人员配置']},
+    {'id': '3', 'title': '售后服务方案', 'required': False, 'description': '售后服务承诺', 'key_points': ['响应时间']}
+]
+
+SAMPLE_PROJECT = {'name': '压测项目', 'type': '工程施工', 'budget': '100万元', 'deadline': '2025-12-31', 'requirements': ['资质']}
+
+SAMPLE_CONTENT = '<h1>技术方案</h1><p>本项目采用成熟的施工工艺，确保工程质量与进度。</p>' * 20
+
+
+def percentile(values: list, pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = max(0, math.ceil(pct / 100 * len(ordered)) - 1)
+    return ordered[index]
+
+
+def current_rss_mb() -> float:
+    """当前进程常驻内存（MB）"""
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return peak_rss_mb()
+
+
+def peak_rss_mb() -> float:
+    usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux 以 KB 为单位，macOS 以字节为单位
+    return usage / (1024 * 1024) if sys.platform == 'darwin' else usage / 1024
+
+
+def start_backend(llm_url: str, workdir: str, extra_env: dict) -> str:
+    """在当前进程中以多线程 WSGI 服务启动后端，返回基础地址"""
+    os.environ['DEEPSEEK_API_URL'] = llm_url
+    os.environ.setdefault('DEEPSEEK_API_KEY', 'bench')
+    os.environ.setdefault('CACHE_DIR', os.path.join(workdir, 'cache'))
+    os.environ.update(extra_env)
+    os.chdir(workdir)
+    os.makedirs('uploads', exist_ok=True)
+    sys.path.insert(0, BACKEND_DIR)
+
+    from werkzeug.serving import make_server
+    import app as backend
+
+    # 关闭逐请求的访问日志，避免干扰压测输出
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    server = make_server('127.0.0.1', 0, backend.app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f'http://127.0.0.1:{server.server_port}'
+
+
+class Client:
+    """每个线程独立的 HTTP 会话"""
+
+    def __init__(self, base_url: str, token: str):
+        self.base_url = base_url
+        self.token = token
+        self._local = threading.local()
+
+    @property
+    def session(self) -> requests.Session:
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            session = requests.Session()
+            session.headers['Authorization'] = f'Bearer {self.token}'
+            self._local.session = session
+        return session
+
+    def post(self, path: str, **kwargs) -> requests.Response:
+        return self.session.post(self.base_url + path, timeout=600, **kwargs)
+
+    def get(self, path: str, **kwargs) -> requests.Response:
+        return self.session.get(self.base_url + path, timeout=60, **kwargs)
+
+    def wait_for(self, path: str, poll_interval: float = 0.05) -> dict:
+        """轮询状态接口直到任务结束"""
+        while True:
+            response = self.get(path)
+            response.raise_for_status()
+            status = response.json()
+            if status.get('status') != 'processing':
+                if status.get('status') == 'error':
+                    raise RuntimeError(status.get('message'))
+                return status
+            time.sleep(poll_interval)
+
+
+def login(base_url: str) -> str:
+    response = requests.post(f'{base_url}/api/login', json={'username': 'admin', 'password': 'admin123'}, timeout=30)
+    response.raise_for_status()
+    return response.json()['token']
+
+
+def consume_stream(response: requests.Response, start: float) -> float:
+    """读取完 SSE 响应，返回首个事件的到达时间（秒）"""
+    response.raise_for_status()
+    first_event = None
+    for line in response.iter_lines():
+        if first_event is None and line.startswith(b'data:'):
+            first_event = time.perf_counter() - start
+        if line.startswith(b'event: error'):
+            raise RuntimeError('流式接口返回错误')
+    return first_event or (time.perf_counter() - start)
+
+
+def make_request_func(endpoint: str, client: Client, upload_files: list = None):
+    """返回执行一次请求的函数，函数返回附加指标（如首字节时间）"""
+    generate_body = {'outline': SAMPLE_OUTLINE, 'projectInfo': SAMPLE_PROJECT, 'scoringCriteria': []}
+    ai_body = {'content': SAMPLE_CONTENT, 'context': {'label': '技术方案'}}
+
+    def upload(index):
+        path = upload_files[index % len(upload_files)]
+        start = time.perf_counter()
+        with open(path, 'rb') as f:
+            response = client.post('/api/upload', files={'file': (os.path.basename(path), f)})
+        response.raise_for_status()
+        accepted = time.perf_counter() - start
+        client.wait_for(f"/api/parsing-status/{response.json()['task_id']}")
+        return {'ttfb': accepted}
+
+    def generate(index):
+        response = client.post('/api/generate-proposal', json={**generate_body, 'task_id': f'bench_{uuid.uuid4().hex}'})
+        response.raise_for_status()
+        return {}
+
+    def generate_chapters(index):
+        task_id = f'bench_{uuid.uuid4().hex}'
+        start = time.perf_counter()
+        response = client.post('/api/generate-proposal', json={**generate_body, 'task_id': task_id, 'mode': 'chapters'})
+        response.raise_for_status()
+        accepted = time.perf_counter() - start
+        client.wait_for(f'/api/generation-status/{task_id}')
+        return {'ttfb': accepted}
+
+    def generate_stream(index):
+        start = time.perf_counter()
+        body = {**generate_body, 'task_id': f'bench_{uuid.uuid4().hex}'}
+        with client.post('/api/generate-proposal/stream', json=body, stream=True) as response:
+            return {'ttfb': consume_stream(response, start)}
+
+    def ai_action(action):
+        def run(index):
+            response = client.post(f'/api/ai-{action}', json=ai_body)
+            response.raise_for_status()
+            return {}
+        return run
+
+    def ai_stream(action):
+        def run(index):
+            start = time.perf_counter()
+            with client.post(f'/api/ai-{action}/stream', json=ai_body, stream=True) as response:
+                return {'ttfb': consume_stream(response, start)}
+        return run
+
+    funcs = {
+        'upload': upload,
+        'generate': generate,
+        'generate-chapters': generate_chapters,
+        'generate-stream': generate_stream,
+        'ai-continue': ai_action('continue'),
+        'ai-expand': ai_action('expand'),
+        'ai-polish': ai_action('polish'),
+        'ai-polish-stream': ai_stream('polish')
+    }
+    return funcs[endpoint]
+
+
+def run_scenario(name: str, func, total: int, concurrency: int) -> dict:
+    """并发执行 total 次请求并汇总指标"""
+    latencies = []
+    ttfbs = []
+    errors = []
+    lock = threading.Lock()
+
+    def one(index):
+        start = time.perf_counter()
+        try:
+            extra = func(index) or {}
+        except Exception as e:
+            with lock:
+                errors.append(str(e))
+            return
+        elapsed = time.perf_counter() - start
+        with lock:
+            latencies.append(elapsed)
+            if 'ttfb' in extra:
+                ttfbs.append(extra['ttfb'])
+
+    rss_before = current_rss_mb()
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(one, range(total)))
+    duration = time.perf_counter() - started
+
+    def summary(values):
+        return {
+            'p50': round(percentile(values, 50) * 1000, 1),
+            'p95': round(percentile(values, 95) * 1000, 1),
+            'p99': round(percentile(values, 99) * 1000, 1),
+            'mean': round(sum(values) / len(values) * 1000, 1) if values else 0.0,
+            'max': round(max(values) * 1000, 1) if values else 0.0
+        }
+
+    result = {
+        'scenario': name,
+        'requests': total,
+        'concurrency': concurrency,
+        'succeeded': len(latencies),
+        'errors': len(errors),
+        'duration_s': round(duration, 3),
+        'rps': round(len(latencies) / duration, 2) if duration else 0.0,
+        'latency_ms': summary(latencies),
+        'rss_mb_before': round(rss_before, 1),
+        'rss_mb_after': round(current_rss_mb(), 1),
+        'peak_rss_mb': round(peak_rss_mb(), 1)
+    }
+    if ttfbs:
+        result['ttfb_ms'] = summary(ttfbs)
+    if errors:
+        result['error_samples'] = errors[:5]
+    return result
+
+
+def compare(previous_path: str, results: list, threshold: float = 0.1):
+    """与历史结果对比，p95 延迟或吞吐变化超过阈值时标记为回归"""
+    with open(previous_path, encoding='utf-8') as f:
+        previous = {item['scenario']: item for item in json.load(f)['results']}
+    regressions = []
+    print(f"\n{'场景':<28}{'p95(ms) 旧→新':>24}{'rps 旧→新':>22}")
+    for item in results:
+        old = previous.get(item['scenario'])
+        if not old:
+            continue
+        old_p95, new_p95 = old['latency_ms']['p95'], item['latency_ms']['p95']
+        old_rps, new_rps = old['rps'], item['rps']
+        flag = ''
+        if (old_p95 and new_p95 > old_p95 * (1 + threshold)) or (old_rps and new_rps < old_rps * (1 - threshold)):
+            flag = '  <-- 回归'
+            regressions.append(item['scenario'])
+        print(f"{item['scenario']:<28}{f'{old_p95} → {new_p95}':>24}{f'{old_rps} → {new_rps}':>22}{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='后端压测')
+    parser.add_argument('--endpoints', default=','.join(ENDPOINTS), help='要压测的接口，逗号分隔')
+    parser.add_argument('--sizes', default='small,medium', help=f"上传样例规模，可选 {','.join(SIZES)}")
+    parser.add_argument('--requests', type=int, default=20, help='每个场景的请求数')
+    parser.add_argument('--concurrency', type=int, default=5, help='并发数')
+    parser.add_argument('--latency', type=float, default=0.2, help='模拟服务首字延迟（秒）')
+    parser.add_argument('--tokens-per-second', type=float, default=500, help='模拟服务输出速率')
+    parser.add_argument('--completion-tokens', type=int, default=200, help='模拟服务正文输出长度')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='模拟服务 429/5xx 比例')
+    parser.add_argument('--reuse-uploads', action='store_true', help='重复上传同一文件（测试缓存命中路径）')
+    parser.add_argument('--output', default='bench-results.json', help='结果输出文件')
+    parser.add_argument('--compare', help='与历史结果文件对比')
+    args = parser.parse_args()
+
+    endpoints = [endpoint.strip() for endpoint in args.endpoints.split(',') if endpoint.strip()]
+    sizes = [size.strip() for size in args.sizes.split(',') if size.strip()]
+    output = os.path.abspath(args.output)
+    previous = os.path.abspath(args.compare) if args.compare else None
+
+    config = MockConfig(args.latency, args.tokens_per_second, args.completion_tokens, args.error_rate)
+    _, llm_url = start_mock_server(config)
+    workdir = tempfile.mkdtemp(prefix='tender-bench-')
+    base_url = start_backend(llm_url, workdir, {'LLM_MAX_RETRIES': '2'})
+    client = Client(base_url, login(base_url))
+
+    results = []
+    for endpoint in endpoints:
+        if endpoint == 'upload':
+            for size in sizes:
+                for kind in ('pdf', 'docx'):
+                    # 默认每个请求使用内容不同的文件，避免命中解析与分析缓存
+                    copies = 1 if args.reuse_uploads else args.requests
+                    files = [
+                        build_fixtures(os.path.join(workdir, 'fixtures'), [size], seed=f'{i}')[f'{kind}_{size}']
+                        for i in range(copies)
+                    ]
+                    func = make_request_func('upload', client, files)
+                    results.append(run_scenario(f'upload:{kind}_{size}', func, args.requests, args.concurrency))
+                    print(json.dumps(results[-1], ensure_ascii=False))
+        else:
+            func = make_request_func(endpoint, client)
+            results.append(run_scenario(endpoint, func, args.requests, args.concurrency))
+            print(json.dumps(results[-1], ensure_ascii=False))
+
+    report = {
+        'meta': {
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'requests': args.requests,
+            'concurrency': args.concurrency,
+            'mock': {
+                'latency': args.latency,
+                'tokens_per_second': args.tokens_per_second,
+                'completion_tokens': args.completion_tokens,
+                'error_rate': args.error_rate,
+                'upstream_requests': config.requests,
+                'upstream_errors': config.errors
+            }
+        },
+        'results': results
+    }
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f'\n结果已写入 {output}')
+
+    if previous:
+        regressions = compare(previous, results)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,240 @@
+import asyncio
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+
+
+def file_sha256(filepath: str, block_size: int = 1024 * 1024) -> str:
+    """流式计算文件的 SHA-256"""
+    digest = hashlib.sha256()
+    with open(filepath, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def text_sha256(text: str) -> str:
+    """计算文本的 SHA-256"""
+    return hashlib.sha256((text or '').encode('utf-8')).hexdigest()
+
+
+class ContentCache:
+    """两级内容寻址缓存：内存 LRU + 按总大小淘汰的磁盘缓存"""
+
+    def __init__(self, directory: str, memory_items: int = 128, disk_max_bytes: int = 512 * 1024 * 1024):
+        self.directory = directory
+        self.memory_items = max(1, memory_items)
+        self.disk_max_bytes = disk_max_bytes
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(directory, exist_ok=True)
+        self._disk_bytes = sum(size for _, size, _ in self._scan())
+
+    def _path(self, key: str) -> str:
+        digest = hashlib.sha256(key.encode('utf-8')).hexdigest()
+        return os.path.join(self.directory, digest[:2], f'{digest}.json')
+
+    def _scan(self):
+        """遍历磁盘缓存文件，返回 (路径, 大小, 最近访问时间)"""
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if not name.endswith('.json'):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                yield path, stat.st_size, stat.st_mtime
+
+    def get(self, key: str):
+        """读取缓存，未命中返回 None"""
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return self._memory[key]
+
+        path = self._path(key)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                value = json.load(f)
+            # 更新访问时间，磁盘淘汰时保留热数据
+            os.utime(path)
+        except (OSError, ValueError):
+            with self._lock:
+                self.misses += 1
+            return None
+
+        with self._lock:
+            self.hits += 1
+            self._remember(key, value)
+        return value
+
+    def set(self, key: str, value):
+        """写入缓存（内存与磁盘）"""
+        with self._lock:
+            self._remember(key, value)
+
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f'{path}.{threading.get_ident()}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(value, f, ensure_ascii=False)
+        old_size = os.path.getsize(path) if os.path.exists(path) else 0
+        os.replace(tmp_path, path)
+
+        with self._lock:
+            self._disk_bytes += os.path.getsize(path) - old_size
+            over_limit = self._disk_bytes > self.disk_max_bytes
+        if over_limit:
+            self._evict_disk()
+
+    def _remember(self, key: str, value):
+        self._memory[key] = value
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_items:
+            self._memory.popitem(last=False)
+
+    def _evict_disk(self):
+        """按最近访问时间淘汰磁盘缓存，直到总大小降到上限的 90%"""
+        entries = sorted(self._scan(), key=lambda entry: entry[2])
+        total = sum(size for _, size, _ in entries)
+        target = int(self.disk_max_bytes * 0.9)
+        for path, size, _ in entries:
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass
+        with self._lock:
+            self._disk_bytes = total
+
+    def stats(self) -> dict:
+        """缓存统计信息"""
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'memory_items': len(self._memory),
+                'disk_bytes': self._disk_bytes
+            }
+
+
+class ResponseCache:
+    """带过期时间的内存 LRU 缓存，相同键的并发请求合并为一次计算"""
+
+    def __init__(self, max_items: int = 1024, ttl: float = 3600):
+        self.max_items = max(1, max_items)
+        self.ttl = ttl
+        self._memory = OrderedDict()
+        self._inflight = {}
+        self._async_inflight = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    def get(self, key: str):
+        """读取未过期的缓存，未命中返回 None"""
+        with self._lock:
+            return self._lookup(key)
+
+    def set(self, key: str, value):
+        if self.ttl <= 0:
+            return
+        with self._lock:
+            self._memory[key] = (time.monotonic() + self.ttl, value)
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_items:
+                self._memory.popitem(last=False)
+
+    def _lookup(self, key: str):
+        entry = self._memory.get(key)
+        if entry is not None and entry[0] > time.monotonic():
+            self._memory.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+        if entry is not None:
+            del self._memory[key]
+        return None
+
+    def get_or_compute(self, key: str, compute):
+        """命中缓存直接返回；相同请求正在计算时等待其结果；否则调用 compute 并缓存"""
+        with self._lock:
+            value = self._lookup(key)
+            if value is not None:
+                return value
+            future = self._inflight.get(key)
+            leader = future is None
+            if leader:
+                future = self._inflight[key] = Future()
+                self.misses += 1
+            else:
+                self.coalesced += 1
+        if not leader:
+            return future.result()
+
+        try:
+            value = compute()
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        else:
+            self.set(key, value)
+            future.set_result(value)
+            return value
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    async def aget_or_compute(self, key: str, compute):
+        """get_or_compute 的协程版本，compute 为返回协程的函数"""
+        with self._lock:
+            value = self._lookup(key)
+            if value is not None:
+                return value
+            future = self._async_inflight.get(key)
+            leader = future is None
+            if leader:
+                future = self._async_inflight[key] = asyncio.get_running_loop().create_future()
+                self.misses += 1
+            else:
+                self.coalesced += 1
+        if not leader:
+            return await asyncio.shield(future)
+
+        try:
+            value = await compute()
+        except Exception as e:
+            future.set_exception(e)
+            # 没有其他等待者时避免“异常未被获取”的警告
+            future.exception()
+            raise
+        else:
+            self.set(key, value)
+            future.set_result(value)
+            return value
+        finally:
+            with self._lock:
+                self._async_inflight.pop(key, None)
+
+    def stats(self) -> dict:
+        """缓存统计：hit_rate 为无需调用上游（命中或合并）的请求比例"""
+        with self._lock:
+            requests = self.hits + self.misses + self.coalesced
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'coalesced': self.coalesced,
+                'items': len(self._memory),
+                'hit_rate': round((self.hits + self.coalesced) / requests, 4) if requests else 0.0
+            }
@@ -0,0 +1,160 @@
+import hashlib
+import os
+import threading
+import time
+import uuid
+
+try:
+    import fcntl  # 防止同一上传的分片被多个进程同时写入（仅 POSIX）
+except ImportError:
+    fcntl = None
+
+# 从请求体读取并写盘的块大小
+READ_BLOCK_SIZE = 1024 * 1024
+
+
+class UploadError(Exception):
+    """分片上传请求无效"""
+
+
+class UploadOffsetError(UploadError):
+    """分片的偏移量与服务器已接收的字节数不一致，客户端应从 received 处续传"""
+
+    def __init__(self, received: int):
+        super().__init__(f'偏移量不匹配，已接收 {received} 字节')
+        self.received = received
+
+
+class UploadBusyError(UploadError):
+    """同一上传的另一个分片正在写入"""
+
+
+class ChunkedUploads:
+    """分片上传：分片直接追加写入磁盘上的临时文件，边写边计算 SHA-256，断线后按已接收字节数续传
+
+    会话元数据保存在任务存储中（多进程共享），已接收的字节数以临时文件大小为准；
+    哈希状态保存在本进程内存中，续传时若不一致（如进程重启）则从临时文件重新计算。
+    """
+
+    def __init__(self, directory: str, sessions, chunk_size: int, max_size: int, ttl: float = 86400):
+        self.directory = directory
+        self.sessions = sessions
+        self.chunk_size = chunk_size
+        self.max_size = max_size
+        self.ttl = ttl
+        self._hashers = {}
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def _part_path(self, upload_id: str) -> str:
+        return os.path.join(self.directory, f'{upload_id}.part')
+
+    def create(self, filename: str, size: int, max_size: int = None, **extra) -> dict:
+        """创建上传会话，max_size 覆盖默认的大小上限"""
+        max_size = max_size or self.max_size
+        if size <= 0:
+            raise UploadError('文件大小无效')
+        if size > max_size:
+            raise UploadError(f'文件大小不能超过 {max_size // (1024 * 1024)}MB')
+        self.purge_stale()
+        upload_id = uuid.uuid4().hex
+        open(self._part_path(upload_id), 'wb').close()
+        session = dict(extra, filename=filename, size=size, created=time.time())
+        self.sessions[upload_id] = session
+        return self.status(upload_id)
+
+    def status(self, upload_id: str):
+        """返回会话信息与已接收的字节数，会话不存在时返回 None"""
+        session = self.sessions.get(upload_id)
+        if session is None:
+            return None
+        try:
+            received = os.path.getsize(self._part_path(upload_id))
+        except OSError:
+            return None
+        return dict(
+            session,
+            upload_id=upload_id,
+            received=received,
+            chunk_size=self.chunk_size,
+            complete=received == session['size']
+        )
+
+    def append(self, upload_id: str, offset: int, stream) -> dict:
+        """把请求体从 offset 处追加写入临时文件，返回最新状态"""
+        status = self.status(upload_id)
+        if status is None:
+            raise KeyError(upload_id)
+        with open(self._part_path(upload_id), 'r+b') as f:
+            if fcntl is not None:
+                try:
+                    fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    raise UploadBusyError('该文件的另一个分片正在上传')
+            try:
+                received = os.fstat(f.fileno()).st_size
+                if offset != received:
+                    raise UploadOffsetError(received)
+                hasher = self._hasher(upload_id, f, received)
+                f.seek(received)
+                remaining = status['size'] - received
+                while True:
+                    block = stream.read(READ_BLOCK_SIZE)
+                    if not block:
+                        break
+                    if len(block) > remaining:
+                        raise UploadError('上传的数据超出声明的文件大小')
+                    f.write(block)
+                    hasher.update(block)
+                    remaining -= len(block)
+                    with self._lock:
+                        self._hashers[upload_id] = (status['size'] - remaining, hasher)
+                f.flush()
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+        return self.status(upload_id)
+
+    def _hasher(self, upload_id: str, f, received: int):
+        """取得与已接收数据一致的哈希状态，不一致时从临时文件重新计算"""
+        with self._lock:
+            offset, hasher = self._hashers.get(upload_id, (0, None))
+        if hasher is not None and offset == received:
+            return hasher
+        hasher = hashlib.sha256()
+        f.seek(0)
+        while f.tell() < received:
+            block = f.read(min(READ_BLOCK_SIZE, received - f.tell()))
+            if not block:
+                break
+            hasher.update(block)
+        return hasher
+
+    def complete(self, upload_id: str, destination: str) -> str:
+        """把已接收完整的文件移动到目标路径，返回文件的 SHA-256"""
+        status = self.status(upload_id)
+        if status is None:
+            raise KeyError(upload_id)
+        if not status['complete']:
+            raise UploadOffsetError(status['received'])
+        path = self._part_path(upload_id)
+        with open(path, 'rb') as f:
+            digest = self._hasher(upload_id, f, status['received']).hexdigest()
+        os.replace(path, destination)
+        with self._lock:
+            self._hashers.pop(upload_id, None)
+        self.sessions.delete(upload_id)
+        return digest
+
+    def purge_stale(self):
+        """删除超过保留时间仍未完成的临时文件"""
+        cutoff = time.time() - self.ttl
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            try:
+                if name.endswith('.part') and os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+                    with self._lock:
+                        self._hashers.pop(name[:-5], None)
+            except OSError:
+                pass
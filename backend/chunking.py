@@ -0,0 +1,208 @@
+import hashlib
+import re
+
+# 常见的中文招标文件标题格式：第一章、第1节、一、（一）、1.1、附件1 等
+HEADING_PATTERN = re.compile(
+    r'^\s*('
+    r'第[一二三四五六七八九十百零〇\d]+[章节篇部分卷]'
+    r'|[一二三四五六七八九十]+[、.．]'
+    r'|[（(][一二三四五六七八九十]+[)）]'
+    r'|\d+(\.\d+)*[、.．\s]'
+    r'|附件\s*[\d一二三四五六七八九十]+'
+    r'|#{1,6}\s'
+    r')'
+)
+
+CJK_PATTERN = re.compile(r'[\u3000-\u303f\u3400-\u9fff\uff00-\uffef]')
+
+
+def estimate_tokens(text: str) -> int:
+    """粗略估算 token 数：中文字符按 1 个 token 计，其余按 4 个字符 1 个 token 计"""
+    if not text:
+        return 0
+    cjk = len(CJK_PATTERN.findall(text))
+    return cjk + (len(text) - cjk + 3) // 4
+
+
+def is_heading(line: str) -> bool:
+    """判断一行是否为章节标题"""
+    stripped = line.strip()
+    return bool(stripped) and len(stripped) <= 60 and bool(HEADING_PATTERN.match(stripped))
+
+
+def split_sections(text: str) -> list:
+    """按标题边界把文本切分为章节，返回章节文本列表"""
+    sections = []
+    current = []
+    for line in text.split('\n'):
+        if is_heading(line) and current:
+            sections.append('\n'.join(current))
+            current = []
+        current.append(line)
+    if current:
+        sections.append('\n'.join(current))
+    return [section for section in sections if section.strip()]
+
+
+def _split_oversized(section: str, max_tokens: int) -> list:
+    """超出预算的章节按行切分，单行仍超出时按字符切分"""
+    pieces = []
+    current = []
+    current_tokens = 0
+    for line in section.split('\n'):
+        line_tokens = estimate_tokens(line) + 1
+        if line_tokens > max_tokens:
+            # 单行过长，按字符硬切
+            step = max(1, max_tokens)
+            for start in range(0, len(line), step):
+                pieces.append(line[start:start + step])
+            continue
+        if current and current_tokens + line_tokens > max_tokens:
+            pieces.append('\n'.join(current))
+            current = []
+            current_tokens = 0
+        current.append(line)
+        current_tokens += line_tokens
+    if current:
+        pieces.append('\n'.join(current))
+    return pieces
+
+
+def content_hash(text: str) -> str:
+    """内容指纹，忽略空白差异（PDF 重新排版产生的换行、空格变化不视为修改）"""
+    return hashlib.sha1(re.sub(r'\s+', '', text).encode('utf-8')).hexdigest()
+
+
+def split_into_units(text: str, target_tokens: int, max_tokens: int) -> list:
+    """按章节把文本切分为分析单元，返回 [{'text', 'hash', 'sections'}]
+
+    单元累计达到 target_tokens 后，只在指纹满足条件的章节之后切分（内容定义的边界），
+    局部修改只影响所在单元，其余单元的边界和指纹保持不变，可复用上一版本的分析结果。
+    """
+    if not text or not text.strip():
+        return []
+
+    pieces = []
+    for section in split_sections(text):
+        if estimate_tokens(section) + 1 > max_tokens:
+            pieces.extend(_split_oversized(section, max_tokens))
+        else:
+            pieces.append(section)
+
+    units = []
+    current = []
+    current_tokens = 0
+
+    def close():
+        nonlocal current, current_tokens
+        unit_text = '\n'.join(section for section, _ in current)
+        units.append({
+            'text': unit_text,
+            'hash': content_hash(unit_text),
+            'sections': [digest for _, digest in current]
+        })
+        current = []
+        current_tokens = 0
+
+    for section in pieces:
+        tokens = estimate_tokens(section) + 1
+        if current and current_tokens + tokens > max_tokens:
+            close()
+        digest = content_hash(section)
+        current.append((section, digest))
+        current_tokens += tokens
+        if current_tokens >= target_tokens and int(digest[:8], 16) % 2 == 0:
+            close()
+    if current:
+        close()
+    return units
+
+
+UNKNOWN_VALUES = {'', '未知', '无', '未识别', '未识别到项目名称', '未提及', 'na', 'none', 'null'}
+
+
+def _normalize(value) -> str:
+    """去除空白与标点后用于去重比较"""
+    return re.sub(r'[\s\W_]+', '', str(value or '')).lower()
+
+
+def _is_known(value) -> bool:
+    return _normalize(value) not in UNKNOWN_VALUES
+
+
+def _merge_list(target: list, items) -> None:
+    """按归一化文本去重追加"""
+    seen = {_normalize(item) for item in target}
+    for item in items or []:
+        key = _normalize(item)
+        if key and key not in seen:
+            seen.add(key)
+            target.append(item)
+
+
+def merge_analysis_results(results: list) -> dict:
+    """合并多个分块的分析结果，对项目信息、评分标准和大纲去重"""
+    project_info = {
+        'name': '未识别到项目名称',
+        'type': '未知',
+        'budget': '未知',
+        'deadline': '未知',
+        'requirements': []
+    }
+    criteria = []
+    criteria_index = {}
+    outline = []
+    outline_index = {}
+
+    for result in results:
+        info = result.get('project_info') or {}
+        for field, value in info.items():
+            if field == 'requirements':
+                _merge_list(project_info['requirements'], value)
+            elif _is_known(value) and not _is_known(project_info.get(field)):
+                project_info[field] = value
+
+        for criterion in result.get('scoring_criteria') or []:
+            if not isinstance(criterion, dict):
+                continue
+            key = (_normalize(criterion.get('category')), _normalize(criterion.get('item')))
+            if key in criteria_index:
+                existing = criteria_index[key]
+                existing.setdefault('requirements', [])
+                _merge_list(existing['requirements'], criterion.get('requirements'))
+                if not _is_known(existing.get('description')) and _is_known(criterion.get('description')):
+                    existing['description'] = criterion['description']
+                continue
+            merged = dict(criterion)
+            merged['requirements'] = list(criterion.get('requirements') or [])
+            criteria_index[key] = merged
+            criteria.append(merged)
+
+        for item in result.get('outline') or []:
+            if not isinstance(item, dict):
+                continue
+            key = _normalize(item.get('title'))
+            if not key:
+                continue
+            if key in outline_index:
+                existing = outline_index[key]
+                existing['required'] = bool(existing.get('required')) or bool(item.get('required'))
+                existing.setdefault('key_points', [])
+                _merge_list(existing['key_points'], item.get('key_points'))
+                continue
+            merged = dict(item)
+            merged['key_points'] = list(item.get('key_points') or [])
+            outline_index[key] = merged
+            outline.append(merged)
+
+    # 重新编号
+    for index, criterion in enumerate(criteria, 1):
+        criterion['id'] = str(index)
+    for index, item in enumerate(outline, 1):
+        item['id'] = str(index)
+
+    return {
+        'project_info': project_info,
+        'scoring_criteria': criteria,
+        'outline': outline
+    }
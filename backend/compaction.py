@@ -0,0 +1,141 @@
+import logging
+import re
+from collections import Counter
+
+from chunking import estimate_tokens, is_heading
+
+logger = logging.getLogger(__name__)
+
+# PDF 文本中的分页符，解析时插在页与页之间，压缩后去除
+PAGE_BREAK = '\f'
+
+# 页眉页脚候选：每页开头、结尾各取几行
+FURNITURE_LINES = 3
+# 在多少比例的页面上重复出现即视为页眉页脚
+FURNITURE_MIN_RATIO = 0.5
+# 页眉页脚的最大长度
+FURNITURE_MAX_CHARS = 40
+# 参与去重的最短行长度，短行（表格单元格、“是/否”等）重复是正常的
+DEDUPE_MIN_CHARS = 20
+
+SPACE_PATTERN = re.compile(r'[ \t\u00a0\u2002-\u200b\u3000]+')
+# PyPDF2 常在汉字之间插入空格
+CJK_SPACE_PATTERN = re.compile(r'(?<=[\u3000-\u303f\u3400-\u9fff\uff00-\uffef]) (?=[\u3000-\u303f\u3400-\u9fff\uff00-\uffef])')
+# 目录行：标题 + 点线/省略号引导符 + 页码
+TOC_PATTERN = re.compile(r'^.{1,80}?\s*(?:[.．·…。-]\s*){4,}\s*\d{1,4}$')
+# 单独的页码行：“- 3 -”、“第 3 页 共 20 页”、“3/20”、“Page 3”；
+# 只有数字的行可能是表格单元格（如评分表中的分值），只在作为页眉页脚重复出现时去掉
+PAGE_NUMBER_PATTERN = re.compile(
+    r'^(?:[-—–]\s*\d{1,4}\s*[-—–]'
+    r'|第\s*\d{1,4}\s*页(?:\s*[，,/]?\s*共\s*\d{1,4}\s*页)?'
+    r'|\d{1,4}\s*/\s*\d{1,4}'
+    r'|page\s*\d{1,4}(?:\s*of\s*\d{1,4})?)$',
+    re.IGNORECASE
+)
+DIGITS_PATTERN = re.compile(r'\d+')
+BARE_NUMBER_PATTERN = re.compile(r'^\d{1,4}$')
+
+
+def normalize_line(line: str) -> str:
+    """合并空白，去掉汉字之间多余的空格"""
+    line = SPACE_PATTERN.sub(' ', line).strip()
+    return CJK_SPACE_PATTERN.sub('', line)
+
+
+def _furniture_key(line: str, index: int, count: int):
+    # 页码等数字不同的页眉页脚视为同一行；标题（如“第3章”）不做数字归一
+    if len(line) > FURNITURE_MAX_CHARS:
+        return None
+    # 只有数字的行只在页面第一行或最后一行时视为页码，避免误删表格中的数值
+    if BARE_NUMBER_PATTERN.match(line) and index not in (0, count - 1):
+        return None
+    key = line.replace(' ', '')
+    return key if is_heading(line) else DIGITS_PATTERN.sub('#', key)
+
+
+def strip_page_furniture(pages: list) -> list:
+    """去掉在多数页面开头或结尾重复出现的页眉页脚，pages 为每页的行列表"""
+    if len(pages) < 3:
+        return pages
+    counts = Counter()
+    for lines in pages:
+        count = len(lines)
+        edge = {
+            _furniture_key(lines[index], index, count)
+            for index in set(range(min(FURNITURE_LINES, count))) | set(range(max(count - FURNITURE_LINES, 0), count))
+        }
+        counts.update(edge)
+    threshold = max(2, int(len(pages) * FURNITURE_MIN_RATIO))
+    furniture = {key for key, count in counts.items() if count >= threshold and key is not None}
+    if not furniture:
+        return pages
+
+    stripped = []
+    for lines in pages:
+        head = FURNITURE_LINES
+        tail = max(len(lines) - FURNITURE_LINES, head)
+        stripped.append([
+            line for index, line in enumerate(lines)
+            if not ((index < head or index >= tail) and _furniture_key(line, index, len(lines)) in furniture)
+        ])
+    return stripped
+
+
+def compact_text(text: str) -> str:
+    """压缩送入模型的招标文件文本：去页眉页脚、目录引导线、页码行与重复条款，合并空白"""
+    if not text:
+        return ''
+    pages = [
+        [line for line in (normalize_line(line) for line in page.split('\n')) if line]
+        for page in text.split(PAGE_BREAK)
+    ]
+    pages = strip_page_furniture(pages)
+
+    seen = set()
+    output = []
+    for lines in pages:
+        for line in lines:
+            if PAGE_NUMBER_PATTERN.match(line) or TOC_PATTERN.match(line):
+                continue
+            if len(line) >= DEDUPE_MIN_CHARS and not is_heading(line):
+                key = line.replace(' ', '')
+                if key in seen:
+                    continue
+                seen.add(key)
+            output.append(line)
+    return '\n'.join(output)
+
+
+def load_token_counter(tokenizer_path: str = ''):
+    """加载本地分词器（HuggingFace tokenizer.json），返回 count(text) -> token 数；
+    未配置或未安装 tokenizers 时退回按字符估算"""
+    if not tokenizer_path:
+        return estimate_tokens
+    try:
+        from tokenizers import Tokenizer
+    except ImportError:
+        logger.warning('未安装 tokenizers，按字符估算 token 数')
+        return estimate_tokens
+    tokenizer = Tokenizer.from_file(tokenizer_path)
+
+    def count(text: str) -> int:
+        return len(tokenizer.encode(text or '', add_special_tokens=False).ids) if text else 0
+
+    return count
+
+
+def truncate_to_budget(text: str, max_tokens: int, count=estimate_tokens, note: str = '\n（以下内容超出长度限制，已省略）') -> str:
+    """按行截断到 token 预算内，返回原文或截断后的文本"""
+    if max_tokens <= 0 or count(text) <= max_tokens:
+        return text
+    lines = text.split('\n')
+    budget = max_tokens - count(note)
+    # 二分查找能放下的最多行数，避免逐行调用分词器
+    low, high = 0, len(lines)
+    while low < high:
+        middle = (low + high + 1) // 2
+        if count('\n'.join(lines[:middle])) <= budget:
+            low = middle
+        else:
+            high = middle - 1
+    return '\n'.join(lines[:low]) + note
@@ -0,0 +1,41 @@
+from compaction import PAGE_BREAK
+from docx_extract import iter_docx_blocks, blocks_to_text
+from pdf_extract import iter_pdf_pages
+from pdf_ocr import iter_ocr_pages
+
+SUPPORTED_EXTENSIONS = ('.pdf', '.docx', '.doc')
+
+
+def parse_document(filepath: str, pdf_backend: str = 'auto', pdf_workers: int = None, on_progress=None,
+                   ocr: dict = None):
+    """提取 PDF/Word 文档的文本，不支持的格式返回 None
+
+    ocr 为 iter_ocr_pages 的参数（workers、lang、dpi、cache_dir 等），为 None 时不做 OCR。
+    """
+    extension = filepath.lower()
+    if extension.endswith('.pdf'):
+        return parse_pdf(filepath, pdf_backend, pdf_workers, on_progress, ocr)
+    elif extension.endswith(('.docx', '.doc')):
+        return parse_docx(filepath)
+    return None
+
+
+def parse_pdf(filepath: str, pdf_backend: str = 'auto', pdf_workers: int = None, on_progress=None,
+              ocr: dict = None) -> str:
+    """提取 PDF 全文
+
+    各页由 iter_pdf_pages 按页序逐页产出（并行解析、进度与页/秒随页段上报），在这里合并为全文：
+    文本缓存按全文保存，提示词压缩要跨页比较页眉页脚，分析单元的切分与复用也以全文为准，
+    因此章节切分在整份文档提取完成后才开始。
+    """
+    pages = iter_pdf_pages(filepath, pdf_backend, pdf_workers, on_progress)
+    if ocr is not None:
+        # 文本层过少的扫描页替换为 OCR 结果，仍按页序合并
+        pages = iter_ocr_pages(filepath, pages, **ocr)
+    # 页与页之间插入分页符，供压缩时识别页眉页脚
+    return f'\n{PAGE_BREAK}\n'.join(pages)
+
+
+def parse_docx(filepath: str) -> str:
+    # 增量解析 document.xml，保留标题、列表与表格结构
+    return blocks_to_text(iter_docx_blocks(filepath))
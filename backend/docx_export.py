@@ -0,0 +1,622 @@
+"""把编辑器 HTML 单遍流式转换为 DOCX：边解析边写入 word/document.xml，
+压缩后的数据随产随出，不落临时文件"""
+import base64
+import io
+import logging
+import re
+import struct
+import zipfile
+from html.parser import HTMLParser
+from xml.sax.saxutils import escape, quoteattr
+
+try:
+    from PIL import Image  # 可选依赖，用于把 WebP 等 Word 不支持的图片转为 PNG
+except ImportError:
+    Image = None
+
+logger = logging.getLogger(__name__)
+
+# A4 纸张与 2cm 页边距（单位：twip）
+PAGE_WIDTH = 11906
+PAGE_HEIGHT = 16838
+PAGE_MARGIN = 1134
+TEXT_WIDTH = PAGE_WIDTH - 2 * PAGE_MARGIN
+
+EMU_PER_TWIP = 635
+EMU_PER_PIXEL = 9525
+DEFAULT_IMAGE_SIZE = (400, 300)
+
+# 每次送入解析器的 HTML 字符数，以及累计多少字节后写入压缩流
+FEED_CHARS = 64 * 1024
+FLUSH_BYTES = 64 * 1024
+
+INVALID_XML_CHARS = re.compile(r'[\x00-\x08\x0b\x0c\x0e-\x1f￾￿]')
+WHITESPACE = re.compile(r'[ \t\n\r\f]+')
+DATA_URI = re.compile(r'^data:image/[\w.+-]+;base64,', re.IGNORECASE)
+
+BLOCK_TAGS = {'p', 'div', 'li', 'blockquote', 'pre', 'section', 'article', 'header', 'footer',
+              'figure', 'figcaption', 'caption', 'address', 'dd', 'dt',
+              'h1', 'h2', 'h3', 'h4', 'h5', 'h6'}
+INLINE_FORMATS = {'b': 'b', 'strong': 'b', 'i': 'i', 'em': 'i', 'u': 'u', 'ins': 'u',
+                  's': 'strike', 'strike': 'strike', 'del': 'strike',
+                  'sup': 'sup', 'sub': 'sub', 'code': 'code', 'kbd': 'code'}
+SKIP_TAGS = {'script', 'style', 'head', 'title', 'template'}
+
+IMAGE_TYPES = {'png': 'image/png', 'jpeg': 'image/jpeg', 'gif': 'image/gif', 'bmp': 'image/bmp'}
+BULLETS = ['•', '◦', '▪']
+
+NAMESPACES = (
+    'xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main" '
+    'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships" '
+    'xmlns:wp="http://schemas.openxmlformats.org/drawingml/2006/wordprocessingDrawing" '
+    'xmlns:a="http://schemas.openxmlformats.org/drawingml/2006/main" '
+    'xmlns:pic="http://schemas.openxmlformats.org/drawingml/2006/picture"'
+)
+XML_HEADER = '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+REL_NS = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships'
+
+
+def xml_text(text: str) -> str:
+    return escape(INVALID_XML_CHARS.sub('', text))
+
+
+def image_info(data: bytes):
+    """识别图片格式与像素尺寸，返回 (扩展名, 宽, 高)，不支持的格式返回 None"""
+    if data.startswith(b'\x89PNG\r\n\x1a\n') and len(data) >= 24:
+        width, height = struct.unpack('>II', data[16:24])
+        return 'png', width, height
+    if data[:6] in (b'GIF87a', b'GIF89a') and len(data) >= 10:
+        width, height = struct.unpack('<HH', data[6:10])
+        return 'gif', width, height
+    if data.startswith(b'BM') and len(data) >= 26:
+        width, height = struct.unpack('<ii', data[18:26])
+        return 'bmp', width, abs(height)
+    if data.startswith(b'\xff\xd8'):
+        # 扫描 JPEG 段，找到 SOF 段读取尺寸
+        index = 2
+        while index + 9 < len(data):
+            if data[index] != 0xFF:
+                index += 1
+                continue
+            marker = data[index + 1]
+            if marker in (0xD8, 0x01) or 0xD0 <= marker <= 0xD7 or marker == 0xFF:
+                index += 1 if marker == 0xFF else 2
+                continue
+            length = struct.unpack('>H', data[index + 2:index + 4])[0]
+            if 0xC0 <= marker <= 0xCF and marker not in (0xC4, 0xC8, 0xCC):
+                height, width = struct.unpack('>HH', data[index + 5:index + 9])
+                return 'jpeg', width, height
+            index += 2 + length
+        return 'jpeg', *DEFAULT_IMAGE_SIZE
+    return None
+
+
+def convert_to_png(data: bytes):
+    """把 Word 不支持的图片格式（如 WebP）转为 PNG，未安装 Pillow 或无法识别时返回 None"""
+    if Image is None:
+        return None
+    try:
+        with Image.open(io.BytesIO(data)) as image:
+            # 动图只取第一帧
+            if image.mode not in ('1', 'L', 'LA', 'P', 'RGB', 'RGBA'):
+                image = image.convert('RGBA')
+            output = io.BytesIO()
+            image.save(output, format='PNG')
+            return output.getvalue()
+    except Exception as e:
+        logger.warning("图片转换错误: %s", e)
+        return None
+
+
+def decode_data_uri(src: str):
+    if not DATA_URI.match(src):
+        return None
+    try:
+        return base64.b64decode(src.split(',', 1)[1])
+    except ValueError:
+        return None
+
+
+def _css_length(style: str, name: str):
+    match = re.search(rf'(?:^|;)\s*{name}\s*:\s*([\d.]+)px', style or '')
+    return float(match.group(1)) if match else None
+
+
+def _length_attr(value):
+    try:
+        return float(str(value).strip().rstrip('px')) if value else None
+    except ValueError:
+        return None
+
+
+class DocxWriter(HTMLParser):
+    """HTML 事件直接转换为 WordprocessingML 片段，段落写完即交给 emit；
+    表格需要在结束时才能确定列数，因此以表格为单位缓冲"""
+
+    def __init__(self, emit, image_loader=None):
+        super().__init__(convert_charrefs=True)
+        self.emit = emit
+        self.image_loader = image_loader
+        self.images = []
+        self.image_ids = {}
+        self._drawings = 0
+        self.ordered_lists = []
+        self._blocks = []
+        self._lists = []
+        self._tables = []
+        self._outputs = []
+        self._formats = {}
+        self._paragraph = None
+        self._skip = 0
+        self._pre = 0
+
+    # 输出
+
+    def _write(self, xml: str):
+        if self._outputs:
+            self._outputs[-1].append(xml)
+        else:
+            self.emit(xml)
+
+    def _flush_paragraph(self):
+        if self._paragraph is None:
+            return
+        properties, runs = self._paragraph
+        self._paragraph = None
+        if runs:
+            self._write(f'<w:p>{properties}{"".join(runs)}</w:p>')
+
+    def _runs(self) -> list:
+        if self._paragraph is None:
+            self._paragraph = (self._paragraph_properties(), [])
+        return self._paragraph[1]
+
+    def _paragraph_properties(self) -> str:
+        block = self._blocks[-1] if self._blocks else {}
+        parts = []
+        if block.get('style'):
+            parts.append(f'<w:pStyle w:val="{block["style"]}"/>')
+        if block.get('num'):
+            num_id, level = block['num']
+            parts.append(f'<w:numPr><w:ilvl w:val="{level}"/><w:numId w:val="{num_id}"/></w:numPr>')
+        if block.get('align'):
+            parts.append(f'<w:jc w:val="{block["align"]}"/>')
+        return f'<w:pPr>{"".join(parts)}</w:pPr>' if parts else ''
+
+    def _run_properties(self) -> str:
+        active = {name for name, count in self._formats.items() if count > 0}
+        parts = []
+        if 'code' in active or self._pre:
+            parts.append('<w:rFonts w:ascii="Consolas" w:hAnsi="Consolas"/>')
+        if 'b' in active:
+            parts.append('<w:b/>')
+        if 'i' in active:
+            parts.append('<w:i/>')
+        if 'strike' in active:
+            parts.append('<w:strike/>')
+        if 'u' in active:
+            parts.append('<w:u w:val="single"/>')
+        if 'sup' in active or 'sub' in active:
+            parts.append(f'<w:vertAlign w:val="{"superscript" if "sup" in active else "subscript"}"/>')
+        return f'<w:rPr>{"".join(parts)}</w:rPr>' if parts else ''
+
+    def _add_text(self, text: str):
+        if not text:
+            return
+        self._runs().append(
+            f'<w:r>{self._run_properties()}<w:t xml:space="preserve">{xml_text(text)}</w:t></w:r>'
+        )
+
+    # 块级元素
+
+    def _open_block(self, tag: str, attrs: dict):
+        self._flush_paragraph()
+        block = dict(self._blocks[-1]) if self._blocks else {}
+        if tag[0] == 'h' and tag[1:].isdigit():
+            block = {'style': f'Heading{tag[1]}'}
+        elif tag == 'li':
+            level = min(max(len(self._lists) - 1, 0), 8)
+            num_id = self._lists[-1] if self._lists else 1
+            block = {'num': (num_id, level)}
+        elif tag == 'blockquote':
+            block['style'] = 'Quote'
+        elif tag == 'pre':
+            block = {'style': 'Code'}
+            self._pre += 1
+        align = re.search(r'text-align\s*:\s*(left|center|right|justify)', attrs.get('style') or '')
+        if align:
+            block['align'] = {'justify': 'both'}.get(align.group(1), align.group(1))
+        self._blocks.append(block)
+
+    def _close_block(self, tag: str):
+        self._flush_paragraph()
+        if self._blocks:
+            self._blocks.pop()
+        if tag == 'pre' and self._pre:
+            self._pre -= 1
+
+    def _open_list(self, tag: str, attrs: dict):
+        self._flush_paragraph()
+        if tag == 'ul':
+            self._lists.append(1)
+            return
+        # 每个有序列表使用独立编号，保证从头计数
+        num_id = len(self.ordered_lists) + 2
+        start = attrs.get('start') or '1'
+        self.ordered_lists.append((num_id, min(len(self._lists), 8), int(start) if start.isdigit() else 1))
+        self._lists.append(num_id)
+
+    # 表格
+
+    def _open_table(self):
+        self._flush_paragraph()
+        self._tables.append({'rows': [], 'row': None, 'cell': None})
+
+    def _open_row(self):
+        table = self._tables[-1]
+        self._close_row()
+        table['row'] = []
+
+    def _open_cell(self, tag: str, attrs: dict):
+        table = self._tables[-1]
+        if table['row'] is None:
+            table['row'] = []
+        self._close_cell()
+        span = attrs.get('colspan') or '1'
+        table['cell'] = {'span': int(span) if span.isdigit() else 1, 'header': tag == 'th'}
+        self._blocks.append({})
+        self._outputs.append([])
+        if tag == 'th':
+            self._formats['b'] = self._formats.get('b', 0) + 1
+
+    def _close_cell(self):
+        table = self._tables[-1]
+        cell = table['cell']
+        if cell is None:
+            return
+        self._flush_paragraph()
+        content = ''.join(self._outputs.pop()) or '<w:p/>'
+        self._blocks.pop()
+        if cell['header']:
+            self._formats['b'] -= 1
+        properties = '<w:tcW w:w="0" w:type="auto"/>'
+        if cell['span'] > 1:
+            properties += f'<w:gridSpan w:val="{cell["span"]}"/>'
+        table['row'].append((f'<w:tc><w:tcPr>{properties}</w:tcPr>{content}</w:tc>', cell['span']))
+        table['cell'] = None
+
+    def _close_row(self):
+        table = self._tables[-1]
+        self._close_cell()
+        if table['row']:
+            table['rows'].append(table['row'])
+        table['row'] = None
+
+    def _close_table(self):
+        self._close_row()
+        table = self._tables.pop()
+        if not table['rows']:
+            return
+        columns = max(sum(span for _, span in row) for row in table['rows'])
+        width = TEXT_WIDTH // columns
+        parts = [
+            '<w:tbl><w:tblPr><w:tblStyle w:val="TableGrid"/><w:tblW w:w="5000" w:type="pct"/></w:tblPr>',
+            '<w:tblGrid>', f'<w:gridCol w:w="{width}"/>' * columns, '</w:tblGrid>'
+        ]
+        for row in table['rows']:
+            parts.append('<w:tr>')
+            parts.extend(xml for xml, _ in row)
+            # 补齐缺少的单元格，保证每行列数一致
+            missing = columns - sum(span for _, span in row)
+            parts.append('<w:tc><w:tcPr><w:tcW w:w="0" w:type="auto"/></w:tcPr><w:p/></w:tc>' * missing)
+            parts.append('</w:tr>')
+        parts.append('</w:tbl>')
+        self._write(''.join(parts))
+        # 相邻表格之间需要段落分隔，否则 Word 会合并
+        self._write('<w:p/>')
+
+    # 图片
+
+    def _add_image(self, attrs: dict):
+        src = (attrs.get('src') or '').strip()
+        data = decode_data_uri(src)
+        if data is None and src and self.image_loader:
+            data = self.image_loader(src)
+        info = image_info(data) if data else None
+        if info is None and data:
+            data = convert_to_png(data)
+            info = image_info(data) if data else None
+        if info is None:
+            if attrs.get('alt'):
+                self._add_text(f"[{attrs['alt']}]")
+            return
+
+        extension, pixel_width, pixel_height = info
+        width = _length_attr(attrs.get('width')) or _css_length(attrs.get('style'), 'width')
+        height = _length_attr(attrs.get('height')) or _css_length(attrs.get('style'), 'height')
+        if width and not height and pixel_width:
+            height = width * pixel_height / pixel_width
+        elif height and not width and pixel_height:
+            width = height * pixel_width / pixel_height
+        width, height = width or pixel_width or DEFAULT_IMAGE_SIZE[0], height or pixel_height or DEFAULT_IMAGE_SIZE[1]
+        cx, cy = int(width * EMU_PER_PIXEL), int(height * EMU_PER_PIXEL)
+        max_cx = TEXT_WIDTH * EMU_PER_TWIP
+        if cx > max_cx:
+            cx, cy = max_cx, int(cy * max_cx / cx)
+
+        # 同一图片只嵌入一次
+        if src not in self.image_ids:
+            number = len(self.images) + 1
+            self.images.append((f'rIdImage{number}', f'image{number}.{extension}', data))
+            self.image_ids[src] = number
+        number = self.image_ids[src]
+        self._drawings += 1
+        drawing_id = self._drawings
+        name = quoteattr(attrs.get('alt') or f'image{number}')
+        self._runs().append(
+            f'<w:r><w:drawing><wp:inline distT="0" distB="0" distL="0" distR="0">'
+            f'<wp:extent cx="{cx}" cy="{cy}"/><wp:docPr id="{drawing_id}" name={name}/>'
+            f'<wp:cNvGraphicFramePr><a:graphicFrameLocks noChangeAspect="1"/></wp:cNvGraphicFramePr>'
+            f'<a:graphic><a:graphicData uri="http://schemas.openxmlformats.org/drawingml/2006/picture">'
+            f'<pic:pic><pic:nvPicPr><pic:cNvPr id="{number}" name="image{number}.{extension}"/><pic:cNvPicPr/></pic:nvPicPr>'
+            f'<pic:blipFill><a:blip r:embed="rIdImage{number}"/><a:stretch><a:fillRect/></a:stretch></pic:blipFill>'
+            f'<pic:spPr><a:xfrm><a:off x="0" y="0"/><a:ext cx="{cx}" cy="{cy}"/></a:xfrm>'
+            f'<a:prstGeom prst="rect"><a:avLst/></a:prstGeom></pic:spPr></pic:pic>'
+            f'</a:graphicData></a:graphic></wp:inline></w:drawing></w:r>'
+        )
+
+    # HTMLParser 回调
+
+    def handle_starttag(self, tag, attrs):
+        if tag in SKIP_TAGS:
+            self._skip += 1
+            return
+        if self._skip:
+            return
+        attrs = {name: value or '' for name, value in attrs}
+        if tag in BLOCK_TAGS:
+            self._open_block(tag, attrs)
+        elif tag in INLINE_FORMATS:
+            name = INLINE_FORMATS[tag]
+            self._formats[name] = self._formats.get(name, 0) + 1
+        elif tag in ('ul', 'ol'):
+            self._open_list(tag, attrs)
+        elif tag == 'table':
+            self._open_table()
+        elif tag == 'tr' and self._tables:
+            self._open_row()
+        elif tag in ('td', 'th') and self._tables:
+            self._open_cell(tag, attrs)
+        elif tag == 'br':
+            self._runs().append('<w:r><w:br/></w:r>')
+        elif tag == 'hr':
+            self._flush_paragraph()
+            self._write('<w:p><w:pPr><w:pBdr><w:bottom w:val="single" w:sz="6" w:space="1" w:color="auto"/></w:pBdr></w:pPr></w:p>')
+        elif tag == 'img':
+            self._add_image(attrs)
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs)
+        if tag not in ('br', 'hr', 'img'):
+            self.handle_endtag(tag)
+
+    def handle_endtag(self, tag):
+        if tag in SKIP_TAGS:
+            self._skip = max(self._skip - 1, 0)
+            return
+        if self._skip:
+            return
+        if tag in BLOCK_TAGS:
+            self._close_block(tag)
+        elif tag in INLINE_FORMATS:
+            name = INLINE_FORMATS[tag]
+            self._formats[name] = max(self._formats.get(name, 0) - 1, 0)
+        elif tag in ('ul', 'ol'):
+            self._flush_paragraph()
+            if self._lists:
+                self._lists.pop()
+        elif tag == 'table' and self._tables:
+            self._close_table()
+        elif tag == 'tr' and self._tables:
+            self._close_row()
+        elif tag in ('td', 'th') and self._tables:
+            self._close_cell()
+
+    def handle_data(self, data):
+        if self._skip:
+            return
+        if self._pre:
+            lines = data.split('\n')
+            for index, line in enumerate(lines):
+                if index:
+                    self._runs().append('<w:r><w:br/></w:r>')
+                self._add_text(line)
+            return
+        text = WHITESPACE.sub(' ', data)
+        if self._paragraph is None or not self._paragraph[1]:
+            text = text.lstrip(' ')
+        self._add_text(text)
+
+    def close(self):
+        super().close()
+        while self._tables:
+            self._close_table()
+        self._flush_paragraph()
+
+
+class _StreamSink:
+    """供 zipfile 写入的不可寻址输出，写入的数据由 drain 取走"""
+
+    def __init__(self):
+        self.chunks = []
+        self.size = 0
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.size += len(data)
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self) -> bytes:
+        data = b''.join(self.chunks)
+        self.chunks.clear()
+        self.size = 0
+        return data
+
+
+def styles_xml() -> str:
+    headings = ''.join(
+        f'<w:style w:type="paragraph" w:styleId="Heading{level}"><w:name w:val="heading {level}"/>'
+        f'<w:basedOn w:val="Normal"/><w:next w:val="Normal"/><w:qFormat/>'
+        f'<w:pPr><w:keepNext/><w:spacing w:before="{360 - level * 40}" w:after="120"/><w:outlineLvl w:val="{level - 1}"/></w:pPr>'
+        f'<w:rPr><w:b/><w:sz w:val="{36 - level * 4}"/></w:rPr></w:style>'
+        for level in range(1, 7)
+    )
+    return (
+        f'{XML_HEADER}<w:styles xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main">'
+        '<w:docDefaults><w:rPrDefault><w:rPr>'
+        '<w:rFonts w:ascii="Times New Roman" w:hAnsi="Times New Roman" w:eastAsia="宋体"/>'
+        '<w:sz w:val="24"/><w:lang w:eastAsia="zh-CN"/></w:rPr></w:rPrDefault>'
+        '<w:pPrDefault><w:pPr><w:spacing w:after="120" w:line="360" w:lineRule="auto"/></w:pPr></w:pPrDefault>'
+        '</w:docDefaults>'
+        '<w:style w:type="paragraph" w:default="1" w:styleId="Normal"><w:name w:val="Normal"/><w:qFormat/></w:style>'
+        '<w:style w:type="paragraph" w:styleId="Title"><w:name w:val="Title"/><w:basedOn w:val="Normal"/>'
+        '<w:next w:val="Normal"/><w:qFormat/><w:pPr><w:jc w:val="center"/><w:spacing w:after="360"/></w:pPr>'
+        '<w:rPr><w:b/><w:sz w:val="44"/></w:rPr></w:style>'
+        f'{headings}'
+        '<w:style w:type="paragraph" w:styleId="Quote"><w:name w:val="Quote"/><w:basedOn w:val="Normal"/>'
+        '<w:pPr><w:ind w:left="720"/></w:pPr><w:rPr><w:i/><w:color w:val="595959"/></w:rPr></w:style>'
+        '<w:style w:type="paragraph" w:styleId="Code"><w:name w:val="HTML Preformatted"/><w:basedOn w:val="Normal"/>'
+        '<w:pPr><w:spacing w:after="0" w:line="240" w:lineRule="auto"/></w:pPr>'
+        '<w:rPr><w:rFonts w:ascii="Consolas" w:hAnsi="Consolas"/><w:sz w:val="20"/></w:rPr></w:style>'
+        '<w:style w:type="table" w:default="1" w:styleId="TableNormal"><w:name w:val="Normal Table"/>'
+        '<w:tblPr><w:tblInd w:w="0" w:type="dxa"/><w:tblCellMar><w:left w:w="108" w:type="dxa"/>'
+        '<w:right w:w="108" w:type="dxa"/></w:tblCellMar></w:tblPr></w:style>'
+        '<w:style w:type="table" w:styleId="TableGrid"><w:name w:val="Table Grid"/><w:basedOn w:val="TableNormal"/>'
+        '<w:tblPr><w:tblBorders>'
+        + ''.join(f'<w:{side} w:val="single" w:sz="4" w:space="0" w:color="auto"/>'
+                  for side in ('top', 'left', 'bottom', 'right', 'insideH', 'insideV'))
+        + '</w:tblBorders></w:tblPr></w:style>'
+        '</w:styles>'
+    )
+
+
+def numbering_xml(ordered_lists: list) -> str:
+    def level_xml(level, fmt, text):
+        indent = 420 * (level + 1)
+        return (f'<w:lvl w:ilvl="{level}"><w:start w:val="1"/><w:numFmt w:val="{fmt}"/>'
+                f'<w:lvlText w:val="{text}"/><w:lvlJc w:val="left"/>'
+                f'<w:pPr><w:ind w:left="{indent}" w:hanging="420"/></w:pPr></w:lvl>')
+
+    bullets = ''.join(level_xml(level, 'bullet', BULLETS[level % len(BULLETS)]) for level in range(9))
+    decimals = ''.join(level_xml(level, 'decimal', f'%{level + 1}.') for level in range(9))
+    parts = [
+        f'{XML_HEADER}<w:numbering xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main">',
+        f'<w:abstractNum w:abstractNumId="0"><w:multiLevelType w:val="hybridMultilevel"/>{bullets}</w:abstractNum>',
+        f'<w:abstractNum w:abstractNumId="1"><w:multiLevelType w:val="hybridMultilevel"/>{decimals}</w:abstractNum>',
+        '<w:num w:numId="1"><w:abstractNumId w:val="0"/></w:num>'
+    ]
+    for num_id, level, start in ordered_lists:
+        parts.append(f'<w:num w:numId="{num_id}"><w:abstractNumId w:val="1"/>'
+                     f'<w:lvlOverride w:ilvl="{level}"><w:startOverride w:val="{start}"/></w:lvlOverride></w:num>')
+    parts.append('</w:numbering>')
+    return ''.join(parts)
+
+
+def content_types_xml() -> str:
+    defaults = ''.join(f'<Default Extension="{extension}" ContentType="{content_type}"/>'
+                       for extension, content_type in IMAGE_TYPES.items())
+    overrides = {
+        '/word/document.xml': 'application/vnd.openxmlformats-officedocument.wordprocessingml.document.main+xml',
+        '/word/styles.xml': 'application/vnd.openxmlformats-officedocument.wordprocessingml.styles+xml',
+        '/word/numbering.xml': 'application/vnd.openxmlformats-officedocument.wordprocessingml.numbering+xml',
+        '/docProps/core.xml': 'application/vnd.openxmlformats-package.core-properties+xml'
+    }
+    return (
+        f'{XML_HEADER}<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        f'{defaults}'
+        + ''.join(f'<Override PartName="{part}" ContentType="{content_type}"/>' for part, content_type in overrides.items())
+        + '</Types>'
+    )
+
+
+def package_rels_xml() -> str:
+    return (
+        f'{XML_HEADER}<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        f'<Relationship Id="rId1" Type="{REL_NS}/officeDocument" Target="word/document.xml"/>'
+        '<Relationship Id="rId2" Type="http://schemas.openxmlformats.org/package/2006/relationships/metadata/core-properties" '
+        'Target="docProps/core.xml"/>'
+        '</Relationships>'
+    )
+
+
+def core_xml(title: str) -> str:
+    return (
+        f'{XML_HEADER}<cp:coreProperties '
+        'xmlns:cp="http://schemas.openxmlformats.org/package/2006/metadata/core-properties" '
+        'xmlns:dc="http://purl.org/dc/elements/1.1/">'
+        f'<dc:title>{xml_text(title or "")}</dc:title></cp:coreProperties>'
+    )
+
+
+def document_rels_xml(images: list) -> str:
+    parts = [
+        f'{XML_HEADER}<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">',
+        f'<Relationship Id="rIdStyles" Type="{REL_NS}/styles" Target="styles.xml"/>',
+        f'<Relationship Id="rIdNumbering" Type="{REL_NS}/numbering" Target="numbering.xml"/>'
+    ]
+    for rel_id, filename, _ in images:
+        parts.append(f'<Relationship Id="{rel_id}" Type="{REL_NS}/image" Target="media/{filename}"/>')
+    parts.append('</Relationships>')
+    return ''.join(parts)
+
+
+def iter_docx_export(html: str, title: str = None, image_loader=None):
+    """逐段产出 DOCX 文件字节：HTML 分片送入解析器，document.xml 边生成边压缩输出
+
+    image_loader(src) 用于读取非 data URI 的图片，返回字节或 None（图片以替代文字代替）。
+    """
+    sink = _StreamSink()
+    with zipfile.ZipFile(sink, 'w', zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr('[Content_Types].xml', content_types_xml())
+        archive.writestr('_rels/.rels', package_rels_xml())
+        archive.writestr('docProps/core.xml', core_xml(title))
+        archive.writestr('word/styles.xml', styles_xml())
+
+        with archive.open('word/document.xml', 'w') as part:
+            pending = []
+            pending_size = 0
+
+            def emit(xml: str):
+                nonlocal pending_size
+                pending.append(xml)
+                pending_size += len(xml)
+                if pending_size >= FLUSH_BYTES:
+                    part.write(''.join(pending).encode('utf-8'))
+                    pending.clear()
+                    pending_size = 0
+
+            emit(f'{XML_HEADER}<w:document {NAMESPACES}><w:body>')
+            if title:
+                emit(f'<w:p><w:pPr><w:pStyle w:val="Title"/></w:pPr><w:r><w:t>{xml_text(title)}</w:t></w:r></w:p>')
+            writer = DocxWriter(emit, image_loader)
+            for start in range(0, len(html or ''), FEED_CHARS):
+                writer.feed(html[start:start + FEED_CHARS])
+                if sink.size:
+                    yield sink.drain()
+            writer.close()
+            emit(f'<w:sectPr><w:pgSz w:w="{PAGE_WIDTH}" w:h="{PAGE_HEIGHT}"/>'
+                 f'<w:pgMar w:top="{PAGE_MARGIN}" w:right="{PAGE_MARGIN}" w:bottom="{PAGE_MARGIN}" w:left="{PAGE_MARGIN}" '
+                 f'w:header="851" w:footer="992" w:gutter="0"/></w:sectPr></w:body></w:document>')
+            part.write(''.join(pending).encode('utf-8'))
+
+        archive.writestr('word/numbering.xml', numbering_xml(writer.ordered_lists))
+        archive.writestr('word/_rels/document.xml.rels', document_rels_xml(writer.images))
+        for _, filename, data in writer.images:
+            yield sink.drain()
+            archive.writestr(f'word/media/{filename}', data, compress_type=zipfile.ZIP_STORED)
+    yield sink.drain()
@@ -0,0 +1,145 @@
+import re
+import zipfile
+import xml.etree.ElementTree as ET
+
+W_NS = 'http://schemas.openxmlformats.org/wordprocessingml/2006/main'
+W = f'{{{W_NS}}}'
+
+HEADING_STYLE_PATTERN = re.compile(r'^(heading|标题)\s*(\d)$', re.IGNORECASE)
+
+
+def _attr(element, name: str):
+    return element.get(f'{W}{name}') if element is not None else None
+
+
+def load_styles(archive: zipfile.ZipFile) -> dict:
+    """读取样式表，返回 styleId -> ('heading' | 'list', 级别)，普通样式不包含在内"""
+    try:
+        data = archive.read('word/styles.xml')
+    except KeyError:
+        return {}
+    styles = {}
+    for style in ET.fromstring(data).iter(f'{W}style'):
+        style_id = _attr(style, 'styleId')
+        name = _attr(style.find(f'{W}name'), 'val') or ''
+        match = HEADING_STYLE_PATTERN.match(name.strip())
+        if match:
+            styles[style_id] = ('heading', int(match.group(2)))
+            continue
+        outline = _attr(style.find(f'{W}pPr/{W}outlineLvl'), 'val') or ''
+        if outline.isdigit() and int(outline) < 9:
+            styles[style_id] = ('heading', int(outline) + 1)
+            continue
+        numbering = style.find(f'{W}pPr/{W}numPr')
+        if numbering is not None:
+            level = _attr(numbering.find(f'{W}ilvl'), 'val') or '0'
+            styles[style_id] = ('list', int(level) if level.isdigit() else 0)
+    return styles
+
+
+def paragraph_text(paragraph) -> str:
+    """拼接段落中的文本，保留制表符与换行"""
+    parts = []
+    for node in paragraph.iter():
+        if node.tag == f'{W}t' and node.text:
+            parts.append(node.text)
+        elif node.tag == f'{W}tab':
+            parts.append('\t')
+        elif node.tag in (f'{W}br', f'{W}cr'):
+            parts.append('\n')
+    return ''.join(parts)
+
+
+def paragraph_block(paragraph, styles: dict):
+    """把段落转换为结构化块，空段落返回 None"""
+    text = paragraph_text(paragraph).strip()
+    if not text:
+        return None
+    properties = paragraph.find(f'{W}pPr')
+    if properties is None:
+        return {'type': 'paragraph', 'text': text}
+
+    # 先判断标题：招标文件常用“标题 1”加多级编号，带编号的标题仍是章节结构
+    outline = _attr(properties.find(f'{W}outlineLvl'), 'val') or ''
+    if outline.isdigit() and int(outline) < 9:
+        return {'type': 'heading', 'level': int(outline) + 1, 'text': text}
+    style = styles.get(_attr(properties.find(f'{W}pStyle'), 'val'))
+    if style and style[0] == 'heading':
+        return {'type': 'heading', 'level': style[1], 'text': text}
+
+    numbering = properties.find(f'{W}numPr')
+    if numbering is not None:
+        level = _attr(numbering.find(f'{W}ilvl'), 'val') or '0'
+        return {'type': 'list_item', 'level': int(level) if level.isdigit() else 0, 'text': text}
+    if style and style[0] == 'list':
+        return {'type': 'list_item', 'level': style[1], 'text': text}
+    return {'type': 'paragraph', 'text': text}
+
+
+def table_block(table) -> dict:
+    """把表格转换为行列文本，单元格内的多个段落以空格连接"""
+    rows = []
+    for row in table.findall(f'{W}tr'):
+        cells = []
+        for cell in row.findall(f'{W}tc'):
+            texts = [paragraph_text(p).strip() for p in cell.iter(f'{W}p')]
+            cells.append(' '.join(text for text in texts if text))
+        if any(cells):
+            rows.append(cells)
+    return {'type': 'table', 'rows': rows}
+
+
+def iter_docx_blocks(filepath: str):
+    """增量解析 word/document.xml，按文档顺序产出标题、段落、列表项和表格块"""
+    with zipfile.ZipFile(filepath) as archive:
+        styles = load_styles(archive)
+        with archive.open('word/document.xml') as stream:
+            depth = 0
+            body = None
+            for event, element in ET.iterparse(stream, events=('start', 'end')):
+                if event == 'start':
+                    depth += 1
+                    if element.tag == f'{W}body':
+                        body = element
+                    continue
+
+                depth -= 1
+                # 只处理 body 的直接子元素，处理完立即释放
+                if body is None or depth != 2:
+                    continue
+                yield from _element_blocks(element, styles)
+                element.clear()
+                body.remove(element)
+
+
+def _element_blocks(element, styles: dict):
+    if element.tag == f'{W}p':
+        block = paragraph_block(element, styles)
+        if block:
+            yield block
+    elif element.tag == f'{W}tbl':
+        block = table_block(element)
+        if block['rows']:
+            yield block
+    elif element.tag == f'{W}sdt':
+        # 内容控件（如目录）中的段落和表格
+        content = element.find(f'{W}sdtContent')
+        for child in list(content) if content is not None else []:
+            yield from _element_blocks(child, styles)
+
+
+def blocks_to_text(blocks) -> str:
+    """把结构化块渲染为 Markdown 风格的文本，标题、列表和表格结构得以保留"""
+    lines = []
+    for block in blocks:
+        if block['type'] == 'heading':
+            lines.append(f"{'#' * min(block['level'], 6)} {block['text']}")
+        elif block['type'] == 'list_item':
+            lines.append(f"{'  ' * block['level']}- {block['text']}")
+        elif block['type'] == 'table':
+            for row in block['rows']:
+                cells = [cell.replace('\n', ' ').replace('|', '\\|') for cell in row]
+                lines.append(f"| {' | '.join(cells)} |")
+        else:
+            lines.append(block['text'])
+    return '\n'.join(lines)
@@ -0,0 +1,211 @@
+"""图片库：上传的图片按内容哈希保存，SQLite 记录名称、分类与尺寸，缩略图按需生成并缓存在磁盘上"""
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+from docx_export import image_info
+
+try:
+    from PIL import Image, ImageOps, features  # 可选依赖，未安装时缩略图接口返回原图
+except ImportError:
+    Image = None
+
+# 允许的缩略图宽度，请求的宽度向上取到最近的一档，避免缓存无限增长
+THUMBNAIL_WIDTHS = (160, 320, 640, 1280)
+# 识别图片格式与尺寸时读取的文件头长度（JPEG 的尺寸段可能在 EXIF 之后）
+HEADER_BYTES = 256 * 1024
+READ_BLOCK_SIZE = 1024 * 1024
+
+MIME_TYPES = {
+    'png': 'image/png',
+    'jpeg': 'image/jpeg',
+    'gif': 'image/gif',
+    'bmp': 'image/bmp',
+    'webp': 'image/webp'
+}
+
+
+class ImageError(Exception):
+    """上传的文件不是支持的图片"""
+
+
+def detect_image(header: bytes):
+    """识别图片格式与像素尺寸，返回 (格式, 宽, 高)，不支持的格式返回 None"""
+    if header[:4] == b'RIFF' and header[8:12] == b'WEBP':
+        chunk = header[12:16]
+        if chunk == b'VP8 ' and len(header) >= 30:
+            return 'webp', int.from_bytes(header[26:28], 'little') & 0x3FFF, int.from_bytes(header[28:30], 'little') & 0x3FFF
+        if chunk == b'VP8L' and len(header) >= 25:
+            bits = int.from_bytes(header[21:25], 'little')
+            return 'webp', (bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1
+        if chunk == b'VP8X' and len(header) >= 30:
+            return 'webp', int.from_bytes(header[24:27], 'little') + 1, int.from_bytes(header[27:30], 'little') + 1
+        return 'webp', 0, 0
+    return image_info(header)
+
+
+def webp_supported() -> bool:
+    return Image is not None and features.check('webp')
+
+
+class ImageLibrary:
+    """图片库
+
+    原图按 SHA-256 存放在 originals/ 下，相同图片只保存一份；缩略图按 (图片, 宽度, 格式)
+    缓存在 thumbnails/ 下，首次请求时生成。图片ID取自内容哈希，供 <img> 直接引用。
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self._local = threading.local()
+        self._locks = {}
+        self._locks_lock = threading.Lock()
+        os.makedirs(os.path.join(directory, 'originals'), exist_ok=True)
+        os.makedirs(os.path.join(directory, 'thumbnails'), exist_ok=True)
+        with self._connection() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS images (
+                    id TEXT PRIMARY KEY,
+                    name TEXT NOT NULL,
+                    category TEXT NOT NULL,
+                    format TEXT NOT NULL,
+                    width INTEGER NOT NULL,
+                    height INTEGER NOT NULL,
+                    size INTEGER NOT NULL,
+                    owner TEXT NOT NULL,
+                    created REAL NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_images_created ON images (created DESC)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_images_category ON images (category, created DESC)")
+
+    def _connection(self) -> sqlite3.Connection:
+        """每个线程使用独立的连接"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(os.path.join(self.directory, 'images.db'), timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def original_path(self, image: dict) -> str:
+        return os.path.join(self.directory, 'originals', image['id'][:2], f"{image['id']}.{image['format']}")
+
+    def add(self, stream, filename: str, category: str, owner: str) -> dict:
+        """保存上传的图片（边写盘边计算哈希），返回图片信息；相同内容的图片返回已有记录"""
+        tmp_path = os.path.join(self.directory, 'originals', f'{uuid.uuid4().hex}.tmp')
+        digest = hashlib.sha256()
+        header = b''
+        size = 0
+        try:
+            with open(tmp_path, 'wb') as f:
+                for block in iter(lambda: stream.read(READ_BLOCK_SIZE), b''):
+                    if len(header) < HEADER_BYTES:
+                        header += block[:HEADER_BYTES - len(header)]
+                    digest.update(block)
+                    f.write(block)
+                    size += len(block)
+            info = detect_image(header)
+            if info is None:
+                raise ImageError('仅支持 PNG、JPEG、GIF、BMP、WebP 图片')
+
+            image_id = digest.hexdigest()[:32]
+            existing = self.get(image_id)
+            if existing is not None:
+                return existing
+            image = {
+                'id': image_id,
+                'name': os.path.splitext(filename or '')[0][:200] or image_id,
+                'category': (category or '未分类').strip()[:50] or '未分类',
+                'format': info[0],
+                'width': info[1],
+                'height': info[2],
+                'size': size,
+                'owner': owner,
+                'created': time.time()
+            }
+            path = self.original_path(image)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+        self._connection().execute(
+            "INSERT OR IGNORE INTO images (id, name, category, format, width, height, size, owner, created)"
+            " VALUES (:id, :name, :category, :format, :width, :height, :size, :owner, :created)",
+            image
+        )
+        return self.get(image_id)
+
+    def get(self, image_id: str):
+        row = self._connection().execute("SELECT * FROM images WHERE id = ?", (image_id,)).fetchone()
+        return dict(row) if row else None
+
+    def list(self, page: int = 1, page_size: int = 40, category: str = None, query: str = None) -> dict:
+        """按上传时间倒序分页列出图片，可按分类与名称筛选"""
+        conditions, params = [], []
+        if category:
+            conditions.append("category = ?")
+            params.append(category)
+        if query:
+            conditions.append("name LIKE ? ESCAPE '\\'")
+            params.append('%' + query.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%')
+        where = f" WHERE {' AND '.join(conditions)}" if conditions else ''
+        conn = self._connection()
+        total = conn.execute(f"SELECT COUNT(*) FROM images{where}", params).fetchone()[0]
+        rows = conn.execute(
+            f"SELECT * FROM images{where} ORDER BY created DESC LIMIT ? OFFSET ?",
+            params + [page_size, (page - 1) * page_size]
+        ).fetchall()
+        return {'items': [dict(row) for row in rows], 'total': total, 'page': page, 'page_size': page_size}
+
+    def categories(self) -> list:
+        rows = self._connection().execute(
+            "SELECT category, COUNT(*) AS count FROM images GROUP BY category ORDER BY category"
+        ).fetchall()
+        return [dict(row) for row in rows]
+
+    def thumbnail(self, image: dict, width: int, webp: bool = False):
+        """返回缩略图的 (路径, 格式)；未安装 Pillow、动图或原图不大于目标宽度时返回原图"""
+        width = next((size for size in THUMBNAIL_WIDTHS if size >= width), THUMBNAIL_WIDTHS[-1])
+        original = self.original_path(image)
+        if Image is None or image['format'] == 'gif' or (0 < image['width'] <= width and not webp):
+            return original, image['format']
+
+        if webp and webp_supported():
+            target_format = 'webp'
+        else:
+            target_format = 'png' if image['format'] in ('png', 'gif') else 'jpeg'
+        path = os.path.join(self.directory, 'thumbnails', image['id'][:2], f"{image['id']}_{width}.{target_format}")
+        if os.path.exists(path):
+            return path, target_format
+
+        # 同一缩略图的并发请求只生成一次
+        with self._locks_lock:
+            lock = self._locks.setdefault(path, threading.Lock())
+        with lock:
+            if not os.path.exists(path):
+                self._render_thumbnail(original, path, width, target_format)
+        with self._locks_lock:
+            self._locks.pop(path, None)
+        return path, target_format
+
+    def _render_thumbnail(self, source: str, path: str, width: int, target_format: str):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with Image.open(source) as image:
+            # JPEG 解码时直接按比例缩小，大幅扫描件不必完整解码
+            image.draft('RGB', (width, width))
+            image = ImageOps.exif_transpose(image)
+            image.thumbnail((width, width))
+            if target_format == 'jpeg' and image.mode not in ('RGB', 'L'):
+                image = image.convert('RGB')
+            tmp_path = f'{path}.{threading.get_ident()}.tmp'
+            options = {'quality': 80} if target_format in ('jpeg', 'webp') else {'optimize': True}
+            image.save(tmp_path, format=target_format.upper(), **options)
+        os.replace(tmp_path, path)
@@ -0,0 +1,359 @@
+import asyncio
+import json
+import random
+import threading
+import time
+from collections import deque
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from chunking import estimate_tokens
+from llm_scheduler import LLMScheduler
+from metrics import LLM_REQUEST_SECONDS, LLM_RETRIES, LLM_TOKENS, record_span
+
+try:
+    import aiohttp  # 异步服务模式使用的 HTTP 客户端，可选
+except ImportError:
+    aiohttp = None
+
+# 需要重试的 HTTP 状态码
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+# 未指定 max_tokens 时预扣的输出 token 数，调用结束后按实际用量校正
+DEFAULT_COMPLETION_TOKENS = 1024
+
+
+class LLMError(Exception):
+    """大模型调用失败"""
+
+
+def estimate_cost(data: dict) -> int:
+    """估算一次调用消耗的 token 数（提示词 + 输出上限），用于调度与配额预扣"""
+    prompt = sum(estimate_tokens(message.get('content') or '') for message in data.get('messages') or [])
+    return prompt + int(data.get('max_tokens') or DEFAULT_COMPLETION_TOKENS)
+
+
+class LLMStats:
+    """大模型调用统计：最近调用明细与累计的延迟、token 数"""
+
+    def __init__(self, history_size: int = 1000):
+        self._lock = threading.Lock()
+        self.history = deque(maxlen=history_size)
+        self.totals = {
+            'calls': 0,
+            'errors': 0,
+            'retries': 0,
+            'prompt_tokens': 0,
+            'completion_tokens': 0,
+            'latency_seconds': 0.0
+        }
+
+    def _record(self, model: str, latency: float, usage, error: bool = False):
+        usage = usage or {}
+        entry = {
+            'time': time.time(),
+            'model': model,
+            'latency': latency,
+            'prompt_tokens': usage.get('prompt_tokens', 0),
+            'completion_tokens': usage.get('completion_tokens', 0),
+            'error': error
+        }
+        with self._lock:
+            self.history.append(entry)
+            self.totals['calls'] += 1
+            self.totals['errors'] += int(error)
+            self.totals['prompt_tokens'] += entry['prompt_tokens']
+            self.totals['completion_tokens'] += entry['completion_tokens']
+            self.totals['latency_seconds'] += latency
+        LLM_REQUEST_SECONDS.observe(latency, model=model, outcome='error' if error else 'success')
+        LLM_TOKENS.inc(entry['prompt_tokens'], model=model, kind='prompt')
+        LLM_TOKENS.inc(entry['completion_tokens'], model=model, kind='completion')
+        record_span('llm', latency, error)
+
+    def _record_retry(self):
+        with self._lock:
+            self.totals['retries'] += 1
+        LLM_RETRIES.inc()
+
+    def _backoff_delay(self, attempt: int, retry_after=None) -> float:
+        """指数退避 + 抖动，优先遵循 Retry-After"""
+        if retry_after:
+            try:
+                return min(float(retry_after), self.backoff_max)
+            except ValueError:
+                pass
+        delay = min(self.backoff_max, self.backoff_base * (2 ** attempt))
+        return random.uniform(0, delay)
+
+    def stats(self) -> dict:
+        """调用统计信息"""
+        with self._lock:
+            return dict(self.totals)
+
+
+def _parse_stream_line(line: str):
+    """解析一行 SSE，返回 (增量文本列表, usage)；[DONE] 返回 None"""
+    if not line or not line.startswith('data:'):
+        return [], None
+    payload = line[5:].strip()
+    if payload == '[DONE]':
+        return None
+    chunk = json.loads(payload)
+    deltas = []
+    for choice in chunk.get('choices') or []:
+        delta = (choice.get('delta') or {}).get('content')
+        if delta:
+            deltas.append(delta)
+    return deltas, chunk.get('usage')
+
+
+class LLMClient(LLMStats):
+    """共享的大模型客户端：连接池复用、超时、退避重试、调度（优先级/公平/配额）与调用统计"""
+
+    def __init__(self, api_url: str, api_key: str, model: str = 'deepseek-chat',
+                 max_concurrency: int = 8, connect_timeout: float = 10,
+                 read_timeout: float = 300, max_retries: int = 3,
+                 backoff_base: float = 1.0, backoff_max: float = 30.0,
+                 history_size: int = 1000, scheduler: LLMScheduler = None):
+        super().__init__(history_size)
+        self.api_url = api_url
+        self.api_key = api_key
+        self.model = model
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.scheduler = scheduler or LLMScheduler(max_concurrency)
+
+        # 持久连接池（keep-alive），连接数与并发上限一致
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max(1, max_concurrency))
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.session.headers.update({
+            "Authorization": f"Bearer {api_key}",
+            "Content-Type": "application/json"
+        })
+
+    def chat(self, messages: list, temperature: float = 0.3, **kwargs) -> str:
+        """发送对话请求并返回模型输出文本"""
+        response_json = self.complete(messages, temperature=temperature, **kwargs)
+        return response_json['choices'][0]['message']['content']
+
+    def complete(self, messages: list, temperature: float = 0.3, **kwargs) -> dict:
+        """发送对话请求并返回完整的响应 JSON"""
+        data = {
+            "model": kwargs.pop('model', self.model),
+            "messages": messages,
+            "temperature": temperature
+        }
+        data.update(kwargs)
+
+        with self.scheduler.slot(estimate_cost(data)) as ticket:
+            start = time.perf_counter()
+            try:
+                response_json = self._post_with_retry(data).json()
+            except Exception:
+                self._record(data['model'], time.perf_counter() - start, None, error=True)
+                raise
+            self._record(data['model'], time.perf_counter() - start, response_json.get('usage'))
+            ticket.used_tokens = (response_json.get('usage') or {}).get('total_tokens')
+            return response_json
+
+    def stream_chat(self, messages: list, temperature: float = 0.3, **kwargs):
+        """流式对话请求，逐段产出模型输出的增量文本"""
+        data = {
+            "model": kwargs.pop('model', self.model),
+            "messages": messages,
+            "temperature": temperature,
+            "stream": True,
+            "stream_options": {"include_usage": True}
+        }
+        data.update(kwargs)
+
+        with self.scheduler.slot(estimate_cost(data)) as ticket:
+            start = time.perf_counter()
+            usage = None
+            error = True
+            try:
+                # 只在收到首字节前重试，开始输出后出错直接抛出
+                response = self._post_with_retry(data, stream=True)
+                response.encoding = 'utf-8'
+                with response:
+                    for line in response.iter_lines(decode_unicode=True):
+                        parsed = _parse_stream_line(line)
+                        if parsed is None:
+                            break
+                        deltas, chunk_usage = parsed
+                        usage = chunk_usage or usage
+                        yield from deltas
+                error = False
+            finally:
+                self._record(data['model'], time.perf_counter() - start, usage, error=error)
+                ticket.used_tokens = (usage or {}).get('total_tokens')
+
+    def _post_with_retry(self, data: dict, stream: bool = False) -> requests.Response:
+        last_error = None
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                # 首次请求的配额已在调度时扣除，重试另行预约
+                self._record_retry()
+                delay = self.scheduler.limits.reserve_request()
+                if delay:
+                    time.sleep(delay)
+            try:
+                response = self.session.post(self.api_url, json=data, timeout=self.timeout, stream=stream)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                last_error = e
+                self._sleep_backoff(attempt)
+                continue
+
+            if response.status_code in RETRY_STATUS_CODES:
+                last_error = LLMError(f"API 返回状态码 {response.status_code}")
+                response.close()
+                self._sleep_backoff(attempt, response.headers.get('Retry-After'))
+                continue
+
+            response.raise_for_status()
+            return response
+
+        raise LLMError(f"大模型调用失败（已重试 {self.max_retries} 次）: {last_error}")
+
+    def _sleep_backoff(self, attempt: int, retry_after=None):
+        if attempt < self.max_retries:
+            time.sleep(self._backoff_delay(attempt, retry_after))
+
+
+class AsyncLLMClient(LLMStats):
+    """异步大模型客户端（aiohttp），供 ASGI 服务模式使用，行为与 LLMClient 一致"""
+
+    def __init__(self, api_url: str, api_key: str, model: str = 'deepseek-chat',
+                 max_concurrency: int = 256, connect_timeout: float = 10,
+                 read_timeout: float = 300, max_retries: int = 3,
+                 backoff_base: float = 1.0, backoff_max: float = 30.0,
+                 history_size: int = 1000, scheduler: LLMScheduler = None):
+        if aiohttp is None:
+            raise RuntimeError('异步服务模式需要安装 aiohttp')
+        super().__init__(history_size)
+        self.api_url = api_url
+        self.api_key = api_key
+        self.model = model
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.max_concurrency = max(1, max_concurrency)
+        self.scheduler = scheduler or LLMScheduler(self.max_concurrency)
+        self._session = None
+
+    def _ensure_session(self):
+        # aiohttp 会话需在事件循环中创建，首次调用时初始化
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.max_concurrency),
+                timeout=aiohttp.ClientTimeout(sock_connect=self.connect_timeout, sock_read=self.read_timeout),
+                headers={
+                    "Authorization": f"Bearer {self.api_key}",
+                    "Content-Type": "application/json"
+                }
+            )
+        return self._session
+
+    async def chat(self, messages: list, temperature: float = 0.3, **kwargs) -> str:
+        """发送对话请求并返回模型输出文本"""
+        response_json = await self.complete(messages, temperature=temperature, **kwargs)
+        return response_json['choices'][0]['message']['content']
+
+    async def complete(self, messages: list, temperature: float = 0.3, **kwargs) -> dict:
+        """发送对话请求并返回完整的响应 JSON"""
+        data = {
+            "model": kwargs.pop('model', self.model),
+            "messages": messages,
+            "temperature": temperature
+        }
+        data.update(kwargs)
+
+        self._ensure_session()
+        async with self.scheduler.aslot(estimate_cost(data)) as ticket:
+            start = time.perf_counter()
+            try:
+                response = await self._post_with_retry(data)
+                async with response:
+                    response_json = await response.json(content_type=None)
+            except Exception:
+                self._record(data['model'], time.perf_counter() - start, None, error=True)
+                raise
+            self._record(data['model'], time.perf_counter() - start, response_json.get('usage'))
+            ticket.used_tokens = (response_json.get('usage') or {}).get('total_tokens')
+            return response_json
+
+    async def stream_chat(self, messages: list, temperature: float = 0.3, **kwargs):
+        """流式对话请求，逐段产出模型输出的增量文本"""
+        data = {
+            "model": kwargs.pop('model', self.model),
+            "messages": messages,
+            "temperature": temperature,
+            "stream": True,
+            "stream_options": {"include_usage": True}
+        }
+        data.update(kwargs)
+
+        self._ensure_session()
+        async with self.scheduler.aslot(estimate_cost(data)) as ticket:
+            start = time.perf_counter()
+            usage = None
+            error = True
+            try:
+                # 只在收到首字节前重试，开始输出后出错直接抛出
+                response = await self._post_with_retry(data)
+                async with response:
+                    async for raw_line in response.content:
+                        parsed = _parse_stream_line(raw_line.decode('utf-8').strip())
+                        if parsed is None:
+                            break
+                        deltas, chunk_usage = parsed
+                        usage = chunk_usage or usage
+                        for delta in deltas:
+                            yield delta
+                error = False
+            finally:
+                self._record(data['model'], time.perf_counter() - start, usage, error=error)
+                ticket.used_tokens = (usage or {}).get('total_tokens')
+
+    async def _post_with_retry(self, data: dict):
+        last_error = None
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                # 首次请求的配额已在调度时扣除，重试另行预约
+                self._record_retry()
+                delay = self.scheduler.limits.reserve_request()
+                if delay:
+                    await asyncio.sleep(delay)
+            try:
+                response = await self._session.post(self.api_url, json=data)
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+                last_error = e
+                await self._sleep_backoff(attempt)
+                continue
+
+            if response.status in RETRY_STATUS_CODES:
+                last_error = LLMError(f"API 返回状态码 {response.status}")
+                response.release()
+                await self._sleep_backoff(attempt, response.headers.get('Retry-After'))
+                continue
+
+            if response.status >= 400:
+                response.release()
+                response.raise_for_status()
+            return response
+
+        raise LLMError(f"大模型调用失败（已重试 {self.max_retries} 次）: {last_error}")
+
+    async def _sleep_backoff(self, attempt: int, retry_after=None):
+        if attempt < self.max_retries:
+            await asyncio.sleep(self._backoff_delay(attempt, retry_after))
+
+    async def aclose(self):
+        if self._session is not None:
+            await self._session.close()
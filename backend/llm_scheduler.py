@@ -0,0 +1,310 @@
+"""大模型请求调度：所有模型调用经由调度器获得执行名额
+
+- 优先级：交互请求（编辑器中的 AI 续写/扩写/润色）总是先于批量任务（分析、生成、批量导入）；
+  批量任务最多占用 max_concurrency - interactive_reserved 个名额，留出的名额保证交互请求不必等待批量调用结束
+- 公平：同一优先级内按用户做加权公平排队（start-time fair queueing），一个用户提交大量任务不会饿死其他用户
+- 配额：请求数与 token 数各用一个令牌桶，容量为一分钟的配额，与服务商的 RPM/TPM 限制对应；
+  按估算的 token 数预扣，调用结束后按实际用量校正
+"""
+import asyncio
+import contextvars
+import heapq
+import itertools
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+
+from metrics import QUEUE_WAIT_SECONDS, trace_span
+
+INTERACTIVE = 'interactive'
+BATCH = 'batch'
+PRIORITIES = (INTERACTIVE, BATCH)
+
+DEFAULT_IDENTITY = 'system'
+
+# 调用方的用户与优先级随上下文变量传递，后台任务提交时随上下文一同复制
+_identity = contextvars.ContextVar('llm_identity', default=DEFAULT_IDENTITY)
+_priority = contextvars.ContextVar('llm_priority', default=BATCH)
+
+
+def current_identity() -> str:
+    return _identity.get()
+
+
+def current_priority() -> str:
+    return _priority.get()
+
+
+def set_identity(identity: str):
+    """设置当前上下文的调用用户，返回用于恢复的令牌"""
+    return _identity.set(identity or DEFAULT_IDENTITY)
+
+
+def set_priority(priority: str):
+    """设置当前上下文的优先级，返回用于恢复的令牌"""
+    return _priority.set(priority if priority in PRIORITIES else BATCH)
+
+
+def reset_identity(token):
+    _identity.reset(token)
+
+
+def reset_priority(token):
+    _priority.reset(token)
+
+
+def parse_weights(value: str) -> dict:
+    """解析用户权重配置，格式为 "user1:2,user2:0.5"，格式错误的项忽略"""
+    weights = {}
+    for item in (value or '').split(','):
+        name, _, weight = item.strip().rpartition(':')
+        try:
+            weight = float(weight)
+        except ValueError:
+            continue
+        if name and weight > 0:
+            weights[name] = weight
+    return weights
+
+
+class TokenBucket:
+    """令牌桶：容量为每分钟配额，按配额匀速补充；rate 为 0 表示不限"""
+
+    def __init__(self, per_minute: float):
+        self.capacity = max(0.0, float(per_minute))
+        self.rate = self.capacity / 60.0
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        """令牌足够时返回 0，否则返回需要等待的秒数；超过容量的请求按容量计，避免永远等待"""
+        if not self.rate:
+            return 0.0
+        self._refill(now)
+        amount = min(amount, self.capacity)
+        return 0.0 if self.tokens >= amount else (amount - self.tokens) / self.rate
+
+    def take(self, amount: float):
+        if self.rate:
+            self.tokens -= amount
+
+
+class RateLimits:
+    """与服务商配额对应的请求数/token 数限制，可由多个调度器（同步与异步客户端）共享"""
+
+    def __init__(self, requests_per_minute: float = 0, tokens_per_minute: float = 0):
+        self._lock = threading.Lock()
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+
+    def try_acquire(self, cost: int) -> float:
+        """两个桶都足够时扣除一次请求与 cost 个 token 并返回 0，否则不扣除，返回需要等待的秒数"""
+        with self._lock:
+            now = time.monotonic()
+            wait = max(self.requests.wait_time(1, now), self.tokens.wait_time(cost, now))
+            if not wait:
+                self.requests.take(1)
+                self.tokens.take(cost)
+            return wait
+
+    def reserve_request(self) -> float:
+        """重试时预约一次请求，返回需要等待的秒数（令牌可以透支，后续请求相应顺延）"""
+        with self._lock:
+            now = time.monotonic()
+            wait = self.requests.wait_time(1, now)
+            self.requests.take(1)
+            return wait
+
+    def adjust_tokens(self, delta: int):
+        """按实际用量校正预扣的 token 数，delta 为实际减估算"""
+        with self._lock:
+            self.tokens._refill(time.monotonic())
+            self.tokens.take(delta)
+            self.tokens.tokens = min(self.tokens.tokens, self.tokens.capacity)
+
+    def stats(self) -> dict:
+        with self._lock:
+            now = time.monotonic()
+            for bucket in (self.requests, self.tokens):
+                if bucket.rate:
+                    bucket._refill(now)
+            return {
+                'requests_per_minute': self.requests.capacity,
+                'tokens_per_minute': self.tokens.capacity,
+                'requests_available': round(self.requests.tokens, 1) if self.requests.rate else None,
+                'tokens_available': round(self.tokens.tokens) if self.tokens.rate else None
+            }
+
+
+class Ticket:
+    """一次排队中的模型调用"""
+    __slots__ = ('identity', 'priority', 'cost', 'start', 'enqueued', 'wait', 'wake', 'state', 'used_tokens')
+
+    def __init__(self, identity: str, priority: str, cost: int, start: float, wake):
+        self.identity = identity
+        self.priority = priority
+        self.cost = cost
+        self.start = start
+        self.enqueued = time.perf_counter()
+        self.wait = 0.0
+        self.wake = wake
+        self.state = 'queued'
+        # 调用结束时由客户端填入实际 token 用量
+        self.used_tokens = None
+
+
+def _resolve(future):
+    if not future.done():
+        future.set_result(None)
+
+
+class LLMScheduler:
+    """按优先级、用户公平与配额发放模型调用名额
+
+    同步调用用 slot()，异步调用用 aslot()；两者共用同一套队列，等待方由回调唤醒
+    （threading.Event 或事件循环的 call_soon_threadsafe）。
+    """
+
+    def __init__(self, max_concurrency: int = 8, limits: RateLimits = None,
+                 interactive_reserved: int = 1, weights: dict = None, name: str = 'llm'):
+        self.name = name
+        self.max_concurrency = max(1, max_concurrency)
+        self.limits = limits or RateLimits()
+        # 批量任务可用的名额，至少 1 个
+        self.batch_limit = max(1, self.max_concurrency - max(0, interactive_reserved))
+        self.weights = weights or {}
+        self._lock = threading.Lock()
+        self._sequence = itertools.count()
+        self._queues = {priority: [] for priority in PRIORITIES}
+        self._queued = {priority: 0 for priority in PRIORITIES}
+        self._running = {priority: 0 for priority in PRIORITIES}
+        # 公平排队的虚拟时间与各用户最后一个请求的结束标签
+        self._virtual = {priority: 0.0 for priority in PRIORITIES}
+        self._finish = {priority: {} for priority in PRIORITIES}
+        self._timer = None
+        self._timer_deadline = None
+
+    def _submit(self, cost: int, wake, identity: str = None, priority: str = None) -> Ticket:
+        identity = identity or current_identity()
+        priority = priority if priority in PRIORITIES else current_priority()
+        with self._lock:
+            finish = self._finish[priority]
+            start = max(self._virtual[priority], finish.get(identity, 0.0))
+            finish[identity] = start + max(1, cost) / self.weights.get(identity, 1.0)
+            if len(finish) > 1000:
+                # 结束标签已落后于虚拟时间的用户与新用户等价，可以清理
+                virtual = self._virtual[priority]
+                for name in [name for name, tag in finish.items() if tag <= virtual]:
+                    del finish[name]
+            ticket = Ticket(identity, priority, cost, start, wake)
+            heapq.heappush(self._queues[priority], (start, next(self._sequence), ticket))
+            self._queued[priority] += 1
+            self._dispatch()
+        return ticket
+
+    def _next(self):
+        """下一个可以执行的请求：交互优先，批量任务受名额上限约束"""
+        for priority in PRIORITIES:
+            queue = self._queues[priority]
+            while queue and queue[0][2].state == 'cancelled':
+                heapq.heappop(queue)
+            if not queue:
+                continue
+            if priority == BATCH and self._running[BATCH] >= self.batch_limit:
+                return None
+            return queue[0][2]
+        return None
+
+    def _dispatch(self):
+        """在持有锁时调用：按顺序发放空闲名额，配额不足时定时重试"""
+        while sum(self._running.values()) < self.max_concurrency:
+            ticket = self._next()
+            if ticket is None:
+                return
+            wait = self.limits.try_acquire(ticket.cost)
+            if wait:
+                self._schedule(wait)
+                return
+            heapq.heappop(self._queues[ticket.priority])
+            self._queued[ticket.priority] -= 1
+            self._running[ticket.priority] += 1
+            self._virtual[ticket.priority] = ticket.start
+            ticket.state = 'running'
+            ticket.wait = time.perf_counter() - ticket.enqueued
+            ticket.wake()
+
+    def _schedule(self, wait: float):
+        deadline = time.monotonic() + wait
+        if self._timer is not None and self._timer_deadline <= deadline:
+            return
+        if self._timer is not None:
+            self._timer.cancel()
+        self._timer = threading.Timer(wait, self._on_timer)
+        self._timer.daemon = True
+        self._timer_deadline = deadline
+        self._timer.start()
+
+    def _on_timer(self):
+        with self._lock:
+            self._timer = None
+            self._dispatch()
+
+    def release(self, ticket: Ticket):
+        """调用结束，归还名额并按实际用量校正 token 配额"""
+        with self._lock:
+            if ticket.state == 'queued':
+                # 未获得名额就放弃（超时或取消），留在堆中的条目出队时跳过
+                ticket.state = 'cancelled'
+                self._queued[ticket.priority] -= 1
+                return
+            if ticket.state != 'running':
+                return
+            ticket.state = 'done'
+            self._running[ticket.priority] -= 1
+            if ticket.used_tokens is not None:
+                self.limits.adjust_tokens(ticket.used_tokens - ticket.cost)
+            self._dispatch()
+
+    def _observe(self, ticket: Ticket):
+        queue = f'{self.name}-{ticket.priority}'
+        QUEUE_WAIT_SECONDS.observe(ticket.wait, queue=queue)
+        trace_span(f'queue_wait:{queue}', ticket.wait)
+
+    @contextmanager
+    def slot(self, cost: int, identity: str = None, priority: str = None):
+        """同步获取调用名额，退出时归还"""
+        ready = threading.Event()
+        ticket = self._submit(cost, ready.set, identity, priority)
+        try:
+            ready.wait()
+            self._observe(ticket)
+            yield ticket
+        finally:
+            self.release(ticket)
+
+    @asynccontextmanager
+    async def aslot(self, cost: int, identity: str = None, priority: str = None):
+        """异步获取调用名额，等待期间不占用线程；协程被取消时放弃排队"""
+        loop = asyncio.get_running_loop()
+        ready = loop.create_future()
+        ticket = self._submit(cost, lambda: loop.call_soon_threadsafe(_resolve, ready), identity, priority)
+        try:
+            await ready
+            self._observe(ticket)
+            yield ticket
+        finally:
+            self.release(ticket)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'max_concurrency': self.max_concurrency,
+                'batch_limit': self.batch_limit,
+                'queued': dict(self._queued),
+                'running': dict(self._running),
+                'limits': self.limits.stats()
+            }
@@ -0,0 +1,550 @@
+"""模型输出的 Markdown 转 HTML：按行增量渲染，可直接处理流式输出的增量文本
+
+支持标题、段落、（嵌套）列表、表格、代码块、引用、分隔线，以及加粗、斜体、删除线、行内代码与图片。
+所有文本都经过转义，模型输出中的 HTML 标签按原文显示。整体为线性时间：每行只扫描一次，
+行内强调用分隔符栈匹配，不使用可能回溯的正则。
+
+html_to_markdown 把编辑器中的 HTML 转回 Markdown，作为提示词中的原文。
+"""
+import re
+from html.parser import HTMLParser
+
+HEADING_PATTERN = re.compile(r'(#{1,6})[ \t]+(.*?)[ \t]*#*[ \t]*$')
+LIST_PATTERN = re.compile(r'([ \t]*)(?:([-*+])|(\d{1,9})[.)])[ \t]+(.*)$')
+TABLE_SEPARATOR_PATTERN = re.compile(r'^[ \t]*\|?[ \t]*:?-+:?[ \t]*(?:\|[ \t]*:?-+:?[ \t]*)*\|?[ \t]*$')
+HR_PATTERN = re.compile(r'^[ \t]*(?:(?:-[ \t]*){3,}|(?:\*[ \t]*){3,}|(?:_[ \t]*){3,})$')
+FENCE_PATTERN = re.compile(r'^[ \t]*(`{3,}|~{3,})')
+
+ESCAPES = {'&': '&amp;', '<': '&lt;', '>': '&gt;', '"': '&quot;'}
+ESCAPE_PATTERN = re.compile(r'[&<>"]')
+
+# 行内强调只识别 *、** 与 ~~（删除线）；下划线不作强调，招标文件常用 ____ 表示填空
+INLINE_SPECIAL = re.compile(r'[*~`&<>"!]')
+# 图片 ![说明](地址)：限制长度，未闭合的标记不会向后扫描整行；地址只允许 http(s) 与站内路径
+IMAGE_PATTERN = re.compile(r'!\[([^\]\n]{0,200})\]\(([^()\s]{1,2000})\)')
+SAFE_URL_PATTERN = re.compile(r'^(?:https?://|/(?!/))', re.IGNORECASE)
+
+
+def escape(text: str) -> str:
+    return ESCAPE_PATTERN.sub(lambda match: ESCAPES[match.group()], text)
+
+
+def render_inline(text: str) -> str:
+    """渲染一行中的行内格式，未配对的分隔符按原文输出"""
+    parts = []
+    # 分隔符栈：(标签, 在 parts 中的位置, 原文)
+    stack = []
+    opened = {}
+    # 某长度的反引号在当前位置之后已确认不存在闭合，避免重复向后查找
+    unclosed_ticks = set()
+    length = len(text)
+    position = 0
+    while position < length:
+        match = INLINE_SPECIAL.search(text, position)
+        if match is None:
+            parts.append(text[position:])
+            break
+        start = match.start()
+        if start > position:
+            parts.append(text[position:start])
+        char = text[start]
+        if char in ESCAPES:
+            parts.append(ESCAPES[char])
+            position = start + 1
+            continue
+        if char == '!':
+            image = IMAGE_PATTERN.match(text, start)
+            if image and SAFE_URL_PATTERN.match(image.group(2)):
+                parts.append(f'<img src="{escape(image.group(2))}" alt="{escape(image.group(1))}">')
+                position = image.end()
+            else:
+                parts.append('!')
+                position = start + 1
+            continue
+
+        end = start + 1
+        while end < length and text[end] == char:
+            end += 1
+        run = end - start
+        if char == '`':
+            close = -1 if run in unclosed_ticks else _find_tick_run(text, end, run)
+            if close < 0:
+                unclosed_ticks.add(run)
+                parts.append(text[start:end])
+            else:
+                parts.append(f'<code>{escape(text[end:close].strip())}</code>')
+                end = close + run
+            position = end
+            continue
+
+        before = text[start - 1] if start > 0 else ' '
+        after = text[end] if end < length else ' '
+        can_open = not after.isspace()
+        can_close = not before.isspace()
+        if char == '~':
+            tags = ['del'] if run == 2 else []
+        else:
+            tags = {1: ['em'], 2: ['strong'], 3: ['strong', 'em']}.get(run, [])
+        if not tags:
+            parts.append(text[start:end])
+            position = end
+            continue
+        if can_close and all(opened.get(tag) for tag in tags):
+            # 关闭时先关闭栈顶（后打开）的标签
+            tags.sort(key=lambda tag: -_stack_index(stack, tag))
+            for tag in tags:
+                _close_emphasis(parts, stack, opened, tag)
+        elif can_open:
+            for tag in tags:
+                stack.append((tag, len(parts), '**' if tag == 'strong' else '~~' if tag == 'del' else '*'))
+                opened[tag] = opened.get(tag, 0) + 1
+                parts.append('')
+        else:
+            parts.append(text[start:end])
+        position = end
+
+    # 未闭合的分隔符还原为原文
+    for tag, index, source in stack:
+        parts[index] = source
+    return ''.join(parts)
+
+
+def _find_tick_run(text: str, start: int, run: int) -> int:
+    """查找与开头长度相同的反引号串，返回其起始位置"""
+    ticks = '`' * run
+    position = text.find(ticks, start)
+    while position >= 0:
+        end = position + run
+        if (end >= len(text) or text[end] != '`') and text[position - 1] != '`':
+            return position
+        while end < len(text) and text[end] == '`':
+            end += 1
+        position = text.find(ticks, end)
+    return -1
+
+
+def _stack_index(stack: list, tag: str) -> int:
+    for index in range(len(stack) - 1, -1, -1):
+        if stack[index][0] == tag:
+            return index
+    return -1
+
+
+def _close_emphasis(parts: list, stack: list, opened: dict, tag: str):
+    # 与之交叉的未闭合分隔符还原为原文，保证输出的标签正确嵌套；每个分隔符只出栈一次
+    while stack:
+        top, index, source = stack.pop()
+        opened[top] -= 1
+        if top == tag:
+            parts[index] = f'<{tag}>'
+            parts.append(f'</{tag}>')
+            return
+        parts[index] = source
+
+
+def split_table_row(line: str) -> list:
+    """拆分表格行的单元格，\\| 为单元格内的竖线"""
+    line = line.strip()
+    if line.startswith('|'):
+        line = line[1:]
+    if line.endswith('|') and not line.endswith('\\|'):
+        line = line[:-1]
+    cells = []
+    current = []
+    index = 0
+    while index < len(line):
+        char = line[index]
+        if char == '\\' and index + 1 < len(line) and line[index + 1] == '|':
+            current.append('|')
+            index += 2
+            continue
+        if char == '|':
+            cells.append(''.join(current).strip())
+            current = []
+        else:
+            current.append(char)
+        index += 1
+    cells.append(''.join(current).strip())
+    return cells
+
+
+def is_table_row(line: str) -> bool:
+    return line.lstrip().startswith('|')
+
+
+def _indent_width(indent: str) -> int:
+    return len(indent.expandtabs(4))
+
+
+class MarkdownRenderer:
+    """增量 Markdown 渲染器：feed() 接收任意切分的文本，返回已完成行的 HTML 片段
+
+    各次返回的片段依次拼接即为完整 HTML；列表、表格等块在后续行确定其结束后才闭合。
+    """
+
+    def __init__(self):
+        # 尚未收到换行的半行文本
+        self._partial = []
+        # 打开的列表：[(标签, 缩进)]，每层都有一个打开的 <li>
+        self._lists = []
+        # 表格：None / 'pending'（已收到可能的表头行）/ 'open'
+        self._table = None
+        self._table_header = None
+        self._table_columns = 0
+        self._fence = None
+        self._quote = False
+
+    def feed(self, text: str) -> str:
+        output = []
+        start = 0
+        while True:
+            newline = text.find('\n', start)
+            if newline < 0:
+                break
+            if self._partial:
+                self._partial.append(text[start:newline])
+                line = ''.join(self._partial)
+                self._partial = []
+            else:
+                line = text[start:newline]
+            self._line(line[:-1] if line.endswith('\r') else line, output)
+            start = newline + 1
+        if start < len(text):
+            self._partial.append(text[start:])
+        return ''.join(output)
+
+    def close(self) -> str:
+        """结束输入，渲染最后一行并闭合所有打开的块"""
+        output = []
+        if self._partial:
+            line = ''.join(self._partial)
+            self._partial = []
+            self._line(line[:-1] if line.endswith('\r') else line, output)
+        if self._fence is not None:
+            output.append('</code></pre>')
+            self._fence = None
+        self._close_blocks(output)
+        return ''.join(output)
+
+    def _close_lists(self, output: list, indent: int = -1):
+        while self._lists and self._lists[-1][1] > indent:
+            tag, _ = self._lists.pop()
+            output.append(f'</li></{tag}>')
+
+    def _close_table(self, output: list):
+        if self._table == 'pending':
+            self._table = None
+            self._paragraph(self._table_header, output)
+        elif self._table == 'open':
+            self._table = None
+            output.append('</tbody></table>')
+
+    def _close_blocks(self, output: list):
+        self._close_table(output)
+        self._close_lists(output)
+        if self._quote:
+            output.append('</blockquote>')
+            self._quote = False
+
+    def _paragraph(self, line: str, output: list):
+        if self._lists:
+            # 列表项的后续段落（缩进的续行）仍属于该项
+            output.append(f'<br>{render_inline(line.strip())}')
+        else:
+            output.append(f'<p>{render_inline(line.strip())}</p>')
+
+    def _line(self, line: str, output: list):
+        if self._fence is not None:
+            stripped = line.strip()
+            if stripped.startswith(self._fence) and not stripped.strip(self._fence[0]):
+                output.append('</code></pre>')
+                self._fence = None
+            else:
+                output.append(escape(line) + '\n')
+            return
+
+        if not line.strip():
+            # 空行结束表格与引用；列表在下一个非列表行出现时才结束
+            self._close_table(output)
+            if self._quote:
+                output.append('</blockquote>')
+                self._quote = False
+            return
+
+        if self._table is not None:
+            if self._table == 'pending':
+                header = self._table_header
+                if TABLE_SEPARATOR_PATTERN.match(line):
+                    cells = split_table_row(header)
+                    self._table = 'open'
+                    self._table_columns = len(cells)
+                    output.append('<table><thead><tr>')
+                    output.extend(f'<th>{render_inline(cell)}</th>' for cell in cells)
+                    output.append('</tr></thead><tbody>')
+                    return
+                self._table = None
+                self._paragraph(header, output)
+            elif is_table_row(line):
+                cells = split_table_row(line)
+                # 单元格数与表头对齐
+                cells = (cells + [''] * self._table_columns)[:self._table_columns]
+                output.append('<tr>')
+                output.extend(f'<td>{render_inline(cell)}</td>' for cell in cells)
+                output.append('</tr>')
+                return
+            else:
+                self._close_table(output)
+
+        fence = FENCE_PATTERN.match(line)
+        if fence:
+            self._close_blocks(output)
+            self._fence = fence.group(1)
+            output.append('<pre><code>')
+            return
+
+        if HR_PATTERN.match(line):
+            self._close_blocks(output)
+            output.append('<hr>')
+            return
+
+        heading = HEADING_PATTERN.match(line.lstrip())
+        if heading and _indent_width(line[:len(line) - len(line.lstrip())]) < 4:
+            self._close_blocks(output)
+            level = len(heading.group(1))
+            output.append(f'<h{level}>{render_inline(heading.group(2))}</h{level}>')
+            return
+
+        item = LIST_PATTERN.match(line)
+        if item:
+            self._list_item(item, output)
+            return
+
+        if is_table_row(line):
+            self._close_blocks(output)
+            self._table = 'pending'
+            self._table_header = line
+            return
+
+        stripped = line.lstrip()
+        if stripped.startswith('>'):
+            self._close_table(output)
+            self._close_lists(output)
+            if not self._quote:
+                output.append('<blockquote>')
+                self._quote = True
+            output.append(f'<p>{render_inline(stripped[1:].strip())}</p>')
+            return
+
+        if self._lists and _indent_width(line[:len(line) - len(stripped)]) <= self._lists[0][1]:
+            self._close_lists(output)
+        if self._quote:
+            output.append('</blockquote>')
+            self._quote = False
+        self._paragraph(line, output)
+
+    def _list_item(self, item, output: list):
+        self._close_table(output)
+        if self._quote:
+            output.append('</blockquote>')
+            self._quote = False
+        indent = _indent_width(item.group(1))
+        tag = 'ul' if item.group(2) else 'ol'
+        self._close_lists(output, indent)
+        if self._lists and self._lists[-1][1] == indent:
+            if self._lists[-1][0] == tag:
+                output.append('</li><li>')
+            else:
+                self._close_lists(output, indent - 1)
+                self._open_list(tag, indent, item, output)
+        else:
+            self._open_list(tag, indent, item, output)
+        output.append(render_inline(item.group(4).strip()))
+
+    def _open_list(self, tag: str, indent: int, item, output: list):
+        number = item.group(3)
+        if tag == 'ol' and number and int(number) != 1:
+            output.append(f'<ol start="{int(number)}"><li>')
+        else:
+            output.append(f'<{tag}><li>')
+        self._lists.append((tag, indent))
+
+
+def render_markdown(text: str) -> str:
+    """把完整的 Markdown 文本转换为 HTML"""
+    renderer = MarkdownRenderer()
+    return renderer.feed(text or '') + renderer.close()
+
+
+def iter_markdown_html(deltas):
+    """把模型输出的增量文本转换为 HTML 片段，跳过尚未产生完整行的增量"""
+    renderer = MarkdownRenderer()
+    for delta in deltas:
+        html = renderer.feed(delta)
+        if html:
+            yield html
+    html = renderer.close()
+    if html:
+        yield html
+
+
+# 编辑器 HTML 转 Markdown 时按块处理的标签
+_HEADING_TAGS = {'h1': 1, 'h2': 2, 'h3': 3, 'h4': 4, 'h5': 5, 'h6': 6}
+_BLOCK_TAGS = {'p', 'div', 'blockquote', 'pre', 'table', 'tr', 'ul', 'ol', 'li', 'hr'} | set(_HEADING_TAGS)
+_INLINE_MARKS = {'strong': '**', 'b': '**', 'em': '*', 'i': '*', 's': '~~', 'del': '~~', 'code': '`'}
+
+
+class _MarkdownWriter(HTMLParser):
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.lines = []
+        self.line = []
+        # 打开的列表：['ul' / 'ol', 序号]
+        self.lists = []
+        # 打开的强调标记：[标签, 标记在 self.line 中的位置]
+        self.marks = []
+        self.cells = None
+        # 单元格与列表项内的段落、换行按行内处理，文本写入当前单元格或列表项
+        self.in_cell = False
+        self.items = 0
+        self.quote = False
+        self.pre = False
+        self.skip = 0
+
+    def open_mark(self, tag):
+        self.marks.append([tag, len(self.line)])
+        self.line.append(_INLINE_MARKS[tag])
+
+    def close_mark(self, tag):
+        for position in range(len(self.marks) - 1, -1, -1):
+            if self.marks[position][0] == tag:
+                break
+        else:
+            return
+        # 先闭合嵌套在内的标记
+        while len(self.marks) > position:
+            self._close_last()
+
+    def _close_last(self):
+        tag, index = self.marks.pop()
+        mark = _INLINE_MARKS[tag]
+        content = ''.join(self.line[index + 1:])
+        del self.line[index:]
+        stripped = content.strip()
+        if not stripped:
+            self.line.append(content)
+            return
+        # 首尾空白移到标记外，否则 "** b **" 不会被识别为强调
+        leading = content[:len(content) - len(content.lstrip())]
+        trailing = content[len(content.rstrip()):]
+        self.line.append(f'{leading}{mark}{stripped}{mark}{trailing}')
+
+    def text(self) -> str:
+        """闭合当前行中未闭合的强调标记并返回行文本，标记在下一行重新打开"""
+        tags = [tag for tag, _ in self.marks]
+        while self.marks:
+            self._close_last()
+        text = ''.join(self.line)
+        self.line = []
+        for tag in tags:
+            self.open_mark(tag)
+        return text
+
+    def flush(self):
+        text = self.text()
+        if self.pre:
+            self.lines.extend(text.split('\n'))
+        elif text.strip():
+            # 保留嵌套列表项的缩进
+            indent = text[:len(text) - len(text.lstrip(' '))]
+            self.lines.append(('> ' if self.quote else '') + indent + ' '.join(text.split()))
+
+    def inline_block(self, tag) -> bool:
+        return tag in ('p', 'div', 'br') and (self.in_cell or self.items > 0)
+
+    def handle_starttag(self, tag, attrs):
+        if tag in ('script', 'style'):
+            self.skip += 1
+        elif self.inline_block(tag):
+            self.line.append(' ')
+        elif tag == 'br':
+            self.flush()
+        elif tag == 'img':
+            src = dict(attrs).get('src') or ''
+            if SAFE_URL_PATTERN.match(src):
+                self.line.append(f"![{dict(attrs).get('alt') or ''}]({src})")
+        elif tag in _INLINE_MARKS and not self.pre:
+            self.open_mark(tag)
+        elif tag in ('td', 'th'):
+            self.line = []
+            self.marks = []
+            self.in_cell = True
+        elif tag in _BLOCK_TAGS:
+            self.flush()
+            if tag in _HEADING_TAGS:
+                self.line.append('#' * _HEADING_TAGS[tag] + ' ')
+            elif tag in ('ul', 'ol'):
+                self.lists.append([tag, 0])
+            elif tag == 'li' and self.lists:
+                self.items += 1
+                current = self.lists[-1]
+                current[1] += 1
+                marker = f'{current[1]}. ' if current[0] == 'ol' else '- '
+                self.line.append('  ' * (len(self.lists) - 1) + marker)
+            elif tag == 'tr':
+                self.cells = []
+            elif tag == 'blockquote':
+                self.quote = True
+            elif tag == 'pre':
+                self.lines.append('```')
+                self.pre = True
+            elif tag == 'hr':
+                self.lines.append('---')
+
+    def handle_endtag(self, tag):
+        if tag in ('script', 'style'):
+            self.skip = max(self.skip - 1, 0)
+        elif self.inline_block(tag):
+            self.line.append(' ')
+        elif tag in _INLINE_MARKS and not self.pre:
+            self.close_mark(tag)
+        elif tag in ('td', 'th'):
+            text = self.text()
+            self.marks = []
+            if self.cells is not None:
+                self.cells.append(' '.join(text.split()).replace('|', '\\|'))
+            self.in_cell = False
+        elif tag == 'tr':
+            if self.cells:
+                self.lines.append('| ' + ' | '.join(self.cells) + ' |')
+                # 第一行作为表头
+                if not self.lines[-2:-1] or not self.lines[-2].startswith('|'):
+                    self.lines.append('|' + ' --- |' * len(self.cells))
+            self.cells = None
+        elif tag in _BLOCK_TAGS:
+            if tag == 'pre':
+                self.flush()
+                self.lines.append('```')
+                self.pre = False
+                return
+            self.flush()
+            if tag == 'li' and self.items:
+                self.items -= 1
+            elif tag in ('ul', 'ol') and self.lists:
+                self.lists.pop()
+            elif tag == 'blockquote':
+                self.quote = False
+            if tag in ('p', 'table', 'blockquote', 'pre') or tag in _HEADING_TAGS or (tag in ('ul', 'ol') and not self.lists):
+                self.lines.append('')
+
+    def handle_data(self, data):
+        if not self.skip:
+            self.line.append(data)
+
+
+def html_to_markdown(html: str) -> str:
+    """把编辑器中的 HTML 转为 Markdown，保留标题、列表、表格、强调与图片，其余标签只保留文本"""
+    writer = _MarkdownWriter()
+    writer.feed(html or '')
+    writer.close()
+    writer.flush()
+    return re.sub(r'\n{3,}', '\n\n', '\n'.join(writer.lines)).strip()
@@ -0,0 +1,289 @@
+"""进程内指标（Prometheus 文本格式）与轻量的请求链路追踪"""
+import contextvars
+import logging
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# 默认的耗时分桶（秒），覆盖从毫秒级的缓存读取到数分钟的大模型调用
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(names: tuple, values: tuple, extra: str = '') -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return '{' + ','.join(parts) + '}' if parts else ''
+
+
+def _format_value(value) -> str:
+    if isinstance(value, float):
+        return repr(round(value, 6)) if value != int(value) else str(int(value))
+    return str(value)
+
+
+class Counter:
+    """单调递增的计数器"""
+
+    type = 'counter'
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(labels.get(name, '') for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            items = list(self._values.items())
+        for key, value in items:
+            yield self.name + '_total', _format_labels(self.labelnames, key), value
+
+
+class Histogram:
+    """累积分桶的直方图，记录次数、总和与各分桶计数"""
+
+    type = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = (), buckets: tuple = DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(labels.get(name, '') for name in self.labelnames)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[0][index] += 1
+                    break
+            state[1] += value
+            state[2] += 1
+
+    def samples(self):
+        with self._lock:
+            items = [(key, (list(counts), total, count)) for key, (counts, total, count) in self._values.items()]
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                yield self.name + '_bucket', _format_labels(self.labelnames, key, f'le="{bound}"'), cumulative
+            yield self.name + '_bucket', _format_labels(self.labelnames, key, 'le="+Inf"'), count
+            yield self.name + '_sum', _format_labels(self.labelnames, key), total
+            yield self.name + '_count', _format_labels(self.labelnames, key), count
+
+
+class Collected:
+    """抓取时由回调计算的指标，回调返回 {标签值元组: 数值}，用于队列深度、缓存命中等已有统计"""
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple, collect, type: str = 'gauge'):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.collect = collect
+        self.type = type
+
+    def samples(self):
+        name = self.name + '_total' if self.type == 'counter' else self.name
+        for key, value in self.collect().items():
+            yield name, _format_labels(self.labelnames, key), value
+
+
+class Registry:
+    """指标注册表，render() 输出 Prometheus 文本格式"""
+
+    def __init__(self):
+        self._metrics = OrderedDict()
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: tuple = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: tuple = (), buckets: tuple = DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def collected(self, name: str, documentation: str, labelnames: tuple, collect, type: str = 'gauge') -> Collected:
+        return self.register(Collected(name, documentation, labelnames, collect, type))
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            try:
+                samples = list(metric.samples())
+            except Exception as e:
+                logger.error("指标 %s 采集错误: %s", metric.name, e)
+                continue
+            lines.append(f'# HELP {metric.name} {metric.documentation}')
+            lines.append(f'# TYPE {metric.name} {metric.type}')
+            for name, labels, value in samples:
+                lines.append(f'{name}{labels} {_format_value(value)}')
+        return '\n'.join(lines) + '\n'
+
+
+# 全局注册表与流水线通用指标
+registry = Registry()
+
+STAGE_SECONDS = registry.histogram(
+    'aitender_stage_duration_seconds',
+    '流水线各阶段耗时（文件保存、文本提取、提示词构建、模型调用、JSON 解析等）',
+    ('stage',)
+)
+QUEUE_WAIT_SECONDS = registry.histogram(
+    'aitender_queue_wait_seconds',
+    '后台任务从提交到开始执行的等待时间',
+    ('queue',)
+)
+HTTP_REQUEST_SECONDS = registry.histogram(
+    'aitender_http_request_duration_seconds',
+    '接口耗时（流式接口为返回响应头之前的耗时）',
+    ('endpoint', 'method', 'status')
+)
+LLM_REQUEST_SECONDS = registry.histogram(
+    'aitender_llm_request_duration_seconds',
+    '单次大模型调用耗时（含重试与流式输出）',
+    ('model', 'outcome')
+)
+LLM_TOKENS = registry.counter(
+    'aitender_llm_tokens',
+    '大模型消耗的 token 数',
+    ('model', 'kind')
+)
+LLM_RETRIES = registry.counter(
+    'aitender_llm_retries',
+    '大模型调用的重试次数'
+)
+
+
+# 链路追踪：trace id 随上下文变量传递，后台任务提交时随上下文一同复制
+_trace_id = contextvars.ContextVar('trace_id', default=None)
+
+# 保留最近多少条链路的分段耗时
+TRACE_HISTORY = 1000
+
+
+class TraceRecorder:
+    """按 trace id 保存最近链路的分段耗时，用于定位长尾请求的慢阶段"""
+
+    def __init__(self, max_traces: int = TRACE_HISTORY, max_spans: int = 500):
+        self.max_traces = max_traces
+        self.max_spans = max_spans
+        self._traces = OrderedDict()
+        self._lock = threading.Lock()
+
+    def add(self, trace_id: str, stage: str, start: float, duration: float, error: bool = False):
+        with self._lock:
+            spans = self._traces.get(trace_id)
+            if spans is None:
+                spans = self._traces[trace_id] = []
+                while len(self._traces) > self.max_traces:
+                    self._traces.popitem(last=False)
+            if len(spans) < self.max_spans:
+                spans.append({
+                    'stage': stage,
+                    'start': round(start, 3),
+                    'duration': round(duration, 4),
+                    'error': error
+                })
+
+    def get(self, trace_id: str):
+        with self._lock:
+            spans = self._traces.get(trace_id)
+            return list(spans) if spans is not None else None
+
+
+traces = TraceRecorder()
+
+
+def new_trace_id() -> str:
+    return uuid.uuid4().hex[:16]
+
+
+def current_trace_id():
+    return _trace_id.get()
+
+
+def set_trace_id(trace_id: str):
+    """设置当前上下文的 trace id，返回用于恢复的令牌"""
+    return _trace_id.set(trace_id)
+
+
+def reset_trace_id(token):
+    _trace_id.reset(token)
+
+
+class TraceIdFilter(logging.Filter):
+    """给日志记录附上当前链路的 trace id，没有链路时为 "-" """
+
+    def filter(self, record):
+        record.trace_id = _trace_id.get() or '-'
+        return True
+
+
+LOG_FORMAT = '%(asctime)s %(levelname)s [%(trace_id)s] %(name)s: %(message)s'
+
+
+def configure_logging(level: str = 'INFO'):
+    """日志输出到标准错误，每条日志带 trace id；重复调用不会重复添加处理器"""
+    root = logging.getLogger()
+    for handler in root.handlers:
+        if any(isinstance(item, TraceIdFilter) for item in handler.filters):
+            return
+    handler = logging.StreamHandler()
+    handler.addFilter(TraceIdFilter())
+    handler.setFormatter(logging.Formatter(LOG_FORMAT))
+    root.addHandler(handler)
+    root.setLevel(level.upper())
+
+
+def trace_span(stage: str, duration: float, error: bool = False):
+    """把一个已结束阶段的耗时挂到当前链路上"""
+    trace_id = _trace_id.get()
+    if trace_id:
+        traces.add(trace_id, stage, time.time() - duration, duration, error)
+
+
+def record_span(stage: str, duration: float, error: bool = False):
+    """记录一个已结束阶段的耗时：计入阶段直方图，并挂到当前链路上"""
+    STAGE_SECONDS.observe(duration, stage=stage)
+    trace_span(stage, duration, error)
+
+
+@contextmanager
+def span(stage: str):
+    """统计代码块耗时的阶段"""
+    start = time.perf_counter()
+    error = False
+    try:
+        yield
+    except BaseException:
+        error = True
+        raise
+    finally:
+        record_span(stage, time.perf_counter() - start, error)
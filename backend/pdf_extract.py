@@ -0,0 +1,114 @@
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import PyPDF2
+
+try:
+    import fitz  # PyMuPDF，可选的高速解析引擎
+except ImportError:
+    fitz = None
+
+# 页数少于该值时在当前进程内解析，避免进程间开销
+PARALLEL_MIN_PAGES = 32
+
+# 每个子任务至少包含的页数
+MIN_PAGES_PER_RANGE = 8
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def resolve_backend(backend: str = 'auto') -> str:
+    """解析引擎：auto 时优先使用 PyMuPDF，未安装则使用 PyPDF2"""
+    if backend == 'auto':
+        return 'pymupdf' if fitz is not None else 'pypdf2'
+    if backend == 'pymupdf' and fitz is None:
+        raise ValueError('未安装 PyMuPDF，无法使用 pymupdf 解析引擎')
+    if backend not in ('pymupdf', 'pypdf2'):
+        raise ValueError(f'未知的 PDF 解析引擎: {backend}')
+    return backend
+
+
+def get_executor(workers: int) -> ProcessPoolExecutor:
+    """共享的进程池（spawn 方式启动，避免在多线程进程中 fork）"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context('spawn')
+            )
+        return _executor
+
+
+def page_count(filepath: str, backend: str) -> int:
+    if backend == 'pymupdf':
+        with fitz.open(filepath) as doc:
+            return doc.page_count
+    with open(filepath, 'rb') as f:
+        return len(PyPDF2.PdfReader(f).pages)
+
+
+def extract_range(filepath: str, backend: str, start: int, end: int) -> list:
+    """提取 [start, end) 页的文本，在子进程中执行"""
+    if backend == 'pymupdf':
+        with fitz.open(filepath) as doc:
+            return [doc[index].get_text() or '' for index in range(start, end)]
+    with open(filepath, 'rb') as f:
+        reader = PyPDF2.PdfReader(f)
+        return [reader.pages[index].extract_text() or '' for index in range(start, end)]
+
+
+def _iter_pages_inline(filepath: str, backend: str):
+    if backend == 'pymupdf':
+        with fitz.open(filepath) as doc:
+            for page in doc:
+                yield page.get_text() or ''
+        return
+    with open(filepath, 'rb') as f:
+        for page in PyPDF2.PdfReader(f).pages:
+            yield page.extract_text() or ''
+
+
+def iter_pdf_pages(filepath: str, backend: str = 'auto', workers: int = None, on_progress=None):
+    """按页序逐页产出 PDF 文本，页数较多时按页段在进程池中并行解析
+
+    on_progress(pages_done, total_pages, pages_per_second) 在每个页段完成后调用。
+    """
+    backend = resolve_backend(backend)
+    workers = workers or min(4, os.cpu_count() or 1)
+    total = page_count(filepath, backend)
+    start_time = time.perf_counter()
+    done = 0
+
+    def report(count):
+        if on_progress:
+            elapsed = max(time.perf_counter() - start_time, 1e-6)
+            on_progress(count, total, count / elapsed)
+
+    if total < PARALLEL_MIN_PAGES or workers <= 1:
+        # 页数较少时在当前进程内逐页解析，只打开一次文件
+        for text in _iter_pages_inline(filepath, backend):
+            yield text
+            done += 1
+            if done % MIN_PAGES_PER_RANGE == 0 or done == total:
+                report(done)
+        return
+
+    size = max(MIN_PAGES_PER_RANGE, -(-total // (workers * 2)))
+    ranges = [(start, min(start + size, total)) for start in range(0, total, size)]
+    executor = get_executor(workers)
+    futures = [executor.submit(extract_range, filepath, backend, start, end) for start, end in ranges]
+    try:
+        # 按提交顺序取结果，保证页序；前面的页段完成即可开始产出
+        for (start, end), future in zip(ranges, futures):
+            for text in future.result():
+                yield text
+            done = end
+            report(done)
+    finally:
+        for future in futures:
+            future.cancel()
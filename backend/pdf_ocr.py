@@ -0,0 +1,159 @@
+"""扫描件 PDF 的 OCR 兜底：文本层过少或为乱码的页渲染为图像后用 Tesseract 识别
+
+只有需要的页才做 OCR，各页在进程池中并行；识别结果按页面图像的哈希缓存在磁盘上，
+同一页（重复上传、修订版中未改动的扫描页）不再重复识别。
+"""
+import hashlib
+import io
+import logging
+import multiprocessing
+import os
+import shutil
+import threading
+import uuid
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+
+import PyPDF2
+
+try:
+    import pytesseract  # 可选依赖，另需安装 tesseract 及中文语言包（chi_sim）
+except ImportError:
+    pytesseract = None
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+try:
+    import fitz  # PyMuPDF，安装后按页渲染，否则取页面中最大的嵌入图片
+except ImportError:
+    fitz = None
+
+# 去除空白后少于该字符数的页视为没有文本层
+MIN_PAGE_CHARS = 20
+# 文字（中文、字母、数字）占比低于该值的页视为乱码（字体缺少编码映射时常见）
+MIN_TEXT_RATIO = 0.5
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def ocr_available() -> bool:
+    """是否已安装 pytesseract、Pillow 与 tesseract 可执行文件"""
+    return (pytesseract is not None and Image is not None
+            and shutil.which(pytesseract.pytesseract.tesseract_cmd) is not None)
+
+
+def needs_ocr(text: str, min_chars: int = MIN_PAGE_CHARS) -> bool:
+    """判断一页的文本层是否过少或为乱码"""
+    chars = ''.join((text or '').split())
+    if len(chars) < min_chars:
+        return True
+    # str.isalnum 对中文字符同样成立；替换字符、私用区字符与控制字符不计入
+    readable = sum(1 for char in chars if char.isalnum())
+    return readable / len(chars) < MIN_TEXT_RATIO
+
+
+def get_executor(workers: int) -> ProcessPoolExecutor:
+    """OCR 专用的进程池（spawn 方式启动），与文本提取的进程池分开，避免长时间的识别阻塞普通解析"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context('spawn')
+            )
+        return _executor
+
+
+def _page_image(filepath: str, index: int, dpi: int):
+    """返回 (用于计算哈希的字节, 加载 PIL 图像的函数)，页面没有可识别的图像时返回 None
+
+    图像在缓存未命中时才解码。
+    """
+    if fitz is not None:
+        with fitz.open(filepath) as doc:
+            pixmap = doc[index].get_pixmap(dpi=dpi, colorspace=fitz.csGRAY)
+            size, data = (pixmap.width, pixmap.height), pixmap.samples
+            return data, lambda: Image.frombytes('L', size, data)
+    with open(filepath, 'rb') as f:
+        images = PyPDF2.PdfReader(f).pages[index].images
+    if not images:
+        return None
+    data = max(images, key=lambda image: len(image.data)).data
+    return data, lambda: Image.open(io.BytesIO(data))
+
+
+def _cache_path(cache_dir: str, key: str) -> str:
+    return os.path.join(cache_dir, key[:2], f'{key}.txt')
+
+
+def ocr_page(filepath: str, index: int, lang: str, dpi: int, cache_dir: str = None) -> str:
+    """识别第 index 页（从 0 开始），在子进程中执行；命中缓存时不做识别"""
+    page = _page_image(filepath, index, dpi)
+    if page is None:
+        return ''
+    data, load_image = page
+    key = hashlib.sha256(data).hexdigest() + hashlib.sha256(f'{lang}:{dpi}'.encode()).hexdigest()[:8]
+    path = _cache_path(cache_dir, key) if cache_dir else None
+    if path and os.path.exists(path):
+        with open(path, 'r', encoding='utf-8') as f:
+            return f.read()
+
+    with load_image() as image:
+        text = pytesseract.image_to_string(image, lang=lang)
+    if path:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f'{path}.{uuid.uuid4().hex}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(text)
+        os.replace(tmp_path, path)
+    return text
+
+
+def iter_ocr_pages(filepath: str, pages, workers: int = 2, lang: str = 'chi_sim+eng', dpi: int = 200,
+                   cache_dir: str = None, min_chars: int = MIN_PAGE_CHARS):
+    """按页序产出文本：文本层足够的页原样产出，其余页替换为 OCR 结果
+
+    pages 为文本层提取结果的迭代器（按页序）；需要识别的页提交到进程池，
+    前面的页识别完成即可产出，不必等待整份文档。
+    """
+    executor = get_executor(workers) if workers > 1 else None
+    # 按页序等待产出的 (文本层文本, OCR 结果或 Future)
+    pending = deque()
+
+    def resolve(text, result):
+        if isinstance(result, Future):
+            try:
+                result = result.result()
+            except Exception as e:
+                logger.error("OCR错误: %s", e)
+                result = None
+        # 识别结果为空时保留文本层内容
+        return result if result and result.strip() else text
+
+    try:
+        for index, text in enumerate(pages):
+            if not needs_ocr(text, min_chars):
+                result = None
+            elif executor is not None:
+                result = executor.submit(ocr_page, filepath, index, lang, dpi, cache_dir)
+            else:
+                try:
+                    result = ocr_page(filepath, index, lang, dpi, cache_dir)
+                except Exception as e:
+                    logger.error("OCR错误: %s", e)
+                    result = None
+            pending.append((text, result))
+            while pending and not (isinstance(pending[0][1], Future) and not pending[0][1].done()):
+                yield resolve(*pending.popleft())
+        while pending:
+            yield resolve(*pending.popleft())
+    finally:
+        for _, result in pending:
+            if isinstance(result, Future):
+                result.cancel()
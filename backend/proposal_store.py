@@ -0,0 +1,370 @@
+"""标书存储：SQLite 元数据索引 + 压缩的内容块，版本以相对上一版本的差异保存
+
+导入旧版按文件保存的标书：
+
+    cd backend
+    python proposal_store.py --import-legacy [目录]
+"""
+import argparse
+import difflib
+import gzip
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import uuid
+
+try:
+    import zstandard  # 可选依赖，未安装时使用 gzip
+except ImportError:
+    zstandard = None
+
+# 每隔多少个版本保存一次完整内容，读取任一版本最多应用这么多次差异
+KEYFRAME_INTERVAL = 10
+# 差异压缩后超过完整内容的这一比例时直接保存完整内容
+DELTA_MAX_RATIO = 0.5
+# 按标签边界切分 HTML，编辑器保存的 HTML 通常没有换行
+TOKEN_PATTERN = re.compile(r'[^>]*>|[^>]+$')
+
+
+class ProposalNotFound(KeyError):
+    """标书或版本不存在"""
+
+
+def compress(data: bytes, codec: str) -> bytes:
+    if codec == 'zstd':
+        return zstandard.ZstdCompressor(level=10).compress(data)
+    return gzip.compress(data, compresslevel=6)
+
+
+def decompress(data: bytes, codec: str) -> bytes:
+    if codec == 'zstd':
+        if zstandard is None:
+            raise RuntimeError('该版本使用 zstd 压缩，需要安装 zstandard')
+        return zstandard.ZstdDecompressor().decompress(data)
+    return gzip.decompress(data)
+
+
+def tokenize(html: str) -> list:
+    return TOKEN_PATTERN.findall(html)
+
+
+def make_delta(base: list, tokens: list) -> list:
+    """计算从 base 到 tokens 的差异：[起, 止] 表示复制 base 中的片段，字符串表示插入的内容"""
+    # 编辑通常集中在局部，先去掉相同的首尾，只对中间部分做序列比对
+    prefix = 0
+    limit = min(len(base), len(tokens))
+    while prefix < limit and base[prefix] == tokens[prefix]:
+        prefix += 1
+    suffix = 0
+    while suffix < limit - prefix and base[-1 - suffix] == tokens[-1 - suffix]:
+        suffix += 1
+
+    delta = [[0, prefix]] if prefix else []
+    middle_base = base[prefix:len(base) - suffix]
+    middle = tokens[prefix:len(tokens) - suffix]
+    matcher = difflib.SequenceMatcher(None, middle_base, middle)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == 'equal':
+            delta.append([prefix + i1, prefix + i2])
+        elif j2 > j1:
+            delta.append(''.join(middle[j1:j2]))
+    if suffix:
+        delta.append([len(base) - suffix, len(base)])
+    return delta
+
+
+def apply_delta(base: list, delta: list) -> str:
+    return ''.join(''.join(base[op[0]:op[1]]) if isinstance(op, list) else op for op in delta)
+
+
+class ProposalStore:
+    """标书存储
+
+    元数据（项目、作者、时间、大小、哈希）保存在 SQLite 中，列表与分页只查索引；
+    内容压缩后按内容块的 SHA-256 存放在 blobs/ 下，相同内容只存一份。
+    每 KEYFRAME_INTERVAL 个版本保存一次完整内容，其余版本保存相对上一版本的差异。
+    """
+
+    def __init__(self, directory: str, codec: str = 'auto'):
+        self.directory = directory
+        if codec == 'auto':
+            codec = 'zstd' if zstandard is not None else 'gzip'
+        if codec == 'zstd' and zstandard is None:
+            raise RuntimeError('PROPOSAL_CODEC=zstd 需要安装 zstandard')
+        self.codec = codec
+        self._local = threading.local()
+        os.makedirs(os.path.join(directory, 'blobs'), exist_ok=True)
+        with self._connection() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS proposals (
+                    id TEXT PRIMARY KEY,
+                    project TEXT NOT NULL,
+                    author TEXT NOT NULL,
+                    created REAL NOT NULL,
+                    updated REAL NOT NULL,
+                    version INTEGER NOT NULL,
+                    size INTEGER NOT NULL,
+                    hash TEXT NOT NULL
+                )
+            """)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS versions (
+                    proposal_id TEXT NOT NULL,
+                    version INTEGER NOT NULL,
+                    author TEXT NOT NULL,
+                    created REAL NOT NULL,
+                    size INTEGER NOT NULL,
+                    hash TEXT NOT NULL,
+                    base_version INTEGER,
+                    blob TEXT NOT NULL,
+                    codec TEXT NOT NULL,
+                    stored_size INTEGER NOT NULL,
+                    PRIMARY KEY (proposal_id, version)
+                )
+            """)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS legacy_imports (
+                    hash TEXT PRIMARY KEY,
+                    source TEXT NOT NULL,
+                    proposal_id TEXT NOT NULL,
+                    imported REAL NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_proposals_updated ON proposals (updated DESC)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_proposals_project ON proposals (project, updated DESC)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_proposals_author ON proposals (author, updated DESC)")
+
+    def _connection(self) -> sqlite3.Connection:
+        """每个线程使用独立的连接"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(os.path.join(self.directory, 'proposals.db'), timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _blob_path(self, blob: str) -> str:
+        return os.path.join(self.directory, 'blobs', blob[:2], blob)
+
+    def _write_blob(self, payload: bytes) -> str:
+        """写入压缩后的内容块，返回块名（内容的 SHA-256）"""
+        blob = hashlib.sha256(payload).hexdigest()
+        path = self._blob_path(blob)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f'{path}.{threading.get_ident()}.tmp'
+            with open(tmp_path, 'wb') as f:
+                f.write(payload)
+            os.replace(tmp_path, path)
+        return blob
+
+    def _discard_blob(self, conn, blob: str):
+        """删除没有版本引用的内容块（持有写锁时调用）"""
+        if conn.execute("SELECT 1 FROM versions WHERE blob = ? LIMIT 1", (blob,)).fetchone() is None:
+            try:
+                os.remove(self._blob_path(blob))
+            except OSError:
+                pass
+
+    def _read_blob(self, blob: str, codec: str) -> bytes:
+        with open(self._blob_path(blob), 'rb') as f:
+            return decompress(f.read(), codec)
+
+    def save(self, content: str, project: str, author: str, proposal_id: str = None, created: float = None) -> dict:
+        """保存标书；传入 proposal_id 时保存为该标书的新版本，内容未变化时不新增版本"""
+        content = content or ''
+        data = content.encode('utf-8')
+        content_hash = hashlib.sha256(data).hexdigest()
+        now = created or time.time()
+
+        if proposal_id is not None:
+            current = self.get(proposal_id)
+            if current['hash'] == content_hash:
+                return current
+            version = current['version'] + 1
+        else:
+            proposal_id = uuid.uuid4().hex
+            version = 1
+
+        full = compress(data, self.codec)
+        blob_payload, base_version = full, None
+        if version > 1 and (version - 1) % KEYFRAME_INTERVAL:
+            previous = self.content(proposal_id, version - 1)
+            delta = make_delta(tokenize(previous), tokenize(content))
+            payload = compress(json.dumps(delta, ensure_ascii=False, separators=(',', ':')).encode('utf-8'), self.codec)
+            if len(payload) <= len(full) * DELTA_MAX_RATIO:
+                blob_payload, base_version = payload, version - 1
+
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        blob = None
+        try:
+            if version > 1:
+                row = conn.execute("SELECT version FROM proposals WHERE id = ?", (proposal_id,)).fetchone()
+                if row is None or row['version'] != version - 1:
+                    # 并发保存同一标书：以先提交的为准，本次基于最新版本重新保存
+                    conn.execute("ROLLBACK")
+                    return self.save(content, project, author, proposal_id, created)
+            # 内容块在确认版本号后、持有写锁时写入，冲突重试不会留下无人引用的块
+            blob = self._write_blob(blob_payload)
+            conn.execute(
+                "INSERT INTO versions (proposal_id, version, author, created, size, hash, base_version, blob, codec, stored_size)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (proposal_id, version, author, now, len(data), content_hash, base_version, blob, self.codec, len(blob_payload))
+            )
+            if version == 1:
+                conn.execute(
+                    "INSERT INTO proposals (id, project, author, created, updated, version, size, hash) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    (proposal_id, project, author, now, now, version, len(data), content_hash)
+                )
+            else:
+                conn.execute(
+                    "UPDATE proposals SET project = ?, updated = ?, version = ?, size = ?, hash = ? WHERE id = ?",
+                    (project, now, version, len(data), content_hash, proposal_id)
+                )
+            conn.execute("COMMIT")
+        except Exception:
+            if blob is not None:
+                self._discard_blob(conn, blob)
+            conn.execute("ROLLBACK")
+            raise
+        return self.get(proposal_id)
+
+    def get(self, proposal_id: str) -> dict:
+        row = self._connection().execute("SELECT * FROM proposals WHERE id = ?", (proposal_id,)).fetchone()
+        if row is None:
+            raise ProposalNotFound(proposal_id)
+        return dict(row)
+
+    def list(self, page: int = 1, page_size: int = 20, project: str = None, author: str = None,
+             owner: str = None) -> dict:
+        """按更新时间倒序分页列出标书；传入 owner 时只列出其本人的标书与未记录作者的旧版导入"""
+        conditions, params = [], []
+        if owner is not None:
+            conditions.append("author IN (?, '')")
+            params.append(owner)
+        if project:
+            conditions.append("project = ?")
+            params.append(project)
+        if author:
+            conditions.append("author = ?")
+            params.append(author)
+        where = f" WHERE {' AND '.join(conditions)}" if conditions else ''
+        conn = self._connection()
+        total = conn.execute(f"SELECT COUNT(*) FROM proposals{where}", params).fetchone()[0]
+        rows = conn.execute(
+            f"SELECT * FROM proposals{where} ORDER BY updated DESC LIMIT ? OFFSET ?",
+            params + [page_size, (page - 1) * page_size]
+        ).fetchall()
+        return {'items': [dict(row) for row in rows], 'total': total, 'page': page, 'page_size': page_size}
+
+    def versions(self, proposal_id: str, page: int = 1, page_size: int = 20) -> dict:
+        """按版本号倒序分页列出标书的版本"""
+        self.get(proposal_id)
+        conn = self._connection()
+        total = conn.execute("SELECT COUNT(*) FROM versions WHERE proposal_id = ?", (proposal_id,)).fetchone()[0]
+        rows = conn.execute(
+            "SELECT version, author, created, size, hash, stored_size FROM versions"
+            " WHERE proposal_id = ? ORDER BY version DESC LIMIT ? OFFSET ?",
+            (proposal_id, page_size, (page - 1) * page_size)
+        ).fetchall()
+        return {'items': [dict(row) for row in rows], 'total': total, 'page': page, 'page_size': page_size}
+
+    def content(self, proposal_id: str, version: int = None) -> str:
+        """读取某一版本（默认最新版本）的内容：从最近的完整版本开始依次应用差异"""
+        if version is None:
+            version = self.get(proposal_id)['version']
+        conn = self._connection()
+        # 取出从最近的完整版本到目标版本的差异链
+        chain = []
+        while True:
+            row = conn.execute(
+                "SELECT base_version, blob, codec FROM versions WHERE proposal_id = ? AND version = ?",
+                (proposal_id, version)
+            ).fetchone()
+            if row is None:
+                raise ProposalNotFound(f'{proposal_id}@{version}')
+            chain.append(row)
+            if row['base_version'] is None:
+                break
+            version = row['base_version']
+
+        content = self._read_blob(chain[-1]['blob'], chain[-1]['codec']).decode('utf-8')
+        for row in reversed(chain[:-1]):
+            delta = json.loads(self._read_blob(row['blob'], row['codec']))
+            content = apply_delta(tokenize(content), delta)
+        return content
+
+    def stats(self) -> dict:
+        """标书数、版本数，以及原始大小与实际占用的磁盘大小"""
+        row = self._connection().execute(
+            "SELECT COUNT(DISTINCT proposal_id) AS proposals, COUNT(*) AS versions,"
+            " COALESCE(SUM(size), 0) AS size, COALESCE(SUM(stored_size), 0) AS stored_size FROM versions"
+        ).fetchone()
+        return dict(row)
+
+    def import_legacy(self, directory: str, on_import=None) -> int:
+        """导入旧版按文件保存的标书（{项目名}_{时间戳}.html），返回新导入的份数
+
+        导入后原文件移到 migrated/ 子目录。已导入的文件按内容哈希记录，中途失败后重新执行不会重复导入，
+        只补做 on_import（如加入检索索引）与移动。
+        """
+        if not os.path.isdir(directory):
+            return 0
+        migrated_dir = os.path.join(directory, 'migrated')
+        conn = self._connection()
+        imported = 0
+        for name in sorted(os.listdir(directory)):
+            path = os.path.join(directory, name)
+            if not name.endswith('.html') or not os.path.isfile(path):
+                continue
+            with open(path, encoding='utf-8') as f:
+                content = f.read()
+            digest = hashlib.sha256(content.encode('utf-8')).hexdigest()
+            row = conn.execute("SELECT proposal_id FROM legacy_imports WHERE hash = ?", (digest,)).fetchone()
+            proposal = None
+            if row is not None:
+                try:
+                    proposal = self.get(row['proposal_id'])
+                except ProposalNotFound:
+                    # 导入后已被删除，按新文件重新导入
+                    conn.execute("DELETE FROM legacy_imports WHERE hash = ?", (digest,))
+            if proposal is None:
+                project, _, timestamp = name[:-5].rpartition('_')
+                created = float(timestamp) if timestamp.isdigit() else os.path.getmtime(path)
+                proposal = self.save(content, project or name[:-5], '', created=created)
+                conn.execute(
+                    "INSERT OR IGNORE INTO legacy_imports (hash, source, proposal_id, imported) VALUES (?, ?, ?, ?)",
+                    (digest, name, proposal['id'], time.time())
+                )
+                imported += 1
+            if on_import:
+                on_import(proposal, content)
+            os.makedirs(migrated_dir, exist_ok=True)
+            os.replace(path, os.path.join(migrated_dir, name))
+        return imported
+
+
+def main():
+    parser = argparse.ArgumentParser(description='标书存储维护')
+    parser.add_argument('--import-legacy', nargs='?', const='', metavar='DIRECTORY',
+                        help='导入旧版按文件保存的标书（默认 PROPOSAL_DIR），原文件移到 migrated/ 子目录')
+    args = parser.parse_args()
+    if args.import_legacy is None:
+        parser.error('需要指定操作，如 --import-legacy')
+
+    # 复用后端的配置、标书存储与检索索引
+    import app
+
+    if not app.import_legacy_proposals(args.import_legacy or None):
+        print("没有需要导入的旧版标书")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,374 @@
+import heapq
+import json
+import logging
+import math
+import os
+import re
+import threading
+from collections import Counter
+from html.parser import HTMLParser
+
+from cache import text_sha256
+from chunking import is_heading
+
+try:
+    import jieba  # 可选的中文分词，未安装时按汉字二元组切分
+except ImportError:
+    jieba = None
+
+try:
+    import numpy as np  # 可选，向量索引使用
+except ImportError:
+    np = None
+
+try:
+    import fcntl  # 多进程追加写入时加文件锁（仅 POSIX）
+except ImportError:
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# 每个段落的最大字符数
+PASSAGE_CHARS = 500
+
+# BM25 参数
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+# 混合检索时倒数排名融合的常数
+RRF_K = 60
+
+TOKEN_PATTERN = re.compile(r'[\u3400-\u9fff]+|[a-z]+|\d+(?:\.\d+)?')
+BLOCK_TAGS = {'p', 'div', 'li', 'tr', 'br', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'blockquote', 'pre', 'table'}
+
+
+def tokenize(text: str) -> list:
+    """中文分词：安装 jieba 时使用搜索引擎模式，否则汉字按二元组切分；英文、数字按词切分"""
+    text = (text or '').lower()
+    if jieba is not None:
+        return [word for word in jieba.lcut_for_search(text) if TOKEN_PATTERN.fullmatch(word)]
+    tokens = []
+    for match in TOKEN_PATTERN.finditer(text):
+        word = match.group()
+        if '\u3400' <= word[0] <= '\u9fff' and len(word) > 1:
+            tokens.extend(word[index:index + 2] for index in range(len(word) - 1))
+        else:
+            tokens.append(word)
+    return tokens
+
+
+class _TextExtractor(HTMLParser):
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.parts = []
+        self._skip = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in ('script', 'style'):
+            self._skip += 1
+        elif tag in BLOCK_TAGS:
+            self.parts.append('\n')
+
+    def handle_endtag(self, tag):
+        if tag in ('script', 'style'):
+            self._skip = max(self._skip - 1, 0)
+        elif tag in BLOCK_TAGS or tag in ('td', 'th'):
+            self.parts.append('\n' if tag not in ('td', 'th') else ' ')
+
+    def handle_data(self, data):
+        if not self._skip:
+            self.parts.append(data)
+
+
+def html_to_text(html: str) -> str:
+    """提取 HTML 中的文本，块级元素之间换行"""
+    extractor = _TextExtractor()
+    extractor.feed(html or '')
+    extractor.close()
+    return ''.join(extractor.parts)
+
+
+def split_passages(text: str, max_chars: int = PASSAGE_CHARS) -> list:
+    """按标题与段落把文本切分为检索段落，返回 [(所属标题, 段落文本)]"""
+    passages = []
+    heading = ''
+    current = []
+    size = 0
+
+    def close():
+        nonlocal current, size
+        if current:
+            passages.append((heading, '\n'.join(current)))
+        current = []
+        size = 0
+
+    for line in (text or '').split('\n'):
+        line = line.strip()
+        if not line:
+            continue
+        if is_heading(line):
+            close()
+            heading = line
+            continue
+        while len(line) > max_chars:
+            close()
+            passages.append((heading, line[:max_chars]))
+            line = line[max_chars:]
+        if current and size + len(line) > max_chars:
+            close()
+        current.append(line)
+        size += len(line)
+    close()
+    return passages
+
+
+def load_embedder(model_name: str):
+    """加载 sentence-transformers 模型，返回 embed(texts) -> 归一化向量；依赖未安装时返回 None"""
+    if not model_name or np is None:
+        return None
+    try:
+        from sentence_transformers import SentenceTransformer
+    except ImportError:
+        logger.warning('未安装 sentence-transformers，向量检索未启用')
+        return None
+    model = SentenceTransformer(model_name, device='cpu')
+
+    def embed(texts: list):
+        return np.asarray(model.encode(texts, normalize_embeddings=True), dtype=np.float32)
+
+    embed.dimension = model.get_sentence_embedding_dimension()
+    return embed
+
+
+class SearchIndex:
+    """本地检索索引：段落级 BM25 倒排索引，可选内存映射的向量索引
+
+    段落以 JSON 行追加写入 passages.jsonl（含词频，加载时无需重新分词），
+    向量按行追加写入 embeddings.f32；各进程按文件增长增量加载，新文档写入后即可检索。
+    带 key 的文档（如同一份标书的各个版本）只检索版本号最大的一篇，旧版本的段落保留在文件中但不再返回。
+    """
+
+    def __init__(self, directory: str, embedder=None):
+        self.directory = directory
+        self.embedder = embedder
+        self.passages_path = os.path.join(directory, 'passages.jsonl')
+        self.vectors_path = os.path.join(directory, 'embeddings.f32')
+        os.makedirs(directory, exist_ok=True)
+
+        self._lock = threading.RLock()
+        self._offset = 0
+        self.passages = []
+        self.postings = {}
+        self.lengths = []
+        self.total_length = 0
+        self._norms = []
+        self.documents = set()
+        # key -> (版本号, 该版本的段落下标)，以及被新版本取代的段落下标
+        self.latest = {}
+        self.superseded = set()
+        self.vector_rows = {}
+        self._vectors = None
+        self.refresh()
+
+    # 写入
+
+    def add_document(self, text: str, source: str, title: str = '', key: str = None, version: int = 0) -> int:
+        """索引一篇文档，返回新增段落数
+
+        不带 key 时内容相同的文档只索引一次；带 key 时新版本取代该 key 已索引的版本，
+        版本号不大于已索引版本时跳过。
+        """
+        document = text_sha256(text)
+        self.refresh()
+        if self._indexed(document, key, version) or not (text or '').strip():
+            return 0
+        passages = split_passages(text)
+        if not passages:
+            return 0
+        vectors = None
+        if self.embedder is not None:
+            vectors = self.embedder([f'{heading}\n{body}' for heading, body in passages])
+
+        with self._lock, open(self.passages_path, 'a', encoding='utf-8') as f:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                # 加锁后再次确认，避免并发写入重复文档
+                self.refresh()
+                if self._indexed(document, key, version):
+                    return 0
+                row = None
+                if vectors is not None:
+                    with open(self.vectors_path, 'ab') as vector_file:
+                        row = vector_file.tell() // (vectors.shape[1] * 4)
+                        vector_file.write(vectors.tobytes())
+                lines = []
+                for index, (heading, body) in enumerate(passages):
+                    passage = {
+                        'doc': document,
+                        'source': source,
+                        'title': title,
+                        'heading': heading,
+                        'text': body,
+                        'terms': Counter(tokenize(f'{heading}\n{body}')),
+                        'row': None if row is None else row + index
+                    }
+                    if key is not None:
+                        passage.update(key=key, version=version)
+                    lines.append(json.dumps(passage, ensure_ascii=False))
+                f.write('\n'.join(lines) + '\n')
+                f.flush()
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+        self.refresh()
+        return len(passages)
+
+    def _indexed(self, document: str, key: str, version: int) -> bool:
+        if key is None:
+            return document in self.documents
+        return key in self.latest and self.latest[key][0] >= version
+
+    # 加载
+
+    def refresh(self):
+        """加载其他进程或线程新追加的段落"""
+        try:
+            size = os.path.getsize(self.passages_path)
+        except OSError:
+            return
+        if size <= self._offset:
+            return
+        with self._lock, open(self.passages_path, 'rb') as f:
+            f.seek(self._offset)
+            data = f.read()
+            # 只处理完整的行，写了一半的行留到下次
+            end = data.rfind(b'\n') + 1
+            for line in data[:end].splitlines():
+                if line.strip():
+                    self._add_passage(json.loads(line))
+            self._offset += end
+
+    def _add_passage(self, passage: dict):
+        index = len(self.passages)
+        terms = passage.pop('terms')
+        passage['length'] = sum(terms.values())
+        self.passages.append(passage)
+        self.documents.add(passage['doc'])
+        key = passage.get('key')
+        if key is not None:
+            version, indexes = self.latest.get(key, (None, []))
+            if version is None or passage['version'] > version:
+                # 新版本取代旧版本的全部段落
+                self.superseded.update(indexes)
+                self.latest[key] = (passage['version'], [index])
+            elif passage['version'] == version:
+                indexes.append(index)
+            else:
+                self.superseded.add(index)
+        self.lengths.append(passage['length'])
+        if passage.get('row') is not None:
+            self.vector_rows[passage['row']] = index
+        self.total_length += passage['length']
+        for term, frequency in terms.items():
+            self.postings.setdefault(term, []).append((index, frequency))
+
+    # 检索
+
+    def search(self, query: str, limit: int = 5, source: str = None) -> list:
+        """检索相关段落，启用向量索引时与 BM25 结果按倒数排名融合"""
+        self.refresh()
+        with self._lock:
+            ranked = self._bm25(query, limit * 4, source)
+            if self.embedder is not None:
+                vector_ranked = self._vector_search(query, limit * 4, source)
+                if vector_ranked:
+                    ranked = self._fuse([ranked, vector_ranked])
+            return [
+                dict(self._public(self.passages[index]), score=round(score, 4))
+                for index, score in ranked[:limit]
+            ]
+
+    def _bm25(self, query: str, limit: int, source: str = None) -> list:
+        count = len(self.passages)
+        if not count:
+            return []
+        norms = self._length_norms()
+        scores = {}
+        get = scores.get
+        for term in set(tokenize(query)):
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            weight = math.log(1 + (count - len(postings) + 0.5) / (len(postings) + 0.5)) * (BM25_K1 + 1)
+            for index, frequency in postings:
+                scores[index] = get(index, 0.0) + weight * frequency / (frequency + norms[index])
+        if source or self.superseded:
+            scores = {index: score for index, score in scores.items() if self._matches(index, source)}
+        return heapq.nlargest(limit, scores.items(), key=lambda item: item[1])
+
+    def _length_norms(self) -> list:
+        """各段落的 BM25 长度归一化项，段落数变化后重新计算"""
+        if len(self._norms) != len(self.lengths):
+            average_length = self.total_length / len(self.lengths)
+            self._norms = [BM25_K1 * (1 - BM25_B + BM25_B * length / average_length) for length in self.lengths]
+        return self._norms
+
+    def _vector_search(self, query: str, limit: int, source: str = None) -> list:
+        vectors = self._vector_matrix()
+        if vectors is None:
+            return []
+        query_vector = self.embedder([query])[0]
+        similarities = vectors @ query_vector
+        results = []
+        for row in np.argsort(-similarities):
+            index = self.vector_rows.get(int(row))
+            if index is None or not self._matches(index, source):
+                continue
+            results.append((index, float(similarities[row])))
+            if len(results) >= limit:
+                break
+        return results
+
+    def _vector_matrix(self):
+        """以内存映射方式打开向量文件，文件增长后重新映射"""
+        dimension = getattr(self.embedder, 'dimension', None)
+        try:
+            size = os.path.getsize(self.vectors_path)
+        except OSError:
+            return None
+        if not dimension or size < dimension * 4:
+            return None
+        rows = size // (dimension * 4)
+        if self._vectors is None or self._vectors.shape[0] != rows:
+            self._vectors = np.memmap(self.vectors_path, dtype=np.float32, mode='r', shape=(rows, dimension))
+        return self._vectors
+
+    def _matches(self, index: int, source: str = None) -> bool:
+        """段落未被新版本取代且来源符合"""
+        return index not in self.superseded and (not source or self.passages[index]['source'] == source)
+
+    @staticmethod
+    def _fuse(rankings: list) -> list:
+        scores = {}
+        for ranking in rankings:
+            for rank, (index, _) in enumerate(ranking):
+                scores[index] = scores.get(index, 0.0) + 1 / (RRF_K + rank + 1)
+        return sorted(scores.items(), key=lambda item: item[1], reverse=True)
+
+    @staticmethod
+    def _public(passage: dict) -> dict:
+        title = ' · '.join(part for part in (passage['title'], passage['heading']) if part)
+        return {'title': title, 'content': passage['text'], 'source': passage['source']}
+
+    def stats(self) -> dict:
+        """索引规模"""
+        self.refresh()
+        with self._lock:
+            return {
+                'documents': len(self.documents),
+                'passages': len(self.passages),
+                'superseded_passages': len(self.superseded),
+                'terms': len(self.postings),
+                'vectors': len(self.vector_rows)
+            }
@@ -0,0 +1,180 @@
+import json
+import re
+
+FENCE_PATTERN = re.compile(r'```(?:json|JSON)?\s*\n?(.*?)(?:```|$)', re.DOTALL)
+
+CLOSERS = {'{': '}', '[': ']'}
+
+# 截断修复时最多尝试的回退位置数
+MAX_REPAIR_ATTEMPTS = 64
+
+
+def _strip_fences(text: str) -> str:
+    match = FENCE_PATTERN.search(text)
+    return match.group(1) if match else text
+
+
+def _scan(text: str):
+    """扫描 JSON 文本，去掉结尾多余的逗号与对象之后的多余文本
+
+    返回 (清理后的文本, 是否完整, 截断时的回退位置列表)。回退位置为 (长度, 需补齐的括号)，
+    即在一个完整的值之后截断、补齐括号即可得到合法 JSON 的位置。
+    """
+    out = []
+    stack = []
+    cut_points = []
+    in_string = False
+    escape = False
+    for char in text:
+        if in_string:
+            out.append(char)
+            if escape:
+                escape = False
+            elif char == '\\':
+                escape = True
+            elif char == '"':
+                in_string = False
+            continue
+        if char == '"':
+            in_string = True
+        elif char in CLOSERS:
+            stack.append(CLOSERS[char])
+            out.append(char)
+            cut_points.append((len(out), ''.join(reversed(stack))))
+            continue
+        elif char in '}]':
+            # 去掉结尾多余的逗号
+            while out and out[-1].isspace():
+                out.pop()
+            if out and out[-1] == ',':
+                out.pop()
+            if stack:
+                stack.pop()
+            out.append(char)
+            if not stack:
+                return ''.join(out), True, cut_points
+            continue
+        elif char == ',':
+            cut_points.append((len(out), ''.join(reversed(stack))))
+        out.append(char)
+
+    text = ''.join(out)
+    if in_string:
+        text += '"'
+    return text, False, cut_points
+
+
+def parse_json_object(text: str):
+    """解析模型输出的 JSON 对象，修复代码块标记、前后多余文本、结尾逗号与截断
+
+    返回 (对象, 是否经过修复)，无法得到 JSON 对象时抛出 ValueError。
+    """
+    text = (text or '').strip()
+    try:
+        data = json.loads(text)
+        if isinstance(data, dict):
+            return data, False
+    except ValueError:
+        pass
+
+    text = _strip_fences(text)
+    start = text.find('{')
+    if start < 0:
+        raise ValueError('输出中没有 JSON 对象')
+    cleaned, complete, cut_points = _scan(text[start:])
+    if complete:
+        return json.loads(cleaned), True
+
+    # 输出被截断：先尝试直接补齐括号，再依次回退到更早的完整值处
+    candidates = [(cleaned, ''.join(reversed([CLOSERS[c] for c in _open_brackets(cleaned)])))]
+    candidates += [(cleaned[:length], closers) for length, closers in reversed(cut_points[-MAX_REPAIR_ATTEMPTS:])]
+    for body, closers in candidates:
+        try:
+            data = json.loads(body.rstrip().rstrip(',') + closers)
+        except ValueError:
+            continue
+        if isinstance(data, dict):
+            return data, True
+    raise ValueError('JSON 被截断且无法修复')
+
+
+def _open_brackets(text: str) -> list:
+    """返回文本末尾仍未闭合的括号"""
+    stack = []
+    in_string = False
+    escape = False
+    for char in text:
+        if in_string:
+            if escape:
+                escape = False
+            elif char == '\\':
+                escape = True
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+        elif char in CLOSERS:
+            stack.append(char)
+        elif char in '}]' and stack:
+            stack.pop()
+    return stack
+
+
+def _coerce(value, default):
+    """按默认值的类型规整字段值，无法规整时返回 None"""
+    if value is None:
+        return default
+    if isinstance(default, bool):
+        if isinstance(value, bool):
+            return value
+        return str(value).strip().lower() in ('true', '1', 'yes', '是', '必选', '必须')
+    if isinstance(default, str):
+        if isinstance(value, (str, int, float)):
+            return str(value).strip() or default
+        return None
+    if isinstance(default, list):
+        if isinstance(value, str):
+            value = [value]
+        if not isinstance(value, list):
+            return None
+        return [str(item) for item in value if isinstance(item, (str, int, float)) and str(item).strip()]
+    return value
+
+
+def _clean_object(value, fields: dict, required: tuple = ()):
+    if not isinstance(value, dict):
+        return None
+    cleaned = {}
+    for field, default in fields.items():
+        coerced = _coerce(value.get(field), default)
+        cleaned[field] = default if coerced is None else coerced
+    if any(not value.get(field) or not cleaned[field] for field in required):
+        return None
+    return cleaned
+
+
+def validate_sections(data: dict, schema: dict):
+    """按模式校验并规整各部分，返回 (规整后的结果, 无效部分的名称列表)
+
+    模式为 {部分: {'type': 'object' | 'array', 'fields': {字段: 默认值}, 'required': (必填字段,)}}，
+    字段类型取自默认值。数组中缺少必填字段的条目被丢弃，全部条目都无效时该部分视为无效。
+    """
+    result = {}
+    invalid = []
+    for section, spec in schema.items():
+        value = data.get(section) if isinstance(data, dict) else None
+        required = spec.get('required', ())
+        if spec['type'] == 'object':
+            cleaned = _clean_object(value, spec['fields'], required)
+        elif isinstance(value, list):
+            items = [_clean_object(item, spec['fields'], required) for item in value]
+            cleaned = [item for item in items if item is not None]
+            if value and not cleaned:
+                cleaned = None
+        else:
+            cleaned = None
+        if cleaned is None:
+            invalid.append(section)
+        else:
+            result[section] = cleaned
+    return result, invalid
@@ -0,0 +1,79 @@
+import contextvars
+import logging
+import threading
+import queue
+import time
+from collections import deque
+
+from metrics import QUEUE_WAIT_SECONDS, trace_span
+
+logger = logging.getLogger(__name__)
+
+
+class QueueFullError(Exception):
+    """任务队列已满"""
+
+
+class TaskQueue:
+    """有界后台任务队列：固定数量的工作线程 + 有限长度的等待队列"""
+
+    def __init__(self, workers: int = 4, max_queue: int = 32, name: str = 'task-worker'):
+        self.workers = max(1, workers)
+        self.max_queue = max(1, max_queue)
+        self.name = name
+        self._queue = queue.Queue()
+        self._pending = deque()
+        self._running = set()
+        self._lock = threading.Lock()
+        self._threads = []
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._worker, name=f'{name}-{i}', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def submit(self, task_id: str, func, *args, **kwargs):
+        """提交任务，队列已满时抛出 QueueFullError；任务在提交时的上下文（含 trace id）中执行"""
+        with self._lock:
+            if len(self._pending) >= self.max_queue:
+                raise QueueFullError(f'任务队列已满（{self.max_queue}）')
+            self._pending.append(task_id)
+        self._queue.put((task_id, func, args, kwargs, contextvars.copy_context(), time.perf_counter()))
+
+    def position(self, task_id: str):
+        """返回任务在等待队列中的位置（从1开始），不在队列中返回 None"""
+        with self._lock:
+            try:
+                return self._pending.index(task_id) + 1
+            except ValueError:
+                return None
+
+    def stats(self) -> dict:
+        """队列统计信息"""
+        with self._lock:
+            return {
+                'workers': self.workers,
+                'max_queue': self.max_queue,
+                'queued': len(self._pending),
+                'running': len(self._running)
+            }
+
+    def _worker(self):
+        while True:
+            task_id, func, args, kwargs, context, submitted = self._queue.get()
+            wait = time.perf_counter() - submitted
+            QUEUE_WAIT_SECONDS.observe(wait, queue=self.name)
+            context.run(trace_span, f'queue_wait:{self.name}', wait)
+            with self._lock:
+                try:
+                    self._pending.remove(task_id)
+                except ValueError:
+                    pass
+                self._running.add(task_id)
+            try:
+                context.run(func, *args, **kwargs)
+            except Exception as e:
+                context.run(logger.error, "后台任务 %s 异常: %s", task_id, e, exc_info=e)
+            finally:
+                with self._lock:
+                    self._running.discard(task_id)
+                self._queue.task_done()
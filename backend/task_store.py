@@ -0,0 +1,284 @@
+import abc
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+class TaskTable:
+    """任务存储中的一个命名空间，提供类似字典的读写接口"""
+
+    def __init__(self, store, namespace: str):
+        self.store = store
+        self.namespace = namespace
+
+    def get(self, key: str, default=None):
+        value = self.store.get(self.namespace, key)
+        return default if value is None else value
+
+    def update(self, key: str, **fields) -> dict:
+        """原子地合并字段，返回更新后的值"""
+        return self.store.update(self.namespace, key, fields)
+
+    def delete(self, key: str):
+        self.store.delete(self.namespace, key)
+
+    def __getitem__(self, key: str):
+        value = self.store.get(self.namespace, key)
+        if value is None:
+            raise KeyError(key)
+        return value
+
+    def __setitem__(self, key: str, value):
+        self.store.set(self.namespace, key, value)
+
+    def __contains__(self, key: str) -> bool:
+        return self.store.get(self.namespace, key) is not None
+
+
+def value_size(value) -> int:
+    """条目按 JSON 序列化后的字符数计算大小"""
+    return len(json.dumps(value, ensure_ascii=False))
+
+
+class TaskStore(abc.ABC):
+    """任务状态存储基类，条目带 TTL，每个命名空间有条目数上限，所有条目有总大小上限（0 表示不限）"""
+
+    # 每写入多少次执行一次过期清理与容量检查
+    MAINTENANCE_INTERVAL = 200
+
+    def __init__(self, ttl: float = 86400, max_entries: int = 10000, max_bytes: int = 0):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+
+    def table(self, namespace: str) -> TaskTable:
+        return TaskTable(self, namespace)
+
+    @abc.abstractmethod
+    def get(self, namespace: str, key: str):
+        """返回未过期的值，不存在或已过期时返回 None"""
+
+    @abc.abstractmethod
+    def set(self, namespace: str, key: str, value):
+        """写入值并刷新过期时间"""
+
+    @abc.abstractmethod
+    def update(self, namespace: str, key: str, fields: dict) -> dict:
+        """原子地合并字段，返回更新后的值"""
+
+    @abc.abstractmethod
+    def delete(self, namespace: str, key: str):
+        """删除条目，不存在时忽略"""
+
+    @abc.abstractmethod
+    def purge_expired(self) -> int:
+        """清理已过期的条目，返回清理的条数"""
+
+
+class MemoryTaskStore(TaskStore):
+    """进程内存储，适用于单进程部署"""
+
+    def __init__(self, ttl: float = 86400, max_entries: int = 10000, max_bytes: int = 0):
+        super().__init__(ttl, max_entries, max_bytes)
+        self._tables = {}
+        self._lock = threading.Lock()
+        self._bytes = 0
+        self._writes = 0
+
+    def _table(self, namespace: str) -> OrderedDict:
+        return self._tables.setdefault(namespace, OrderedDict())
+
+    def get(self, namespace: str, key: str):
+        with self._lock:
+            entry = self._table(namespace).get(key)
+            if entry is None:
+                return None
+            value, expires_at, size = entry
+            if expires_at < time.time():
+                del self._table(namespace)[key]
+                self._bytes -= size
+                return None
+            # 返回副本，避免调用方修改影响已存储的值
+            return dict(value) if isinstance(value, dict) else value
+
+    def set(self, namespace: str, key: str, value):
+        with self._lock:
+            self._put(namespace, key, value)
+
+    def update(self, namespace: str, key: str, fields: dict) -> dict:
+        with self._lock:
+            entry = self._table(namespace).get(key)
+            value = dict(entry[0]) if entry and entry[1] >= time.time() else {}
+            value.update(fields)
+            self._put(namespace, key, value)
+            return value
+
+    def delete(self, namespace: str, key: str):
+        with self._lock:
+            entry = self._table(namespace).pop(key, None)
+            if entry is not None:
+                self._bytes -= entry[2]
+
+    def _put(self, namespace: str, key: str, value):
+        table = self._table(namespace)
+        previous = table.get(key)
+        if previous is not None:
+            self._bytes -= previous[2]
+        size = value_size(value) if self.max_bytes else 0
+        table[key] = (value, time.time() + self.ttl, size)
+        table.move_to_end(key)
+        self._bytes += size
+        # 超出上限时淘汰最久未更新的条目
+        while len(table) > self.max_entries:
+            self._bytes -= table.popitem(last=False)[1][2]
+        if self.max_bytes:
+            self._evict_bytes(namespace, key)
+        self._writes += 1
+        if self._writes % self.MAINTENANCE_INTERVAL == 0:
+            self._purge_expired()
+
+    def _evict_bytes(self, namespace: str, key: str):
+        """总大小超出上限时淘汰所有命名空间中最久未更新的条目，刚写入的条目保留"""
+        while self._bytes > self.max_bytes:
+            # 各命名空间按更新时间排列，过期时间最早的队首即最久未更新的条目
+            heads = [(next(iter(table.values()))[1], name) for name, table in self._tables.items() if table]
+            _, oldest = min(heads)
+            table = self._tables[oldest]
+            if oldest == namespace and next(iter(table)) == key:
+                break
+            self._bytes -= table.popitem(last=False)[1][2]
+
+    def _purge_expired(self) -> int:
+        now = time.time()
+        removed = 0
+        for table in self._tables.values():
+            for key in [key for key, (_, expires_at, _) in table.items() if expires_at < now]:
+                self._bytes -= table.pop(key)[2]
+                removed += 1
+        return removed
+
+    def purge_expired(self) -> int:
+        with self._lock:
+            return self._purge_expired()
+
+
+class SQLiteTaskStore(TaskStore):
+    """SQLite（WAL 模式）存储，多个工作进程可共享同一数据库文件"""
+
+    def __init__(self, path: str, ttl: float = 86400, max_entries: int = 10000, max_bytes: int = 0):
+        super().__init__(ttl, max_entries, max_bytes)
+        self.path = path
+        self._local = threading.local()
+        self._writes = 0
+        self._writes_lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connection() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS tasks (
+                    namespace TEXT NOT NULL,
+                    key TEXT NOT NULL,
+                    value TEXT NOT NULL,
+                    updated_at REAL NOT NULL,
+                    expires_at REAL NOT NULL,
+                    PRIMARY KEY (namespace, key)
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_tasks_expires ON tasks (expires_at)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_tasks_updated ON tasks (namespace, updated_at)")
+
+    def _connection(self) -> sqlite3.Connection:
+        """每个线程使用独立的连接"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, namespace: str, key: str):
+        row = self._connection().execute(
+            "SELECT value FROM tasks WHERE namespace = ? AND key = ? AND expires_at >= ?",
+            (namespace, key, time.time())
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def set(self, namespace: str, key: str, value):
+        now = time.time()
+        self._connection().execute(
+            "INSERT OR REPLACE INTO tasks (namespace, key, value, updated_at, expires_at) VALUES (?, ?, ?, ?, ?)",
+            (namespace, key, json.dumps(value, ensure_ascii=False), now, now + self.ttl)
+        )
+        self._after_write()
+
+    def update(self, namespace: str, key: str, fields: dict) -> dict:
+        conn = self._connection()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT value FROM tasks WHERE namespace = ? AND key = ? AND expires_at >= ?",
+                (namespace, key, now)
+            ).fetchone()
+            value = json.loads(row[0]) if row else {}
+            value.update(fields)
+            conn.execute(
+                "INSERT OR REPLACE INTO tasks (namespace, key, value, updated_at, expires_at) VALUES (?, ?, ?, ?, ?)",
+                (namespace, key, json.dumps(value, ensure_ascii=False), now, now + self.ttl)
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        self._after_write()
+        return value
+
+    def delete(self, namespace: str, key: str):
+        self._connection().execute("DELETE FROM tasks WHERE namespace = ? AND key = ?", (namespace, key))
+
+    def _after_write(self):
+        with self._writes_lock:
+            self._writes += 1
+            due = self._writes % self.MAINTENANCE_INTERVAL == 0
+        if due:
+            self.purge_expired()
+            self.enforce_limits()
+
+    def purge_expired(self) -> int:
+        cursor = self._connection().execute("DELETE FROM tasks WHERE expires_at < ?", (time.time(),))
+        return cursor.rowcount
+
+    def enforce_limits(self):
+        """每个命名空间只保留最近更新的 max_entries 条，所有条目的总大小不超过 max_bytes"""
+        conn = self._connection()
+        namespaces = [row[0] for row in conn.execute("SELECT DISTINCT namespace FROM tasks")]
+        for namespace in namespaces:
+            conn.execute("""
+                DELETE FROM tasks WHERE namespace = ? AND key IN (
+                    SELECT key FROM tasks WHERE namespace = ?
+                    ORDER BY updated_at DESC LIMIT -1 OFFSET ?
+                )
+            """, (namespace, namespace, self.max_entries))
+        if self.max_bytes:
+            conn.execute("""
+                DELETE FROM tasks WHERE rowid IN (
+                    SELECT rowid FROM (
+                        SELECT rowid, SUM(LENGTH(value)) OVER (ORDER BY updated_at DESC) AS total FROM tasks
+                    ) WHERE total > ?
+                )
+            """, (self.max_bytes,))
+
+
+def create_task_store(backend: str = 'memory', path: str = None, ttl: float = 86400,
+                      max_entries: int = 10000, max_bytes: int = 0) -> TaskStore:
+    """根据配置创建任务存储"""
+    if backend == 'sqlite':
+        return SQLiteTaskStore(path or 'tasks.db', ttl=ttl, max_entries=max_entries, max_bytes=max_bytes)
+    if backend == 'memory':
+        return MemoryTaskStore(ttl=ttl, max_entries=max_entries, max_bytes=max_bytes)
+    raise ValueError(f'未知的任务存储类型: {backend}')
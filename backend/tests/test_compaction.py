@@ -0,0 +1,50 @@
+from compaction import PAGE_BREAK, compact_text, truncate_to_budget
+from chunking import estimate_tokens
+
+
+def pages(*bodies: str) -> str:
+    return f'\n{PAGE_BREAK}\n'.join(bodies)
+
+
+SCORE_TABLE = '评分项\n分值\n技术方案\n30\n项目业绩\n10\n售后服务\n5'
+
+
+def test_score_table_values_are_kept():
+    text = pages(
+        f'某某项目招标文件\n第一章 评分标准\n{SCORE_TABLE}\n1',
+        '第二章 投标须知\n投标人应当具备相应资质。\n合计\n45\n2',
+        '第三章 合同条款\n付款方式按合同约定执行。\n3'
+    )
+    lines = compact_text(text).split('\n')
+    for value in ('30', '10', '5', '45'):
+        assert value in lines
+    # 页面最后一行的页码作为页脚去掉
+    assert '1' not in lines and '2' not in lines and '3' not in lines
+
+
+def test_score_table_without_page_breaks_is_untouched():
+    assert compact_text(SCORE_TABLE) == SCORE_TABLE
+
+
+def test_decorated_page_numbers_and_toc_lines_are_removed():
+    text = '第一章 总则 ........ 1\n- 3 -\n第 3 页 共 20 页\nPage 4 of 9\n3/20\n正文内容'
+    assert compact_text(text) == '正文内容'
+
+
+def test_repeated_headers_are_removed():
+    text = pages(*(f'某某公司招标文件\n第{i}部分正文内容\n第 {i} 页' for i in range(1, 5)))
+    assert compact_text(text) == '\n'.join(f'第{i}部分正文内容' for i in range(1, 5))
+
+
+def test_whitespace_and_repeated_clauses():
+    clause = '投标人须在投标截止时间前递交投标文件，逾期送达的不予受理。'
+    text = f'招 标 文 件\n{clause}\n其他要求\n{clause}'
+    assert compact_text(text) == f'招标文件\n{clause}\n其他要求'
+
+
+def test_truncate_to_budget():
+    text = '\n'.join(f'第{i}行内容' for i in range(100))
+    assert truncate_to_budget(text, 10000) == text
+    truncated = truncate_to_budget(text, 50)
+    assert truncated.endswith('已省略）')
+    assert estimate_tokens(truncated) <= 50
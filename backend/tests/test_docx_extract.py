@@ -0,0 +1,66 @@
+import zipfile
+
+from docx_extract import blocks_to_text, iter_docx_blocks
+
+W_NS = 'http://schemas.openxmlformats.org/wordprocessingml/2006/main'
+
+STYLES = f'''<?xml version="1.0" encoding="UTF-8"?>
+<w:styles xmlns:w="{W_NS}">
+  <w:style w:styleId="Heading1"><w:name w:val="heading 1"/></w:style>
+  <w:style w:styleId="a3"><w:name w:val="标题 2"/></w:style>
+  <w:style w:styleId="Outline"><w:name w:val="章节"/><w:pPr><w:outlineLvl w:val="2"/></w:pPr></w:style>
+  <w:style w:styleId="ListBullet"><w:name w:val="List Bullet"/>
+    <w:pPr><w:numPr><w:ilvl w:val="1"/><w:numId w:val="1"/></w:numPr></w:pPr></w:style>
+</w:styles>'''
+
+
+def paragraph(text: str, style: str = None, numbering: int = None, outline: int = None) -> str:
+    properties = ''
+    if style:
+        properties += f'<w:pStyle w:val="{style}"/>'
+    if numbering is not None:
+        properties += f'<w:numPr><w:ilvl w:val="{numbering}"/><w:numId w:val="2"/></w:numPr>'
+    if outline is not None:
+        properties += f'<w:outlineLvl w:val="{outline}"/>'
+    properties = f'<w:pPr>{properties}</w:pPr>' if properties else ''
+    return f'<w:p>{properties}<w:r><w:t>{text}</w:t></w:r></w:p>'
+
+
+def write_docx(path, body: str):
+    document = f'<?xml version="1.0" encoding="UTF-8"?><w:document xmlns:w="{W_NS}"><w:body>{body}</w:body></w:document>'
+    with zipfile.ZipFile(path, 'w') as archive:
+        archive.writestr('word/document.xml', document)
+        archive.writestr('word/styles.xml', STYLES)
+    return str(path)
+
+
+def test_numbered_headings_keep_section_structure(tmp_path):
+    path = write_docx(tmp_path / 'a.docx', ''.join([
+        paragraph('投标须知', style='Heading1', numbering=0),
+        paragraph('资格要求', style='a3', numbering=1),
+        paragraph('评分办法', numbering=0, outline=0),
+        paragraph('具备施工资质', numbering=0),
+        paragraph('近三年业绩', style='ListBullet'),
+        paragraph('普通段落')
+    ]))
+    blocks = list(iter_docx_blocks(path))
+    assert [(block['type'], block.get('level')) for block in blocks] == [
+        ('heading', 1), ('heading', 2), ('heading', 1), ('list_item', 0), ('list_item', 1), ('paragraph', None)
+    ]
+
+
+def test_tables_and_content_controls(tmp_path):
+    table = (
+        '<w:tbl><w:tr><w:tc>' + paragraph('评分项') + '</w:tc><w:tc>' + paragraph('分值') + '</w:tc></w:tr>'
+        '<w:tr><w:tc>' + paragraph('技术') + paragraph('方案') + '</w:tc><w:tc>' + paragraph('30|40') + '</w:tc></w:tr>'
+        '<w:tr><w:tc>' + paragraph('') + '</w:tc></w:tr></w:tbl>'
+    )
+    control = '<w:sdt><w:sdtContent>' + paragraph('目录', style='Outline') + '</w:sdtContent></w:sdt>'
+    path = write_docx(tmp_path / 'b.docx', control + table + paragraph('  '))
+    assert blocks_to_text(iter_docx_blocks(path)) == '### 目录\n| 评分项 | 分值 |\n| 技术 方案 | 30\\|40 |'
+
+
+def test_breaks_and_tabs_are_preserved(tmp_path):
+    body = '<w:p><w:r><w:t>甲</w:t><w:tab/><w:t>乙</w:t><w:br/><w:t>丙</w:t></w:r></w:p>'
+    path = write_docx(tmp_path / 'c.docx', body)
+    assert blocks_to_text(iter_docx_blocks(path)) == '甲\t乙\n丙'
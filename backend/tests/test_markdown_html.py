@@ -0,0 +1,118 @@
+import time
+
+from markdown_html import html_to_markdown, iter_markdown_html, render_inline, render_markdown
+
+
+def round_trip(html: str) -> str:
+    return render_markdown(html_to_markdown(html))
+
+
+def test_table_cells_with_paragraphs_stay_in_the_table():
+    html = ('<table><tr><th><p>评分项</p></th><th><p>分值</p></th></tr>'
+            '<tr><td><p>技术方案</p><p>（含进度）</p></td><td>30<br>分</td></tr></table>')
+    markdown = html_to_markdown(html)
+    assert markdown == '| 评分项 | 分值 |\n| --- | --- |\n| 技术方案 （含进度） | 30 分 |'
+    assert round_trip(html) == (
+        '<table><thead><tr><th>评分项</th><th>分值</th></tr></thead>'
+        '<tbody><tr><td>技术方案 （含进度）</td><td>30 分</td></tr></tbody></table>'
+    )
+
+
+def test_table_cell_pipes_are_escaped():
+    assert html_to_markdown('<table><tr><td>a|b</td></tr></table>') == '| a\\|b |\n| --- |'
+
+
+def test_list_items_with_paragraphs():
+    html = '<ul><li><p>资质</p></li><li><p>业绩</p><ul><li><p>近三年</p></li></ul></li></ul><ol><li>投标函</li></ol>'
+    assert html_to_markdown(html) == '- 资质\n- 业绩\n  - 近三年\n\n1. 投标函'
+    assert round_trip(html) == (
+        '<ul><li>资质</li><li>业绩<ul><li>近三年</li></ul></li></ul><ol><li>投标函</li></ol>'
+    )
+
+
+def test_emphasis_whitespace_moves_outside_markers():
+    html = '<p>项目<strong> 工期 </strong>为<em>90天 </em>。<strong> </strong></p>'
+    assert html_to_markdown(html) == '项目 **工期** 为*90天* 。'
+    assert round_trip(html) == '<p>项目 <strong>工期</strong> 为<em>90天</em> 。</p>'
+
+
+def test_emphasis_across_line_break_is_reopened():
+    assert html_to_markdown('<p><strong>甲<br>乙</strong></p>') == '**甲**\n**乙**'
+
+
+def test_headings_quotes_and_code():
+    html = '<h2>第一章</h2><blockquote><p>引用</p></blockquote><pre><code>a  b</code></pre><hr>'
+    assert html_to_markdown(html) == '## 第一章\n\n> 引用\n\n```\na  b\n```\n---'
+
+
+def test_unsafe_images_are_dropped():
+    html = '<p><img src="/api/images/1" alt="图"><img src="javascript:alert(1)"></p>'
+    assert html_to_markdown(html) == '![图](/api/images/1)'
+
+
+MARKDOWN = '''# 技术方案 #
+
+本项目**工期**为 *90 天*，~~不含~~ `<节假日>`。
+
+3. 第三
+4. 第四
+   续行
+- 嵌套
+  1. 子项
+
+| 评分项 | 分值 |
+| --- | ---: |
+| 技术 | 30 |
+
+```
+x = "<1>"
+```
+> 引用
+---
+填写 ____ 日期'''
+
+
+def test_render_markdown_blocks():
+    assert render_markdown(MARKDOWN) == (
+        '<h1>技术方案</h1>'
+        '<p>本项目<strong>工期</strong>为 <em>90 天</em>，<del>不含</del> <code>&lt;节假日&gt;</code>。</p>'
+        '<ol start="3"><li>第三</li><li>第四<br>续行</li></ol><ul><li>嵌套<ol><li>子项</li></ol></li></ul>'
+        '<table><thead><tr><th>评分项</th><th>分值</th></tr></thead><tbody><tr><td>技术</td><td>30</td></tr></tbody></table>'
+        '<pre><code>x = &quot;&lt;1&gt;&quot;\n</code></pre>'
+        '<blockquote><p>引用</p></blockquote><hr><p>填写 ____ 日期</p>'
+    )
+
+
+def test_streamed_chunks_render_the_same_html():
+    expected = render_markdown(MARKDOWN)
+    for size in (1, 3, 17):
+        chunks = [MARKDOWN[index:index + size] for index in range(0, len(MARKDOWN), size)]
+        assert ''.join(iter_markdown_html(chunks)) == expected
+
+
+def test_inline_html_and_unsafe_images_are_escaped():
+    assert render_markdown('<script>alert("x")</script>') == '<p>&lt;script&gt;alert(&quot;x&quot;)&lt;/script&gt;</p>'
+    assert render_markdown('![图](javascript:x) ![图](/api/images/1)') == (
+        '<p>![图](javascript:x) <img src="/api/images/1" alt="图"></p>'
+    )
+
+
+def test_unmatched_delimiters_are_kept():
+    assert render_inline('**未闭合 *也未闭合') == '**未闭合 *也未闭合'
+    assert render_inline('**加粗*斜体***') == '<strong>加粗<em>斜体</em></strong>'
+    assert render_inline('``a`b``') == '<code>a`b</code>'
+
+
+def test_table_rows_are_padded_and_unseparated_rows_are_paragraphs():
+    assert render_markdown('| a | b |\n| - | - |\n| 1 |\n\n| 非表格') == (
+        '<table><thead><tr><th>a</th><th>b</th></tr></thead><tbody><tr><td>1</td><td></td></tr></tbody></table>'
+        '<p>| 非表格</p>'
+    )
+
+
+def test_pathological_input_is_linear():
+    # 只有开始分隔符，没有可配对的结束分隔符
+    text = '*a **b ~~c ' * 20000 + '`'
+    start = time.perf_counter()
+    assert render_inline(text) == text
+    assert time.perf_counter() - start < 2
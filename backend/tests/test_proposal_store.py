@@ -0,0 +1,127 @@
+import os
+import threading
+
+import pytest
+
+from proposal_store import (KEYFRAME_INTERVAL, ProposalNotFound, ProposalStore, apply_delta, make_delta,
+                            tokenize)
+
+
+def document(sections: int, edited: int = None) -> str:
+    return ''.join(
+        f'<h2>第{i}节</h2><p>{"修改后的内容" if i == edited else "原始内容"}，第{i}段正文。</p>'
+        for i in range(sections)
+    )
+
+
+@pytest.fixture
+def store(tmp_path):
+    return ProposalStore(str(tmp_path / 'proposals'), codec='gzip')
+
+
+def blob_files(store) -> set:
+    return {name for _, _, names in os.walk(os.path.join(store.directory, 'blobs')) for name in names}
+
+
+@pytest.mark.parametrize('before, after', [
+    (document(20), document(20, edited=7)),
+    (document(20), document(25)),
+    (document(20), document(5)),
+    ('', document(3)),
+    ('<p>a</p>', '纯文本'),
+])
+def test_delta_round_trip(before, after):
+    base = tokenize(before)
+    assert apply_delta(base, make_delta(base, tokenize(after))) == after
+
+
+def test_versions_are_stored_as_deltas_with_keyframes(store):
+    proposal = store.save(document(50), '项目', 'alice')
+    contents = [document(50)]
+    for i in range(1, KEYFRAME_INTERVAL + 3):
+        contents.append(document(50, edited=i))
+        proposal = store.save(contents[-1], '项目', 'alice', proposal['id'])
+    assert proposal['version'] == len(contents)
+    for version, content in enumerate(contents, 1):
+        assert store.content(proposal['id'], version) == content
+    assert store.content(proposal['id']) == contents[-1]
+
+    rows = store._connection().execute(
+        "SELECT version, base_version FROM versions WHERE proposal_id = ? ORDER BY version", (proposal['id'],)
+    ).fetchall()
+    keyframes = [row['version'] for row in rows if row['base_version'] is None]
+    assert keyframes == [1, KEYFRAME_INTERVAL + 1]
+    stats = store.stats()
+    assert stats['versions'] == len(contents) and stats['stored_size'] < stats['size']
+
+
+def test_unchanged_content_does_not_add_version(store):
+    proposal = store.save('<p>内容</p>', '项目', 'alice')
+    assert store.save('<p>内容</p>', '项目', 'alice', proposal['id'])['version'] == 1
+
+
+def test_versions_and_missing_proposals(store):
+    proposal = store.save('<p>1</p>', '项目', 'alice')
+    store.save('<p>2</p>', '项目', 'bob', proposal['id'])
+    versions = store.versions(proposal['id'], page_size=1)
+    assert versions['total'] == 2
+    assert [(item['version'], item['author']) for item in versions['items']] == [(2, 'bob')]
+    with pytest.raises(ProposalNotFound):
+        store.get('missing')
+    with pytest.raises(ProposalNotFound):
+        store.content(proposal['id'], 3)
+
+
+def test_list_filters_by_owner(store):
+    store.save('<p>a</p>', '甲项目', 'alice')
+    store.save('<p>b</p>', '乙项目', 'bob')
+    store.save('<p>c</p>', '旧项目', '')
+    assert {item['project'] for item in store.list(owner='alice')['items']} == {'甲项目', '旧项目'}
+    assert store.list(project='乙项目')['total'] == 1
+    assert store.list(page_size=2)['total'] == 3 and len(store.list(page_size=2)['items']) == 2
+
+
+def test_concurrent_saves_keep_every_version(store):
+    proposal = store.save(document(10), '项目', 'alice')
+    errors = []
+
+    def save(i):
+        try:
+            store.save(document(10, edited=i), '项目', 'alice', proposal['id'])
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=save, args=(i,)) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+    assert store.get(proposal['id'])['version'] == 9
+    saved = {store.content(proposal['id'], version) for version in range(2, 10)}
+    assert saved == {document(10, edited=i) for i in range(8)}
+    referenced = {row[0] for row in store._connection().execute("SELECT blob FROM versions")}
+    assert blob_files(store) == referenced
+
+
+def test_import_legacy_is_idempotent(store, tmp_path):
+    legacy = tmp_path / 'legacy'
+    legacy.mkdir()
+    (legacy / '甲项目_1700000000.html').write_text('<p>甲</p>', encoding='utf-8')
+    (legacy / '乙项目_1700000100.html').write_text('<p>乙</p>', encoding='utf-8')
+
+    # 按文件名顺序导入，乙项目在前
+    def fail_on_second(proposal, content):
+        if content == '<p>甲</p>':
+            raise RuntimeError('索引失败')
+
+    with pytest.raises(RuntimeError):
+        store.import_legacy(str(legacy), on_import=fail_on_second)
+    indexed = []
+    assert store.import_legacy(str(legacy), on_import=lambda proposal, content: indexed.append(content)) == 0
+    assert indexed == ['<p>甲</p>']
+    assert store.list()['total'] == 2
+    assert sorted(os.listdir(legacy / 'migrated')) == ['乙项目_1700000100.html', '甲项目_1700000000.html']
+    imported = {item['project']: item for item in store.list()['items']}
+    assert imported['甲项目']['created'] == 1700000000 and imported['甲项目']['author'] == ''
+    assert store.import_legacy(str(legacy)) == 0
@@ -0,0 +1,82 @@
+import threading
+
+import pytest
+
+import search_index
+from search_index import SearchIndex, html_to_text, split_passages, tokenize
+
+PROPOSAL = '第一章 技术方案\n本项目采用分布式架构，支持弹性扩容。\n第二章 售后服务\n提供七乘二十四小时运维响应。'
+
+
+@pytest.fixture
+def index(tmp_path):
+    return SearchIndex(str(tmp_path / 'index'))
+
+
+def test_tokenize_without_jieba(monkeypatch):
+    monkeypatch.setattr(search_index, 'jieba', None)
+    assert tokenize('分布式 API v2.5') == ['分布', '布式', 'api', 'v', '2.5']
+
+
+def test_html_to_text_and_passages():
+    text = html_to_text('<h2>第一章 总则</h2><p>第一段</p><script>x()</script><table><tr><td>a</td><td>b</td></tr></table>')
+    assert [line.strip() for line in text.split('\n') if line.strip()] == ['第一章 总则', '第一段', 'a b']
+    passages = split_passages('第一章 总则\n' + '甲' * 12 + '\n乙乙', max_chars=10)
+    assert passages == [('第一章 总则', '甲' * 10), ('第一章 总则', '甲甲\n乙乙')]
+
+
+def test_bm25_ranks_matching_passage_first(index):
+    index.add_document(PROPOSAL, 'proposal', '某项目')
+    index.add_document('第一章 商务条款\n付款方式按合同约定。', 'tender', '招标文件')
+    results = index.search('运维响应')
+    assert results[0]['title'] == '某项目 · 第二章 售后服务'
+    assert results[0]['source'] == 'proposal' and results[0]['score'] > 0
+    assert index.search('付款', source='proposal') == []
+    assert index.search('付款', source='tender')[0]['content'] == '付款方式按合同约定。'
+
+
+def test_identical_documents_are_indexed_once(index):
+    assert index.add_document(PROPOSAL, 'proposal') == 2
+    assert index.add_document(PROPOSAL, 'proposal') == 0
+    assert index.add_document('   ', 'proposal') == 0
+    assert index.stats()['documents'] == 1
+
+
+def test_keyed_documents_return_latest_version_only(index):
+    index.add_document('旧版本提到分布式架构', 'proposal', key='p1', version=1)
+    index.add_document('新版本改为单体架构', 'proposal', key='p1', version=2)
+    assert index.add_document('更旧的版本', 'proposal', key='p1', version=1) == 0
+    assert [result['content'] for result in index.search('架构')] == ['新版本改为单体架构']
+    assert index.stats()['superseded_passages'] == 1
+
+
+def test_other_instances_see_appended_documents(index):
+    other = SearchIndex(index.directory)
+    index.add_document('旧版本提到分布式架构', 'proposal', key='p1', version=1)
+    index.add_document('新版本改为单体架构', 'proposal', key='p1', version=2)
+    assert [result['content'] for result in other.search('架构')] == ['新版本改为单体架构']
+    reloaded = SearchIndex(index.directory)
+    assert reloaded.stats() == index.stats()
+
+
+def test_concurrent_adds_are_not_duplicated(index):
+    threads = [threading.Thread(target=index.add_document, args=(PROPOSAL, 'proposal')) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert SearchIndex(index.directory).stats()['passages'] == 2
+
+
+def test_vector_search_is_fused_with_bm25(tmp_path):
+    np = pytest.importorskip('numpy')
+    # 按关键词出现次数构造的二维向量
+    def embed(texts):
+        vectors = np.array([[1.0 + text.count('架构'), 1.0 + text.count('运维')] for text in texts], dtype=np.float32)
+        return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+    embed.dimension = 2
+    index = SearchIndex(str(tmp_path / 'index'), embedder=embed)
+    index.add_document(PROPOSAL, 'proposal')
+    assert index.stats()['vectors'] == 2
+    assert index.search('运维', limit=1)[0]['content'] == '提供七乘二十四小时运维响应。'
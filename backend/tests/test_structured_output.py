@@ -0,0 +1,64 @@
+import pytest
+
+from structured_output import parse_json_object, validate_sections
+
+SCHEMA = {
+    'project_info': {'type': 'object', 'fields': {'name': '', 'budget': ''}, 'required': ('name',)},
+    'requirements': {'type': 'array', 'fields': {'item': '', 'mandatory': False, 'notes': []},
+                     'required': ('item',)},
+}
+
+
+def test_valid_json_is_not_repaired():
+    assert parse_json_object('{"a": 1}') == ({'a': 1}, False)
+
+
+def test_fences_surrounding_text_and_trailing_commas():
+    text = '以下是结果：\n```json\n{"a": [1, 2,], "b": {"c": "}",},}\n```\n以上。'
+    assert parse_json_object(text) == ({'a': [1, 2], 'b': {'c': '}'}}, True)
+
+
+def test_truncated_output_keeps_complete_values():
+    data, repaired = parse_json_object('{"a": 1, "b": [1, 2, {"c": "unfinished')
+    assert repaired
+    assert data['a'] == 1 and data['b'][:2] == [1, 2]
+
+
+def test_truncated_after_key_falls_back_to_previous_value():
+    assert parse_json_object('{"a": "x", "b": {"c": 1}, "d":') == ({'a': 'x', 'b': {'c': 1}}, True)
+
+
+def test_escaped_quotes_inside_strings():
+    assert parse_json_object('前缀 {"a": "say \\"hi\\" }"} 后缀') == ({'a': 'say "hi" }'}, True)
+
+
+@pytest.mark.parametrize('text', ['', '没有 JSON', '[1, 2]'])
+def test_no_object_raises(text):
+    with pytest.raises(ValueError):
+        parse_json_object(text)
+
+
+def test_validate_sections_coerces_fields():
+    data = {
+        'project_info': {'name': ' 某项目 ', 'budget': 100},
+        'requirements': [
+            {'item': '资质', 'mandatory': '是', 'notes': '需盖章'},
+            {'item': '', 'mandatory': True},
+            {'item': '业绩', 'notes': ['近三年', 3, None, {}]},
+            '无效条目',
+        ],
+    }
+    result, invalid = validate_sections(data, SCHEMA)
+    assert invalid == []
+    assert result['project_info'] == {'name': '某项目', 'budget': '100'}
+    assert result['requirements'] == [
+        {'item': '资质', 'mandatory': True, 'notes': ['需盖章']},
+        {'item': '业绩', 'mandatory': False, 'notes': ['近三年', '3']},
+    ]
+
+
+def test_validate_sections_reports_invalid_sections():
+    data = {'project_info': {'budget': '100'}, 'requirements': [{'item': ''}]}
+    assert validate_sections(data, SCHEMA) == ({}, ['project_info', 'requirements'])
+    assert validate_sections({'project_info': {'name': 'x'}}, SCHEMA)[1] == ['requirements']
+    assert validate_sections({'project_info': {'name': 'x'}, 'requirements': []}, SCHEMA)[0]['requirements'] == []
@@ -0,0 +1,86 @@
+import pytest
+
+from task_store import MemoryTaskStore, SQLiteTaskStore, TaskStore, create_task_store
+
+
+@pytest.fixture(params=['memory', 'sqlite'])
+def make_store(request, tmp_path):
+    def make(**options):
+        return create_task_store(request.param, path=str(tmp_path / 'tasks.db'), **options)
+    return make
+
+
+def test_table_reads_and_writes(make_store):
+    tasks = make_store().table('tasks')
+    tasks['a'] = {'status': 'pending'}
+    assert 'a' in tasks and tasks['a'] == {'status': 'pending'}
+    assert tasks.update('a', progress=50) == {'status': 'pending', 'progress': 50}
+    assert tasks.update('b', status='new') == {'status': 'new'}
+    tasks.delete('a')
+    assert 'a' not in tasks
+    assert tasks.get('a', 'missing') == 'missing'
+    with pytest.raises(KeyError):
+        tasks['a']
+
+
+def test_returned_values_are_copies(make_store):
+    tasks = make_store().table('tasks')
+    tasks['a'] = {'status': 'pending'}
+    tasks['a']['status'] = 'changed'
+    assert tasks['a'] == {'status': 'pending'}
+
+
+def test_namespaces_are_separate(make_store):
+    store = make_store()
+    store.set('tasks', 'a', 1)
+    store.set('results', 'a', 2)
+    assert store.get('tasks', 'a') == 1 and store.get('results', 'a') == 2
+
+
+def test_expired_entries_are_hidden_and_purged(make_store):
+    store = make_store(ttl=-1)
+    store.set('tasks', 'a', {'status': 'done'})
+    assert store.get('tasks', 'a') is None
+    # 过期条目不参与合并
+    assert store.update('tasks', 'b', {'progress': 1}) == {'progress': 1}
+    assert store.purge_expired() >= 1
+
+
+def test_max_entries_keeps_latest(make_store):
+    store = make_store(max_entries=3)
+    store.MAINTENANCE_INTERVAL = 1
+    for i in range(5):
+        store.set('tasks', str(i), i)
+    assert [store.get('tasks', str(i)) for i in range(5)] == [None, None, 2, 3, 4]
+
+
+def test_max_bytes_evicts_oldest_across_namespaces(make_store):
+    store = make_store(max_bytes=30)
+    store.MAINTENANCE_INTERVAL = 1
+    store.set('tasks', 'a', 'x' * 10)
+    store.set('results', 'b', 'x' * 10)
+    store.set('tasks', 'c', 'x' * 10)
+    assert store.get('tasks', 'a') is None
+    assert store.get('results', 'b') == 'x' * 10
+    assert store.get('tasks', 'c') == 'x' * 10
+
+
+def test_sqlite_store_is_shared_between_instances(tmp_path):
+    path = str(tmp_path / 'tasks.db')
+    SQLiteTaskStore(path).set('tasks', 'a', {'status': 'done'})
+    assert SQLiteTaskStore(path).get('tasks', 'a') == {'status': 'done'}
+
+
+def test_incomplete_backend_fails_at_construction():
+    class PartialStore(TaskStore):
+        def get(self, namespace, key):
+            return None
+
+    with pytest.raises(TypeError):
+        PartialStore()
+    assert isinstance(MemoryTaskStore(), TaskStore)
+
+
+def test_unknown_backend():
+    with pytest.raises(ValueError):
+        create_task_store('redis')
@@ -21,6 +21,11 @@ axios.interceptors.request.use(
     if (token && config.headers) {
       config.headers.Authorization = `Bearer ${token}`
     }
+    // 上传招标文件时后端返回的链路ID，后续的解析、生成请求沿用，便于按链路排查耗时
+    const traceId = sessionStorage.getItem('traceId')
+    if (traceId && config.headers) {
+      config.headers['X-Trace-Id'] = traceId
+    }
     return config
   },
   error => {